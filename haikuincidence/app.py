@@ -1,15 +1,24 @@
 # I'm a poet and I didn't even know it. Hey, that's a haiku!
 
+import hashlib
+import json
 import logging
+import multiprocessing
 import os
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
+from functools import partial
 from pathlib import Path
 from pprint import pformat
 
-import inflect
 from dotenv import load_dotenv
-from nltk.corpus import cmudict
-from tenacity import retry, stop_after_attempt, wait_fixed
+from tenacity import retry, retry_if_not_exception_type, wait_fixed
 from twython import (
     Twython,
     TwythonAuthError,
@@ -17,23 +26,39 @@ from twython import (
     TwythonRateLimitError,
     TwythonStreamer,
 )
-from utils.data_base import Haiku, session_factory
+from utils.cache_utils import ProfileVerdictCache, StatusCache, SyllableCache
+from utils.data_base import Haiku, HaikuWriteBuffer, OutboxAction, session_factory
 from utils.data_utils import (
-    get_emoticons_list,
+    LazyInflectEngine,
     get_ignore_profile_list,
     get_ignore_tweet_list,
-    get_syllable_dict,
+    get_syllable_lexicon,
     get_track_str,
+    get_user_blocklist,
 )
-from utils.haiku_utils import get_best_haiku, get_haiku
+from utils.filter_utils import FilterPipeline
+from utils.haiku_utils import (
+    build_number_syllables,
+    get_best_haiku,
+    get_haiku,
+)
+from utils.lexicon_utils import SyllableLexicon
+from utils.outbox_utils import OutboxWorker
 from utils.text_utils import (
+    EmoticonMatcher,
+    IgnoreListMatcher,
+    PreparedTweet,
+    UserBlocklist,
     check_profile,
     check_text_wrapper,
     check_tweet,
-    clean_text,
     date_string_to_datetime,
-    get_tweet_body,
+    get_text_filter,
+    get_tweet_filter,
+    preload_text_cleaning,
+    prepare_tweet,
 )
+from utils.twitter_utils import StatusHydrator, StatusLookup, lookup_statuses
 
 logging.basicConfig(format="{asctime} : {levelname} : {message}", style="{")
 logger = logging.getLogger("haiku_logger")
@@ -100,6 +125,42 @@ RETRY_WAIT_SECONDS = int(os.getenv("RETRY_WAIT_SECONDS", default="60"))
 MY_SCREEN_NAME = os.getenv("MY_SCREEN_NAME", default="twitter")
 LANGUAGE = os.getenv("LANGUAGE", default="en")
 GUESS_SYL_METHOD = os.getenv("GUESS_SYL_METHOD", default="mean")
+SYLLABLE_CACHE_SIZE = int(os.getenv("SYLLABLE_CACHE_SIZE", default="50000"))
+LEXICON_PATH = os.getenv("LEXICON_PATH", default=None)
+# Check syllable bounds before counting; off, as counting already stops at the first
+# line that overshoots, which is usually cheaper
+PREFILTER_SYLLABLES = (
+    os.getenv("PREFILTER_SYLLABLES", default="false").lower() == "true"
+)
+# check_profile verdicts to remember per user and description (0 disables the cache)
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", default="100000"))
+PROFILE_CACHE_TTL_SECONDS = float(
+    os.getenv("PROFILE_CACHE_TTL_SECONDS", default="86400")
+)
+# Save the verdicts here to keep them across restarts (only without analysis workers)
+PROFILE_CACHE_PATH = os.getenv("PROFILE_CACHE_PATH", default=None)
+# Reorder tweet filter stages by observed cost and selectivity every this many tweets
+# (0: keep the default order)
+FILTER_REORDER_EVERY = int(os.getenv("FILTER_REORDER_EVERY", default="0"))
+# Analyze tweets in this many worker processes (0: on the stream-reading thread)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", default="0"))
+# Tweets waiting for a worker, before the stream reader waits too
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", default="100"))
+
+# Look up the full text of truncated tweets in batches of up to 100, on a background
+# thread, waiting at most this long for a batch to fill
+HYDRATE_BATCH_SIZE = int(os.getenv("HYDRATE_BATCH_SIZE", default="100"))
+HYDRATE_MAX_DELAY_SECONDS = float(os.getenv("HYDRATE_MAX_DELAY_SECONDS", default="5"))
+# Insert found haikus in batches of this many rows, or after this many milliseconds,
+# and make the stream wait when this many rows are waiting to be inserted
+HAIKU_WRITE_BATCH_ROWS = int(os.getenv("HAIKU_WRITE_BATCH_ROWS", default="100"))
+HAIKU_WRITE_MAX_DELAY_MS = float(os.getenv("HAIKU_WRITE_MAX_DELAY_MS", default="1000"))
+HAIKU_WRITE_QUEUE_SIZE = int(os.getenv("HAIKU_WRITE_QUEUE_SIZE", default="10000"))
+# Tries for each post or follow in the outbox, waiting longer after each failure
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", default="3"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", default="5"))
+# Reuse looked up statuses for this long when ranking and posting haikus
+STATUS_CACHE_TTL_SECONDS = float(os.getenv("STATUS_CACHE_TTL_SECONDS", default="60"))
 
 IGNORE_USER_SCREEN_NAMES = os.getenv("IGNORE_USER_SCREEN_NAMES", default=None)
 IGNORE_USER_SCREEN_NAMES = (
@@ -163,7 +224,10 @@ class MyTwitterClient(Twython):
 
         return (current_time - self.last_post_time).total_seconds() > EVERY_N_SECONDS
 
-    @retry(wait=wait_fixed(RETRY_WAIT_SECONDS), stop=stop_after_attempt(3))
+    def seconds_until_can_post(self, current_time) -> float:
+        elapsed = (current_time - self.last_post_time).total_seconds()
+        return max(EVERY_N_SECONDS - elapsed, 0)
+
     def _update_status(self, *args, **kwargs):
         current_time = datetime.now(tz=timezone.utc)
 
@@ -192,40 +256,329 @@ class MyTwitterClient(Twython):
             raise
 
 
+class TweetAnalyzer:
+    """Filters statuses and finds haikus in their text.
+    Holds everything needed for analysis, so that it can run in a worker process.
+    """
+
+    def __init__(
+        self,
+        ignore_tweet_list: IgnoreListMatcher = None,
+        ignore_profile_list: IgnoreListMatcher = None,
+        lexicon: SyllableLexicon = None,
+        emoticons_list: EmoticonMatcher = None,
+        inflect_p=None,
+        syllable_cache: SyllableCache = None,
+        profile_cache: ProfileVerdictCache = None,
+        tweet_filter: FilterPipeline = None,
+        text_filter: FilterPipeline = None,
+        user_blocklist: UserBlocklist = None,
+    ):
+        self.ignore_tweet_list = (
+            ignore_tweet_list if ignore_tweet_list is not None else IgnoreListMatcher()
+        )
+        self.ignore_profile_list = (
+            ignore_profile_list
+            if ignore_profile_list is not None
+            else IgnoreListMatcher()
+        )
+        self.lexicon = lexicon or SyllableLexicon()
+        self.emoticons_list = (
+            emoticons_list if emoticons_list is not None else EmoticonMatcher()
+        )
+        self.inflect_p = inflect_p
+        self.syllable_cache = syllable_cache
+        self.profile_cache = profile_cache
+        self.user_blocklist = (
+            user_blocklist
+            if user_blocklist is not None
+            else UserBlocklist(
+                id_strs=IGNORE_USER_ID_STR,
+                screen_name_patterns=IGNORE_USER_SCREEN_NAMES,
+            )
+        )
+        self.tweet_filter = (
+            tweet_filter
+            if tweet_filter is not None
+            else get_tweet_filter(
+                language=LANGUAGE,
+                user_blocklist=self.user_blocklist,
+                reorder_every=FILTER_REORDER_EVERY,
+            )
+        )
+        self.text_filter = (
+            text_filter
+            if text_filter is not None
+            else get_text_filter(
+                self.ignore_tweet_list, reorder_every=FILTER_REORDER_EVERY
+            )
+        )
+
+    def check_profile(self, status) -> bool:
+        """check_profile, remembering the verdict for repeat posters"""
+        if self.profile_cache is not None:
+            profile_passes = self.profile_cache.get_verdict(status)
+            if profile_passes is not None:
+                return profile_passes
+
+        profile_passes = check_profile(
+            status,
+            ignore_profile_list=self.ignore_profile_list,
+            match_substring=CHECK_USER_PROFILE_MATCH_SUBSTRING,
+        )
+
+        if self.profile_cache is not None:
+            self.profile_cache.put_verdict(status, profile_passes)
+            self.profile_cache.save_if_due()
+        return profile_passes
+
+    def analyze(self, status: dict | PreparedTweet):
+        """Return the cleaned text and haiku of a status, or None if there is none"""
+        # Normalize the text once, for all the checks and the haiku
+        tweet = prepare_tweet(status)
+
+        tweet_passes = check_tweet(tweet, tweet_filter=self.tweet_filter)
+
+        if not tweet_passes:
+            return None
+
+        if CHECK_USER_PROFILE:
+            profile_passes = self.check_profile(tweet)
+
+            if not profile_passes:
+                logger.info(
+                    f"Failed check_profile: {tweet['user']['screen_name']}:"
+                    f" {' '.join(tweet['user']['description'].splitlines())}"
+                )
+                return None
+
+        text_passes = check_text_wrapper(tweet, text_filter=self.text_filter)
+
+        if not text_passes:
+            logger.info(
+                f"Failed check_text_wrapper: {tweet['user']['screen_name']}, tweet"
+                f" {tweet['id_str']}: {tweet.body}"
+            )
+            return None
+
+        haiku = get_haiku(
+            tweet,
+            self.inflect_p,
+            self.lexicon,
+            self.emoticons_list,
+            GUESS_SYL_METHOD,
+            self.syllable_cache,
+            prefilter=PREFILTER_SYLLABLES,
+        )
+
+        if not haiku:
+            return None
+
+        if self.syllable_cache is not None:
+            logger.debug(f"Syllable cache: {self.syllable_cache.stats()}")
+        if self.profile_cache is not None:
+            logger.debug(f"Profile cache: {self.profile_cache.stats()}")
+        logger.debug(f"Tweet filter: {self.tweet_filter.stats()}")
+        logger.debug(f"Text filter: {self.text_filter.stats()}")
+
+        return tweet.text, haiku
+
+
+@contextmanager
+def startup_phase(name: str):
+    """Log how long a phase of startup takes"""
+    start = time.perf_counter()
+    yield
+    logger.info(f"Startup phase {name} took {time.perf_counter() - start:.2f} s")
+
+
+def load_analyzer(data_dir: Path, profile_cache_path: Path = None) -> TweetAnalyzer:
+    """Load the data files used to analyze tweets"""
+    with startup_phase("ignore lists"):
+        ignore_tweet_list = get_ignore_tweet_list(data_dir / "ignore_tweet.txt")
+        ignore_profile_list = get_ignore_profile_list(data_dir / "ignore_profile.txt")
+        user_blocklist = get_user_blocklist(
+            data_dir / "ignore_user.txt",
+            id_strs=IGNORE_USER_ID_STR,
+            screen_name_patterns=IGNORE_USER_SCREEN_NAMES,
+        )
+    with startup_phase("lexicon"):
+        # Use the CMU dictionary to count syllables, merged with our pre-defined
+        # counts and emoticons into a compact lexicon (memory-mapped if compiled)
+        lexicon = get_syllable_lexicon(
+            LEXICON_PATH or data_dir / "lexicon.bin",
+            syllable_filepath=data_dir / "syllables.json",
+            emoticons_filepath=data_dir / "emoticons.txt",
+        )
+        emoticons_list = lexicon.emoticons
+    with startup_phase("text cleaning"):
+        preload_text_cleaning()
+
+    # Use inflect to change digits to their English word equivalent
+    inflect_p = LazyInflectEngine()
+    if not lexicon.has_numbers:
+        with startup_phase("number table"):
+            # Spell out small numbers and years once, instead of for every tweet
+            lexicon.set_numbers(
+                build_number_syllables(
+                    inflect_p, lexicon, emoticons_list, GUESS_SYL_METHOD
+                )
+            )
+    else:
+        # Only needed for large numbers now, so import it in the background
+        threading.Thread(
+            target=inflect_p.load, name="load-inflect", daemon=True
+        ).start()
+    # Remember syllable counts of frequent tokens
+    syllable_cache = SyllableCache(maxsize=SYLLABLE_CACHE_SIZE)
+    with startup_phase("profile cache"):
+        # Remember profile verdicts of repeat posters, until their description changes
+        profile_cache = ProfileVerdictCache(
+            maxsize=PROFILE_CACHE_SIZE,
+            ttl=PROFILE_CACHE_TTL_SECONDS,
+            filepath=profile_cache_path,
+            fingerprint=profile_check_fingerprint(ignore_profile_list),
+        )
+
+    return TweetAnalyzer(
+        ignore_tweet_list=ignore_tweet_list,
+        ignore_profile_list=ignore_profile_list,
+        lexicon=lexicon,
+        emoticons_list=emoticons_list,
+        inflect_p=inflect_p,
+        syllable_cache=syllable_cache,
+        profile_cache=profile_cache,
+        user_blocklist=user_blocklist,
+    )
+
+
+def profile_check_fingerprint(ignore_profile_list: IgnoreListMatcher) -> str:
+    """Identifies the settings that profile verdicts depend on. The list is sorted,
+    as its order changes between processes (it was deduplicated with a set).
+    """
+    settings = [CHECK_USER_PROFILE_MATCH_SUBSTRING, sorted(ignore_profile_list)]
+    return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()
+
+
+# Each analysis worker process loads its own analyzer, once
+_worker_analyzer = None
+
+
+def init_analysis_worker(data_dir: Path, ready_queue: multiprocessing.Queue = None):
+    global _worker_analyzer
+    # Ctrl-C and dyno restarts signal every process; the main process decides when
+    # workers stop, after they finish the tweets they were given
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    _worker_analyzer = load_analyzer(data_dir)
+    if ready_queue is not None:
+        ready_queue.put(os.getpid())
+
+
+def analysis_worker_ready() -> bool:
+    return _worker_analyzer is not None
+
+
+def wait_for_analysis_workers(
+    ready_queue: multiprocessing.Queue, n_workers: int, workers_started: list
+) -> set[int]:
+    """Wait until n_workers different workers have loaded their analyzer, and return
+    their process ids. Raises BrokenProcessPool if a worker failed to load.
+    """
+    worker_pids = set()
+    while len(worker_pids) < n_workers:
+        try:
+            worker_pids.add(ready_queue.get(timeout=1))
+        except queue.Empty:
+            # A worker that failed to load breaks the pool, failing these
+            for worker_started in workers_started:
+                if worker_started.done():
+                    worker_started.result()
+    return worker_pids
+
+
+def analyze_in_worker(status):
+    return _worker_analyzer.analyze(status)
+
+
+class StreamStoppedError(Exception):
+    """Raised in the stream-reading thread to stop streaming for good"""
+
+
 class MyStreamer(TwythonStreamer):
+    """Reads the stream and posts haikus.
+
+    Analysis runs on the stream-reading thread, or in a pool of worker processes.
+    With a pool, a single coordinator thread owns the database session and posting,
+    and handles the results in the order the tweets were accepted.
+    Truncated tweets get their full text from the hydrator thread before analysis.
+    Haikus are only recorded as candidates; the scheduler chooses which to post.
+    """
+
     def __init__(
         self,
         twitter,
         db_session,
         track_str: str = "",
-        ignore_tweet_list: list = None,
-        ignore_profile_list: list = None,
-        syllable_dict: dict = None,
-        emoticons_list: list = None,
-        inflect_p=None,
-        pronounce_dict: dict = None,
+        analyzer: TweetAnalyzer = None,
+        analysis_pool: ProcessPoolExecutor = None,
+        scheduler: "HaikuScheduler" = None,
+        haiku_writer: HaikuWriteBuffer = None,
         *args,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
 
-        ignore_tweet_list = ignore_tweet_list or []
-        ignore_profile_list = ignore_profile_list or []
-        syllable_dict = syllable_dict or {}
-        emoticons_list = emoticons_list or []
-
         self.twitter = twitter
         self.db_session = db_session
         self.track_str = track_str
-        self.ignore_tweet_list = ignore_tweet_list
-        self.ignore_profile_list = ignore_profile_list
-        self.syllable_dict = syllable_dict
-        self.emoticons_list = emoticons_list
-        self.inflect_p = inflect_p
-        self.pronounce_dict = pronounce_dict
+        self.scheduler = scheduler
+        self.haiku_writer = haiku_writer
 
-    @retry(wait=wait_fixed(RETRY_WAIT_SECONDS))
+        self.analyzer = None
+        self.analysis_pool = None
+        self.pending = None
+        self.coordinator = None
+        # The stream reader and the hydrator take turns analyzing without a pool
+        self.analysis_lock = threading.Lock()
+        self.hydrator = StatusHydrator(
+            lookup=partial(lookup_statuses, self.twitter),
+            on_hydrated=self.process_status,
+            batch_size=HYDRATE_BATCH_SIZE,
+            max_delay_seconds=HYDRATE_MAX_DELAY_SECONDS,
+        )
+        # Set once tweets can be analyzed; the stream does not connect before then
+        self.ready = threading.Event()
+        # Set when asked to stop; a tweet being handled is finished first
+        self.stopping = False
+        self.handling = False
+        if analyzer is not None or analysis_pool is not None:
+            self.set_analysis(analyzer=analyzer, analysis_pool=analysis_pool)
+
+    def set_analysis(
+        self, analyzer: TweetAnalyzer = None, analysis_pool: ProcessPoolExecutor = None
+    ):
+        """Analyze tweets with the analyzer, or in the worker pool, and become ready"""
+        self.analyzer = analyzer or TweetAnalyzer()
+        self.analysis_pool = analysis_pool
+        if self.analysis_pool is not None:
+            # Bounded, so the reader waits instead of piling up tweets in memory
+            self.pending = queue.Queue(maxsize=ANALYSIS_QUEUE_SIZE)
+            self.coordinator = threading.Thread(
+                target=self.coordinate, name="haiku-coordinator", daemon=True
+            )
+            self.coordinator.start()
+        self.ready.set()
+
+    @retry(
+        wait=wait_fixed(RETRY_WAIT_SECONDS),
+        retry=retry_if_not_exception_type(StreamStoppedError),
+    )
     def stream_tweets(self):
+        if not self.ready.is_set():
+            logger.info("Waiting for tweet analysis to be ready...")
+            self.ready.wait()
+
         # Use try/except to avoid ChunkedEncodingError
         # https://github.com/ryanmcgrath/twython/issues/288#issuecomment-66360160
         try:
@@ -235,6 +588,8 @@ class MyStreamer(TwythonStreamer):
             else:
                 # get samples from stream
                 self.statuses.sample()
+        except StreamStoppedError:
+            raise
         except TwythonRateLimitError as e:
             logger.info(f"Rate limit exceeded when streaming tweets: {e}")
             raise
@@ -242,108 +597,230 @@ class MyStreamer(TwythonStreamer):
             logger.info(f"Exception when streaming tweets: {e}")
             raise
 
+    def stop(self, signum=None, frame=None):
+        """Signal handler: stop streaming, so main can finish the accepted tweets.
+
+        Runs on the stream-reading thread. While it waits for tweets (or to retry),
+        StreamStoppedError ends the stream right away; a tweet being handled is
+        finished first, then on_success raises it.
+        """
+        if self.stopping:
+            logger.info("Already stopping, finishing accepted tweets...")
+            return
+        logger.info(f"Received signal {signum}, stopping the stream...")
+        self.stopping = True
+        self.disconnect()
+        if not self.handling:
+            raise StreamStoppedError()
+
     def on_success(self, status):
-        # If this tweet was truncated, get the full text
-        if "truncated" in status and status["truncated"]:
-            status_full = self.twitter.get_user_timeline(
-                user_id=status["user"]["id"],
-                tweet_mode="extended",
-                max_id=status["id"],
-                count=1,
-            )
-            if status_full and (status_full[0]["id"] == status["id"]):
-                logger.debug(f"Retrieved full text for truncated tweet {status['id']}")
-                status = status_full[0]
+        self.handling = True
+        try:
+            # If this tweet was truncated, get the full text without waiting for it
+            if "truncated" in status and status["truncated"]:
+                self.hydrator.submit(status)
             else:
-                logger.debug(f"Didn't get full text for truncated tweet {status['id']}")
+                self.process_status(status)
+        finally:
+            self.handling = False
+        if self.stopping:
+            raise StreamStoppedError()
 
-        tweet_passes = check_tweet(
-            status,
-            language=LANGUAGE,
-            ignore_user_screen_names=IGNORE_USER_SCREEN_NAMES,
-            ignore_user_id_str=IGNORE_USER_ID_STR,
-        )
+    def process_status(self, status):
+        """Analyze a status, and handle its haiku"""
+        if self.analysis_pool is None:
+            with self.analysis_lock:
+                tweet = PreparedTweet(status)
+                result = self.analyzer.analyze(tweet)
+                if result is not None:
+                    self.handle_haiku(tweet, *result)
+        else:
+            self.pending.put(
+                (status, self.analysis_pool.submit(analyze_in_worker, status))
+            )
 
-        if not tweet_passes:
+    def coordinate(self):
+        """Handle analysis results from the worker pool until told to stop"""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            status, future = item
+            try:
+                result = future.result()
+                if result is not None:
+                    self.handle_haiku(status, *result)
+            except Exception as e:
+                logger.info(f"Exception when handling tweet {status['id_str']}: {e}")
+
+    def close_analysis(self):
+        """Stop accepting tweets, then finish every tweet that was accepted"""
+        self.hydrator.close()
+        logger.debug(f"Status hydrator: {self.hydrator.stats()}")
+        if self.analysis_pool is None:
+            if self.analyzer is not None and self.analyzer.profile_cache is not None:
+                self.analyzer.profile_cache.save()
             return
+        logger.info("Finishing analysis of accepted tweets...")
+        self.pending.put(None)
+        self.coordinator.join()
+        self.analysis_pool.shutdown(wait=True)
 
-        if CHECK_USER_PROFILE:
-            profile_passes = check_profile(
-                status,
-                ignore_profile_list=self.ignore_profile_list,
-                match_substring=CHECK_USER_PROFILE_MATCH_SUBSTRING,
-            )
+    def handle_haiku(self, status: dict | PreparedTweet, text: str, haiku: str):
+        # Add it to the database
+        tweet_haiku = Haiku.add_haiku(
+            self.db_session,
+            status,
+            text,
+            haiku,
+            log_haiku=LOG_HAIKU,
+            write_buffer=self.haiku_writer,
+        )
+        logger.info("=" * 50)
+        logger.info(f"Found new haiku:\n{tweet_haiku.haiku}")
 
-            if not profile_passes:
-                logger.info(
-                    f"Failed check_profile: {status['user']['screen_name']}:"
-                    f" {' '.join(status['user']['description'].splitlines())}"
-                )
-                return
+        if self.scheduler is not None:
+            self.scheduler.add_candidate(tweet_haiku)
 
-        text_passes = check_text_wrapper(status, ignore_list=self.ignore_tweet_list)
+    def on_error(self, status_code, content, headers=None):
+        content = (
+            content.decode().strip() if isinstance(content, bytes) else content.strip()
+        )
+        logger.info("Error while streaming.")
+        logger.info(f"status_code: {status_code}")
+        logger.info(f"content: {content}")
+        logger.info(f"headers: {headers}")
+        if status_code == 420:
+            # Server overloaded, try again in a few seconds
+            # Exceeded connection limit for user
+            # Too many requests recently
+            raise TwythonRateLimitError("Too many requests recently")
+        else:
+            # Unable to decode response
+            # (or something else)
+            pass
 
-        if not text_passes:
-            logger.info(
-                f"Failed check_text_wrapper: {status['user']['screen_name']}, tweet"
-                f" {status['id_str']}: {get_tweet_body(status)}"
-            )
-            return
 
-        text = clean_text(get_tweet_body(status))
+class HaikuScheduler:
+    """Chooses the best candidate haiku every EVERY_N_SECONDS, and adds the actions to
+    post it to the outbox. Runs on a background thread with its own database session,
+    so the stream never waits on the Twitter REST API.
+    """
 
-        haiku = get_haiku(
-            text,
-            self.inflect_p,
-            self.pronounce_dict,
-            self.syllable_dict,
-            self.emoticons_list,
-            GUESS_SYL_METHOD,
+    def __init__(
+        self,
+        twitter,
+        db_session,
+        outbox_worker: OutboxWorker = None,
+        status_lookup: StatusLookup = None,
+    ):
+        self.twitter = twitter
+        self.db_session = db_session
+        self.outbox_worker = outbox_worker
+        self.status_lookup = (
+            status_lookup
+            if status_lookup is not None
+            else StatusLookup(twitter, StatusCache(ttl=STATUS_CACHE_TTL_SECONDS))
         )
+        # Haikus found since the last run, when they are not kept in the database
+        self.candidates = deque()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
 
-        if not haiku:
-            return
+    def add_candidate(self, tweet_haiku: Haiku):
+        if not LOG_HAIKU:
+            self.candidates.append(tweet_haiku)
 
-        # Add it to the database
-        tweet_haiku = Haiku.add_haiku(
-            self.db_session, status, text, haiku, log_haiku=LOG_HAIKU
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.run, name="haiku-scheduler", daemon=True
         )
-        logger.info("=" * 50)
-        logger.info(f"Found new haiku:\n{tweet_haiku.haiku}")
+        self._thread.start()
 
-        if not DEBUG_MODE:
-            # Get haikus from the last hour
-            haikus = Haiku.get_haikus_unposted_timedelta(
-                self.db_session, td_seconds=EVERY_N_SECONDS
-            )
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
 
-            # Delete old data by row count
-            Haiku.keep_haikus_n_rows(self.db_session, n=ROWS_TO_KEEP)
+    def run(self):
+        while not self._stopping:
+            try:
+                wait_seconds = self.run_once()
+            except Exception as e:
+                logger.warning(f"Exception when choosing a haiku to post: {e}")
+                self.db_session.rollback()
+                wait_seconds = EVERY_N_SECONDS
+            self._wake.wait(timeout=wait_seconds)
+        # Give back the connection from this thread
+        self.db_session.close()
 
-            # Delete old data by timestamp
-            Haiku.delete_haikus_unposted_timedelta(
-                self.db_session, days=DELETE_OLDER_THAN_DAYS
-            )
-            Haiku.delete_haikus_posted_timedelta(
-                self.db_session, days=DELETE_OLDER_THAN_DAYS
-            )
-        else:
-            # Use the current haiku
-            haikus = [tweet_haiku]
+    def get_candidates(self) -> list:
+        if not LOG_HAIKU:
+            haikus = []
+            while self.candidates:
+                haikus.append(self.candidates.popleft())
+            return haikus
+
+        # Get haikus from the last hour
+        haikus = Haiku.get_haikus_unposted_timedelta(
+            self.db_session, td_seconds=EVERY_N_SECONDS
+        )
+
+        # Delete old data by row count
+        Haiku.keep_haikus_n_rows(self.db_session, n=ROWS_TO_KEEP)
+
+        # Delete old data by timestamp
+        Haiku.delete_haikus_unposted_timedelta(
+            self.db_session, days=DELETE_OLDER_THAN_DAYS
+        )
+        Haiku.delete_haikus_posted_timedelta(
+            self.db_session, days=DELETE_OLDER_THAN_DAYS
+        )
 
         # # Get all unposted haikus
         # haikus = Haiku.get_haikus_unposted(self.db_session)
+        return haikus
+
+    def run_once(self) -> float:
+        """Choose a haiku to post, if it is time. Returns seconds until the next run."""
+        if POST_HAIKU:
+            # Rate limit, and wait for the previous post to finish
+            wait_seconds = self.twitter.seconds_until_can_post(
+                datetime.now(tz=timezone.utc)
+            )
+            if wait_seconds > 0:
+                return wait_seconds
+            if OutboxAction.count_actions_pending(self.db_session, action="post"):
+                logger.info("Previous haiku is still waiting to be posted")
+                return EVERY_N_SECONDS
+
+        haikus = self.get_candidates()
+
+        # A haiku whose post failed for good would be chosen again, and its post
+        # action not added again, so leave it out
+        failed = OutboxAction.get_action_keys_failed(
+            self.db_session, [f"post:{h.status_id_str}" for h in haikus]
+        )
+        haikus = [h for h in haikus if f"post:{h.status_id_str}" not in failed]
 
         if len(haikus) == 0:
             logger.info("No haikus to choose from")
-            return
+            return EVERY_N_SECONDS
 
         # Get the haiku to post
-        haiku_to_post = get_best_haiku(haikus, self.twitter, self.db_session)
+        haiku_to_post = get_best_haiku(
+            haikus, self.twitter, self.db_session, status_lookup=self.status_lookup
+        )
         if haiku_to_post["status_id_str"] == "":
-            return
+            return EVERY_N_SECONDS
 
-        status = self.twitter.show_status(id=haiku_to_post["status_id_str"])
+        # Looked up just now while ranking, so this comes from the cache
+        status = self.status_lookup.get_status(haiku_to_post["status_id_str"])
+        if status is None:
+            logger.info(f"Could not get status {haiku_to_post['status_id_str']}")
+            return EVERY_N_SECONDS
 
         # Format the haiku with attribution
         haiku_attributed = (
@@ -363,92 +840,156 @@ class MyStreamer(TwythonStreamer):
             logger.debug(f"Cleaned:  {haiku_to_post['text_clean']}")
         logger.info(f"Haiku to post:\n{haiku_attributed}")
 
-        # Try to post haiku (client checks rate limit time internally)
         if not POST_HAIKU:
             logger.debug(f"Found haiku but did not post: {haiku_attributed}")
-            return
+            return EVERY_N_SECONDS
 
+        payload = {
+            "status_id_str": haiku_to_post["status_id_str"],
+            "user_screen_name": haiku_to_post["user_screen_name"],
+            "status": haiku_attributed,
+            "attachment_url": tweet_url,
+        }
         if POST_AS_REPLY:
-            logger.info("Attempting to post haiku as reply...")
             # Post a tweet, sending as a reply to the coincidental haiku
-            posted_status = self.twitter._update_status(
-                status=haiku_attributed,
-                in_reply_to_status_id=status["id_str"],
-                attachment_url=tweet_url,
-            )
-        else:
-            logger.info("Attempting to post haiku, but not as reply...")
-            # Post a tweet, but not as a reply to the coincidental haiku
-            # The user will not get a notification
-            posted_status = self.twitter._update_status(
-                status=haiku_attributed,
-                attachment_url=tweet_url,
-            )
-        if posted_status:
-            logger.info("Attempting to follow this poet...")
-            Haiku.update_haiku_posted(self.db_session, haiku_to_post["status_id_str"])
-
-            # follow the user
-            if FOLLOW_POET:
-                try:
-                    followed = self.twitter.create_friendship(
-                        screen_name=haiku_to_post["user_screen_name"],
-                        # follow: enable notifications
-                        follow="false",
-                    )
-                    if followed["following"]:
-                        logger.info("Success")
-                    else:
-                        logger.info("Could not follow")
-                except TwythonError as e:
-                    logger.info(e)
+            payload["in_reply_to_status_id"] = status["id_str"]
+        # Otherwise the user will not get a notification
+        added = OutboxAction.add_action(
+            self.db_session,
+            "post",
+            f"post:{haiku_to_post['status_id_str']}",
+            payload,
+        )
+        if added and self.outbox_worker is not None:
+            self.outbox_worker.wake()
+        return EVERY_N_SECONDS
 
-    def on_error(self, status_code, content, headers=None):
-        content = (
-            content.decode().strip() if isinstance(content, bytes) else content.strip()
+
+def post_haiku_action(twitter, db_session, payload: dict):
+    """Outbox handler: post a haiku, mark it posted, and maybe follow the poet"""
+    if Haiku.is_haiku_posted(db_session, payload["status_id_str"]):
+        logger.info(f"Haiku was already posted: {payload['status_id_str']}")
+        return
+
+    logger.info(
+        "Attempting to post haiku"
+        f"{' as reply' if 'in_reply_to_status_id' in payload else ', but not as reply'}"
+        "..."
+    )
+    try:
+        # Client checks rate limit time internally
+        posted_status = twitter._update_status(
+            status=payload["status"],
+            in_reply_to_status_id=payload.get("in_reply_to_status_id"),
+            attachment_url=payload["attachment_url"],
         )
-        logger.info("Error while streaming.")
-        logger.info(f"status_code: {status_code}")
-        logger.info(f"content: {content}")
-        logger.info(f"headers: {headers}")
-        if status_code == 420:
-            # Server overloaded, try again in a few seconds
-            # Exceeded connection limit for user
-            # Too many requests recently
-            raise TwythonRateLimitError("Too many requests recently")
-        else:
-            # Unable to decode response
-            # (or something else)
-            pass
+    except TwythonError as e:
+        # An earlier attempt posted it, but did not get to record that
+        if "duplicate" not in str(e).lower():
+            raise
+        logger.info("Haiku was already posted")
+        posted_status = True
+
+    if not posted_status:
+        # e.g., within our post limit; raise so the outbox tries again later
+        raise RuntimeError(f"Haiku was not posted: {payload['status_id_str']}")
+
+    Haiku.update_haiku_posted(db_session, payload["status_id_str"])
+
+    # follow the user
+    if FOLLOW_POET:
+        OutboxAction.add_action(
+            db_session,
+            "follow",
+            f"follow:{payload['user_screen_name']}",
+            {"screen_name": payload["user_screen_name"]},
+        )
+
+
+def follow_poet_action(twitter, db_session, payload: dict):
+    """Outbox handler: follow the poet of a posted haiku"""
+    logger.info("Attempting to follow this poet...")
+    followed = twitter.create_friendship(
+        screen_name=payload["screen_name"],
+        # follow: enable notifications
+        follow="false",
+    )
+    if followed["following"]:
+        logger.info("Success")
+    else:
+        logger.info("Could not follow")
 
 
 def main():
+    start = time.perf_counter()
     logger.info("Initializing dependencies...")
 
     # get data to use for dealing with tweets
     data_dir = root_dir / "data"
     track_str = get_track_str(data_dir / "track.txt")
-    ignore_tweet_list = get_ignore_tweet_list(data_dir / "ignore_tweet.txt")
-    ignore_profile_list = get_ignore_profile_list(data_dir / "ignore_profile.txt")
-    syllable_dict = get_syllable_dict(data_dir / "syllables.json")
-    emoticons_list = get_emoticons_list(data_dir / "emoticons.txt")
 
-    # Use inflect to change digits to their English word equivalent
-    inflect_p = inflect.engine()
-    # Use the CMU dictionary to count syllables
-    pronounce_dict = cmudict.dict()
+    analysis = None
+    analysis_pool = None
+    workers_ready_queue = None
+    workers_started = []
+    startup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="startup")
+    if ANALYSIS_WORKERS > 0:
+        # Each worker loads the lexicon and ignore lists once, in parallel.
+        # Start them before any other threads, as they may be forked.
+        logger.info(f"Starting {ANALYSIS_WORKERS} analysis workers...")
+        # Each worker puts its process id here once its analyzer is loaded
+        workers_ready_queue = multiprocessing.Queue()
+        analysis_pool = ProcessPoolExecutor(
+            max_workers=ANALYSIS_WORKERS,
+            initializer=init_analysis_worker,
+            initargs=(data_dir, workers_ready_queue),
+        )
+        # Forked workers all start now; spawned ones start as tasks are submitted
+        workers_started = [
+            analysis_pool.submit(analysis_worker_ready) for _ in range(ANALYSIS_WORKERS)
+        ]
+    else:
+        # Load the analyzer in the background while connecting to Twitter
+        analysis = startup.submit(load_analyzer, data_dir, PROFILE_CACHE_PATH)
 
-    # Establish connection to Twitter;
-    # Uses OAuth1 ("user auth") for authentication
-    twitter = MyTwitterClient(
-        app_key=APP_KEY,
-        app_secret=APP_SECRET,
-        oauth_token=OAUTH_TOKEN,
-        oauth_token_secret=OAUTH_TOKEN_SECRET,
-    )
+    with startup_phase("Twitter client"):
+        # Establish connection to Twitter;
+        # Uses OAuth1 ("user auth") for authentication
+        twitter = MyTwitterClient(
+            app_key=APP_KEY,
+            app_secret=APP_SECRET,
+            oauth_token=OAUTH_TOKEN,
+            oauth_token_secret=OAUTH_TOKEN_SECRET,
+        )
 
-    # Establish connection to database
-    db_session = session_factory(DATABASE_URL)
+    with startup_phase("database"):
+        # Establish connection to database
+        db_session = session_factory(DATABASE_URL)
+
+    # Insert, choose, and post haikus in the background, each with its own session
+    haiku_writer = (
+        HaikuWriteBuffer(
+            session_factory(DATABASE_URL),
+            max_rows=HAIKU_WRITE_BATCH_ROWS,
+            max_delay_ms=HAIKU_WRITE_MAX_DELAY_MS,
+            max_pending=HAIKU_WRITE_QUEUE_SIZE,
+        )
+        if LOG_HAIKU
+        else None
+    )
+    outbox_worker = OutboxWorker(
+        session_factory(DATABASE_URL),
+        handlers={
+            "post": partial(post_haiku_action, twitter),
+            "follow": partial(follow_poet_action, twitter),
+        },
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        retry_wait_seconds=RETRY_WAIT_SECONDS,
+        poll_seconds=OUTBOX_POLL_SECONDS,
+    )
+    scheduler = HaikuScheduler(
+        twitter, session_factory(DATABASE_URL), outbox_worker=outbox_worker
+    )
 
     logger.info("Initializing tweet streamer...")
     stream = MyStreamer(
@@ -459,16 +1000,42 @@ def main():
         twitter=twitter,
         db_session=db_session,
         track_str=track_str,
-        ignore_tweet_list=ignore_tweet_list,
-        ignore_profile_list=ignore_profile_list,
-        syllable_dict=syllable_dict,
-        emoticons_list=emoticons_list,
-        inflect_p=inflect_p,
-        pronounce_dict=pronounce_dict,
+        scheduler=scheduler,
+        haiku_writer=haiku_writer,
     )
 
+    with startup_phase("waiting for analysis"):
+        if analysis_pool is not None:
+            worker_pids = wait_for_analysis_workers(
+                workers_ready_queue, ANALYSIS_WORKERS, workers_started
+            )
+            logger.info(f"Analysis workers ready: {len(worker_pids)}")
+            stream.set_analysis(analysis_pool=analysis_pool)
+        else:
+            stream.set_analysis(analyzer=analysis.result())
+        startup.shutdown()
+    logger.info(f"Ready to look for haikus after {time.perf_counter() - start:.2f} s")
+
+    outbox_worker.start()
+    scheduler.start()
+
+    # Stop streaming on docker stop, a dyno restart, or Ctrl-C, and finish up below
+    signal.signal(signal.SIGTERM, stream.stop)
+    signal.signal(signal.SIGINT, stream.stop)
+
     logger.info("Looking for haikus...")
-    stream.stream_tweets()
+    try:
+        stream.stream_tweets()
+    except StreamStoppedError:
+        logger.info("Stopped streaming")
+    finally:
+        stream.close_analysis()
+        if haiku_writer is not None:
+            haiku_writer.close()
+            logger.info(f"Haiku writer: {haiku_writer.stats()}")
+        scheduler.stop()
+        outbox_worker.stop()
+        logger.info(f"Outbox: {outbox_worker.stats()}")
 
 
 if __name__ == "__main__":
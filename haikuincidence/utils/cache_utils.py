@@ -0,0 +1,243 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger("haiku_logger")
+
+
+class LRUCache:
+    """Thread-safe least recently used cache with hit, miss, and eviction counters.
+    A maxsize of 0 disables caching. With a ttl, entries expire after ttl seconds.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None):
+        self.maxsize = maxsize if maxsize is not None else 10000
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key, default=None, accept=None):
+        """The value for key, or default. A value that accept(value) rejects is
+        returned as default and counted as a miss.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if self.ttl is not None:
+                expires_at, value = value
+                if expires_at <= time.time():
+                    del self._data[key]
+                    self.expirations += 1
+                    self.misses += 1
+                    return default
+            if accept is not None and not accept(value):
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, expires_at: float = None):
+        if self.maxsize <= 0:
+            return
+        if self.ttl is not None:
+            value = (expires_at or time.time() + self.ttl, value)
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SyllableCache(LRUCache):
+    """Syllable counts per raw token, keyed by (token, guess method, lexicon version).
+    A token that was only bounded (see might_be_haiku) holds its (min, max) bounds
+    under the same key until it is counted, so either is found in one lookup.
+    Cleared automatically when a different lexicon version is seen.
+    """
+
+    def __init__(self, maxsize: int = None):
+        super().__init__(maxsize=maxsize)
+        self.lexicon_version = None
+
+    def _check_version(self, lexicon_version):
+        if lexicon_version == self.lexicon_version:
+            return
+        with self._lock:
+            if lexicon_version != self.lexicon_version:
+                if self.lexicon_version is not None:
+                    logger.info("Lexicon changed, clearing syllable cache")
+                self._data.clear()
+                self.lexicon_version = lexicon_version
+
+    def get_syllables(self, token: str, guess_syl_method: str, lexicon_version):
+        """The count, or None if the token was not counted. Finding only bounds is a
+        miss, since the token still has to be counted.
+        """
+        self._check_version(lexicon_version)
+        return self.get(
+            (token, guess_syl_method, lexicon_version),
+            accept=lambda syllables: not isinstance(syllables, tuple),
+        )
+
+    def get_syllables_or_bounds(
+        self, token: str, guess_syl_method: str, lexicon_version
+    ):
+        """The count, or (min, max) bounds if the token was only bounded, or None"""
+        self._check_version(lexicon_version)
+        return self.get((token, guess_syl_method, lexicon_version))
+
+    def put_syllables(
+        self, token: str, guess_syl_method: str, lexicon_version, syllables: int
+    ):
+        self._check_version(lexicon_version)
+        self.put((token, guess_syl_method, lexicon_version), syllables)
+
+    def put_syllable_bounds(
+        self, token: str, guess_syl_method: str, lexicon_version, bounds: tuple
+    ):
+        self._check_version(lexicon_version)
+        self.put((token, guess_syl_method, lexicon_version), bounds)
+
+
+class ProfileVerdictCache(LRUCache):
+    """check_profile verdicts per user, keyed by user id and a hash of the description,
+    so a changed description is checked again. Verdicts expire after ttl seconds.
+
+    With a filepath, verdicts are loaded from and saved to a JSON file, to survive
+    restarts. The fingerprint identifies the settings the verdicts were made with
+    (e.g., the ignore list); a file saved with a different fingerprint is ignored.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = None,
+        ttl: float = None,
+        filepath: Path = None,
+        fingerprint: str = "",
+        save_every_seconds: float = None,
+    ):
+        super().__init__(maxsize=maxsize, ttl=ttl if ttl is not None else 86400)
+        self.filepath = Path(filepath) if filepath else None
+        self.fingerprint = fingerprint
+        self.save_every_seconds = (
+            save_every_seconds if save_every_seconds is not None else 300
+        )
+        self.last_save_time = time.time()
+        self.unsaved = 0
+        if self.filepath is not None:
+            self.load()
+
+    @staticmethod
+    def profile_key(status) -> str:
+        user = status["user"]
+        description = (user.get("description") or "").encode("utf-8")
+        description_hash = hashlib.blake2b(description, digest_size=8).hexdigest()
+        return f"{user['id_str']}:{description_hash}"
+
+    def get_verdict(self, status):
+        """The cached verdict for this user and description, or None"""
+        return self.get(self.profile_key(status))
+
+    def put_verdict(self, status, verdict: bool):
+        self.put(self.profile_key(status), verdict)
+        self.unsaved += 1
+
+    def load(self):
+        try:
+            with open(self.filepath) as fp:
+                saved = json.load(fp)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.info(f"Unable to load profile cache {self.filepath}: {e}")
+            return
+        if saved.get("fingerprint") != self.fingerprint:
+            logger.info("Profile check settings changed, not loading profile cache")
+            return
+        now = time.time()
+        with self._lock:
+            # Saved least recently used first, so the order is kept
+            for key, (expires_at, verdict) in saved["verdicts"].items():
+                if expires_at > now:
+                    self.put(key, verdict, expires_at=expires_at)
+        logger.info(f"Loaded {len(self)} profile verdicts from {self.filepath}")
+
+    def save(self):
+        if self.filepath is None:
+            return
+        with self._lock:
+            saved = {"fingerprint": self.fingerprint, "verdicts": dict(self._data)}
+            self.unsaved = 0
+            self.last_save_time = time.time()
+        # Write to a temporary file first, so a crash never leaves a partial file
+        tmp_filepath = self.filepath.with_name(f"{self.filepath.name}.tmp")
+        try:
+            with open(tmp_filepath, "w") as fp:
+                json.dump(saved, fp)
+            os.replace(tmp_filepath, self.filepath)
+        except OSError as e:
+            logger.info(f"Unable to save profile cache {self.filepath}: {e}")
+
+    def save_if_due(self):
+        """Save if there are new verdicts and it has been a while since the last save"""
+        if (
+            self.filepath is not None
+            and self.unsaved
+            and time.time() - self.last_save_time >= self.save_every_seconds
+        ):
+            self.save()
+
+
+class StatusCache(LRUCache):
+    """Statuses looked up from Twitter, keyed by status id, kept for ttl seconds.
+    Short-lived, so favorite and retweet counts stay fresh enough to rank haikus.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None):
+        super().__init__(
+            maxsize=maxsize if maxsize is not None else 1000,
+            ttl=ttl if ttl is not None else 60,
+        )
+
+    def get_status(self, id_str: str):
+        """The cached status, or None"""
+        return self.get(id_str)
+
+    def put_status(self, status: dict):
+        self.put(status["id_str"], status)
@@ -1,11 +1,27 @@
+import json
 import logging
+import queue
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, create_engine, desc
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Integer,
+    String,
+    and_,
+    create_engine,
+    desc,
+    or_,
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 
+from .migration_utils import migrate
 from .text_utils import date_string_to_datetime, get_tweet_body
 
 logger = logging.getLogger("haiku_logger")
@@ -16,13 +32,17 @@ Base = declarative_base()
 def session_factory(database_url: str, echo: bool = None):
     echo = echo if echo is not None else False
     engine = create_engine(database_url, poolclass=NullPool, echo=echo)
-    Base.metadata.create_all(engine)
+    # Create the tables and bring the schema up to date
+    migrate(engine)
     session_factory = sessionmaker(bind=engine)
     return session_factory()
 
 
 class Haiku(Base):
-    """To drop this table, run Haiku.metadata.drop_all(engine)"""
+    """To drop this table, run Haiku.metadata.drop_all(engine)
+
+    Indexes, and the unique status_id_str, are added by migrations (migration_utils).
+    """
 
     __tablename__ = "haikus"
 
@@ -39,8 +59,16 @@ class Haiku(Base):
     date_deleted = Column(DateTime, nullable=True)
 
     @classmethod
-    def add_haiku(cls, db_session, status, text, haiku, log_haiku: bool = None):
-        """Add haiku record to the database"""
+    def add_haiku(
+        cls,
+        db_session,
+        status,
+        text,
+        haiku,
+        log_haiku: bool = None,
+        write_buffer: "HaikuWriteBuffer" = None,
+    ):
+        """Add haiku record to the database, through the write buffer if given"""
         log_haiku = log_haiku if log_haiku is not None else True
 
         tweet_haiku = cls(
@@ -56,7 +84,9 @@ class Haiku(Base):
             date_deleted=None,
         )
 
-        if log_haiku:
+        if log_haiku and write_buffer is not None:
+            write_buffer.add(tweet_haiku)
+        elif log_haiku:
             db_session.add(tweet_haiku)
             try:
                 db_session.commit()
@@ -66,6 +96,14 @@ class Haiku(Base):
 
         return tweet_haiku
 
+    def to_row(self) -> dict:
+        """Column values for an insert, without the primary key"""
+        return {
+            column.name: getattr(self, column.name)
+            for column in self.__table__.columns
+            if not column.primary_key
+        }
+
     @classmethod
     def get_haikus_all(cls, db_session) -> list:
         """Get all records"""
@@ -106,6 +144,16 @@ class Haiku(Base):
         )
         return q.all()
 
+    @classmethod
+    def is_haiku_posted(cls, db_session, status_id_str: str) -> bool:
+        """Whether the haiku of this status was posted"""
+        q = (
+            db_session.query(cls.id)
+            .filter(cls.status_id_str == status_id_str)
+            .filter(cls.date_posted != None)  # noqa: E711
+        )
+        return q.first() is not None
+
     @classmethod
     def update_haiku_posted(cls, db_session, status_id_str: str):
         """Mark haiku as posted"""
@@ -142,6 +190,20 @@ class Haiku(Base):
             logger.warning(f"Exception when updating haiku as deleted: {e}")
             db_session.rollback()
 
+    @classmethod
+    def update_haikus_deleted(cls, db_session, status_id_strs: set[str]):
+        """Mark haikus as deleted, in one statement"""
+        if not status_id_strs:
+            return
+        try:
+            db_session.query(cls).filter(
+                cls.status_id_str.in_(list(status_id_strs))
+            ).update({"date_deleted": datetime.now(tz=timezone.utc)})
+            db_session.commit()
+        except Exception as e:
+            logger.warning(f"Exception when updating haikus as deleted: {e}")
+            db_session.rollback()
+
     @classmethod
     def update_haiku_undeleted(cls, db_session, status_id_str: str):
         """Mark haiku as undeleted"""
@@ -193,21 +255,296 @@ class Haiku(Base):
                 db_session.rollback()
 
     @classmethod
-    def keep_haikus_n_rows(cls, db_session, n: int = None):
-        """Keep the most recent n rows"""
-        if n is not None:
-            ids = db_session.query(cls.id).order_by(desc(cls.created_at)).all()
-            ids_to_delete = [x[0] for x in ids[n:]]
+    def keep_haikus_n_rows(
+        cls, db_session, n: int = None, chunk_size: int = None
+    ) -> int:
+        """Keep the most recent n rows. Deletes the older rows in chunks of at most
+        chunk_size rows, each in its own statement and transaction, without loading
+        their ids. Returns the number of rows deleted.
+        """
+        if n is None:
+            return 0
+        chunk_size = chunk_size if chunk_size is not None else 10000
+        start = time.perf_counter()
 
-            if ids_to_delete:
+        # The newest row to delete; it and every older row go
+        cutoff = (
+            db_session.query(cls.created_at, cls.id)
+            .order_by(desc(cls.created_at), desc(cls.id))
+            .offset(n)
+            .limit(1)
+            .first()
+        )
+        if cutoff is None:
+            return 0
+
+        logger.info(f"Keeping most recent {n} rows of haikus")
+        to_delete = (
+            db_session.query(cls.id)
+            .filter(
+                or_(
+                    cls.created_at < cutoff.created_at,
+                    and_(cls.created_at == cutoff.created_at, cls.id <= cutoff.id),
+                )
+            )
+            .limit(chunk_size)
+            .scalar_subquery()
+        )
+        delete_q = cls.__table__.delete().where(cls.id.in_(to_delete))
+        deleted = 0
+        while True:
+            try:
+                result = db_session.execute(delete_q)
+                db_session.commit()
+            except Exception as e:
+                logger.warning(
+                    f"Exception when keeping most recent rows of haikus: {e}"
+                )
+                db_session.rollback()
+                break
+            deleted += result.rowcount
+            if result.rowcount < chunk_size:
+                break
+
+        logger.info(
+            f"Deleted {deleted} haikus beyond the most recent {n} rows in"
+            f" {time.perf_counter() - start:.2f} s"
+        )
+        return deleted
+
+
+class HaikuWriteBuffer:
+    """Collects new haiku rows and inserts them in bulk on a background thread, with its
+    own database session. A batch is inserted once it has max_rows rows or its first
+    row has waited max_delay_ms, whichever comes first.
+
+    At most max_pending rows wait to be inserted; adding more blocks until there is
+    room, so rows are never dropped. close inserts the rows that are left.
+    """
+
+    def __init__(
+        self,
+        db_session,
+        max_rows: int = None,
+        max_delay_ms: float = None,
+        max_pending: int = None,
+    ):
+        self.db_session = db_session
+        self.max_rows = max_rows if max_rows is not None else 100
+        self.max_delay_ms = max_delay_ms if max_delay_ms is not None else 1000
+        self._pending = queue.Queue(
+            maxsize=max_pending if max_pending is not None else 10000
+        )
+        self.flushes = 0
+        self.rows = 0
+        self.failures = 0
+        self.failed_rows = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.latency_seconds = 0.0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self._thread = threading.Thread(
+            target=self._run, name="haiku-writer", daemon=True
+        )
+        self._thread.start()
+
+    def add(self, tweet_haiku: Haiku):
+        item = (time.monotonic(), tweet_haiku.to_row())
+        try:
+            self._pending.put_nowait(item)
+        except queue.Full:
+            # Backpressure: wait for the writer to catch up
+            self.blocked += 1
+            start = time.perf_counter()
+            self._pending.put(item)
+            self.blocked_seconds += time.perf_counter() - start
+
+    def close(self):
+        """Insert the rows that were added, then stop"""
+        self._pending.put(None)
+        self._thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "flushes": self.flushes,
+            "rows": self.rows,
+            "failures": self.failures,
+            "failed_rows": self.failed_rows,
+            "mean_flush_rows": self.rows / self.flushes if self.flushes else 0.0,
+            "mean_flush_seconds": (
+                self.flush_seconds / self.flushes if self.flushes else 0.0
+            ),
+            "max_flush_seconds": self.max_flush_seconds,
+            "mean_latency_seconds": (
+                self.latency_seconds / self.rows if self.rows else 0.0
+            ),
+            "blocked": self.blocked,
+            "blocked_seconds": self.blocked_seconds,
+        }
+
+    def _run(self):
+        closing = False
+        while not closing:
+            item = self._pending.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = item[0] + self.max_delay_ms / 1000
+            while len(batch) < self.max_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
                 try:
-                    logger.info(f"Keeping most recent {n} rows of haikus")
-                    delete_q = cls.__table__.delete().where(cls.id.in_(ids_to_delete))
+                    item = self._pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            self.flush(batch)
 
-                    db_session.execute(delete_q)
-                    db_session.commit()
+    def flush(self, batch: list[tuple]):
+        start = time.perf_counter()
+        rows = [row for _, row in batch]
+        try:
+            # One statement for the whole batch
+            self.db_session.execute(Haiku.__table__.insert(), rows)
+            self.db_session.commit()
+        except Exception as e:
+            logger.warning(f"Exception when adding {len(rows)} haikus: {e}")
+            self.db_session.rollback()
+            self.failures += 1
+            # Insert the rows one at a time, to keep all but the bad ones
+            for row in rows:
+                try:
+                    self.db_session.execute(Haiku.__table__.insert(), [row])
+                    self.db_session.commit()
                 except Exception as e:
-                    logger.warning(
-                        f"Exception when keeping most recent rows of haikus: {e}"
-                    )
-                    db_session.rollback()
+                    logger.warning(f"Exception when adding haiku: {e}")
+                    self.db_session.rollback()
+                    self.failed_rows += 1
+        elapsed = time.perf_counter() - start
+        now = time.monotonic()
+        self.flushes += 1
+        self.rows += len(rows)
+        self.flush_seconds += elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.latency_seconds += sum(now - added for added, _ in batch)
+
+
+class OutboxAction(Base):
+    """Actions to take on Twitter, like posting a haiku or following a poet.
+    Written by the haiku scheduler and done by the outbox worker, so the stream never
+    waits on them. The action_key makes adding the same action twice a no-op.
+    """
+
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    action = Column(String, nullable=False)
+    action_key = Column(String, nullable=False, unique=True)
+    payload = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    last_error = Column(String, nullable=True)
+    date_done = Column(DateTime, nullable=True)
+    date_failed = Column(DateTime, nullable=True)
+
+    @classmethod
+    def add_action(
+        cls, db_session, action: str, action_key: str, payload: dict
+    ) -> bool:
+        """Add an action to the outbox, unless one with this key was already added"""
+        if db_session.query(cls.id).filter(cls.action_key == action_key).first():
+            logger.info(f"Action already in the outbox: {action_key}")
+            return False
+        now = datetime.now(tz=timezone.utc)
+        db_session.add(
+            cls(
+                action=action,
+                action_key=action_key,
+                payload=json.dumps(payload),
+                created_at=now,
+                attempts=0,
+                next_attempt_at=now,
+            )
+        )
+        try:
+            db_session.commit()
+            return True
+        except IntegrityError:
+            logger.info(f"Action already in the outbox: {action_key}")
+            db_session.rollback()
+            return False
+        except Exception as e:
+            logger.warning(f"Exception when adding action to the outbox: {e}")
+            db_session.rollback()
+            return False
+
+    @classmethod
+    def get_actions_due(cls, db_session) -> list:
+        """Get the actions to try now, oldest first"""
+        q = (
+            db_session.query(cls)
+            .filter(cls.date_done == None)  # noqa: E711
+            .filter(cls.date_failed == None)  # noqa: E711
+            .filter(cls.next_attempt_at <= datetime.now(tz=timezone.utc))
+            .order_by(cls.id)
+        )
+        return q.all()
+
+    @classmethod
+    def count_actions_pending(cls, db_session, action: str = None) -> int:
+        """Count the actions that are not done and have not failed for good"""
+        q = (
+            db_session.query(cls)
+            .filter(cls.date_done == None)  # noqa: E711
+            .filter(cls.date_failed == None)  # noqa: E711
+        )
+        if action is not None:
+            q = q.filter(cls.action == action)
+        return q.count()
+
+    @classmethod
+    def get_action_keys_failed(cls, db_session, action_keys: list[str]) -> set[str]:
+        """Of these action keys, the ones whose action failed for good"""
+        if not action_keys:
+            return set()
+        q = (
+            db_session.query(cls.action_key)
+            .filter(cls.action_key.in_(action_keys))
+            .filter(cls.date_failed != None)  # noqa: E711
+        )
+        return {action_key for (action_key,) in q}
+
+    @classmethod
+    def update_action_done(cls, db_session, action_id: int):
+        """Mark action as done"""
+        try:
+            db_session.query(cls).filter(cls.id == action_id).update(
+                {"date_done": datetime.now(tz=timezone.utc)}
+            )
+            db_session.commit()
+        except Exception as e:
+            logger.warning(f"Exception when updating action as done: {e}")
+            db_session.rollback()
+
+    @classmethod
+    def update_action_attempted(
+        cls, db_session, action_id: int, error: str, retry_at: datetime = None
+    ):
+        """Count a failed attempt, and retry at retry_at, or give up if it is None"""
+        values = {"attempts": cls.attempts + 1, "last_error": error}
+        if retry_at is not None:
+            values["next_attempt_at"] = retry_at
+        else:
+            values["date_failed"] = datetime.now(tz=timezone.utc)
+        try:
+            db_session.query(cls).filter(cls.id == action_id).update(values)
+            db_session.commit()
+        except Exception as e:
+            logger.warning(f"Exception when updating action attempt: {e}")
+            db_session.rollback()
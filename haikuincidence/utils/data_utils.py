@@ -1,5 +1,16 @@
 import json
 import logging
+import os
+import sys
+import threading
+from pathlib import Path
+
+from .lexicon_utils import (
+    LexiconFileError,
+    StaleLexiconError,
+    SyllableLexicon,
+)
+from .text_utils import EmoticonMatcher, IgnoreListMatcher, UserBlocklist
 
 logger = logging.getLogger("haiku_logger")
 
@@ -17,7 +28,7 @@ def get_track_str(filepath) -> str:
     return track_str
 
 
-def get_ignore_tweet_list(filepath) -> list:
+def get_ignore_tweet_list(filepath) -> IgnoreListMatcher:
     """filter out likely oppressive/offensive tweets using this word list"""
     try:
         logger.info(f"Reading ignore tweet list: {filepath}")
@@ -29,10 +40,10 @@ def get_ignore_tweet_list(filepath) -> list:
         logger.info(f"No ignore list found at: {filepath}")
         ignore_tweet_list = []
 
-    return ignore_tweet_list
+    return IgnoreListMatcher(ignore_tweet_list)
 
 
-def get_ignore_profile_list(filepath) -> list:
+def get_ignore_profile_list(filepath) -> IgnoreListMatcher:
     """filter out tweets based on contents of user profile"""
     try:
         logger.info(f"Reading ignore profile list: {filepath}")
@@ -44,7 +55,40 @@ def get_ignore_profile_list(filepath) -> list:
         logger.info(f"No ignore list found at: {filepath}")
         ignore_profile_list = []
 
-    return ignore_profile_list
+    return IgnoreListMatcher(ignore_profile_list)
+
+
+def get_user_blocklist(
+    filepath, id_strs: list[str] = None, screen_name_patterns: list[str] = None
+) -> UserBlocklist:
+    """filter out tweets from these users, one per line:
+    id:<user id>, @<exact screen name>, or a pattern to search for in the screen name.
+    Adds the given user ids and screen name patterns (e.g., from the environment).
+    """
+    id_strs = list(id_strs or [])
+    screen_names = []
+    screen_name_patterns = list(screen_name_patterns or [])
+    try:
+        logger.info(f"Reading user blocklist: {filepath}")
+        with open(filepath) as fp:
+            lines = [line.strip() for line in fp.read().splitlines()]
+        for line in lines:
+            if not line:
+                continue
+            if line.startswith("id:"):
+                id_strs.append(line[len("id:") :].strip())
+            elif line.startswith("@"):
+                screen_names.append(line[1:])
+            else:
+                screen_name_patterns.append(line)
+    except Exception:
+        logger.info(f"No user blocklist found at: {filepath}")
+
+    return UserBlocklist(
+        id_strs=id_strs,
+        screen_names=screen_names,
+        screen_name_patterns=screen_name_patterns,
+    )
 
 
 def get_syllable_dict(filepath) -> dict:
@@ -74,3 +118,107 @@ def get_emoticons_list(filepath) -> list:
         emoticons_list = []
 
     return emoticons_list
+
+
+def get_emoticon_matcher(filepath) -> EmoticonMatcher:
+    """emoticons compiled once for matching tokens (see get_emoticons_list)"""
+    return EmoticonMatcher(get_emoticons_list(filepath))
+
+
+def nltk_data_dirs() -> list[Path]:
+    """The folders NLTK looks for its data in, without importing nltk, which is slow"""
+    dirs = [Path(x) for x in os.getenv("NLTK_DATA", "").split(os.pathsep) if x]
+    dirs.append(Path.home() / "nltk_data")
+    dirs += [
+        Path(sys.prefix) / x for x in ["nltk_data", "share/nltk_data", "lib/nltk_data"]
+    ]
+    if sys.platform == "win32":
+        dirs += [Path(os.getenv("APPDATA", "C:/")) / "nltk_data"]
+        dirs += [Path(x) for x in ["C:/nltk_data", "D:/nltk_data", "E:/nltk_data"]]
+    else:
+        dirs += [
+            Path(x)
+            for x in [
+                "/usr/share/nltk_data",
+                "/usr/local/share/nltk_data",
+                "/usr/lib/nltk_data",
+                "/usr/local/lib/nltk_data",
+            ]
+        ]
+    return dirs
+
+
+def find_cmudict_path() -> Path | None:
+    """The CMU dictionary file that nltk reads, or its zip file"""
+    for data_dir in nltk_data_dirs():
+        for cmudict_path in [
+            data_dir / "corpora" / "cmudict" / "cmudict",
+            data_dir / "corpora" / "cmudict.zip",
+        ]:
+            if cmudict_path.is_file():
+                return cmudict_path
+    return None
+
+
+def get_lexicon_source_paths(syllable_filepath=None, emoticons_filepath=None) -> dict:
+    """the files the lexicon is built from, to tell if a compiled one is stale
+    (see LEXICON_SOURCES)
+    """
+    return {
+        "syllables": syllable_filepath,
+        "emoticons": emoticons_filepath,
+        "cmudict": find_cmudict_path(),
+    }
+
+
+def get_syllable_lexicon(
+    filepath, syllable_filepath=None, emoticons_filepath=None
+) -> SyllableLexicon:
+    """memory-map the compiled lexicon (see scripts/compile_lexicon.py),
+    or build it from the CMU dictionary and our data files if that is not possible,
+    or if they changed since it was compiled
+    """
+    try:
+        logger.info(f"Reading compiled lexicon: {filepath}")
+        return SyllableLexicon.load(
+            filepath,
+            source_paths=get_lexicon_source_paths(
+                syllable_filepath, emoticons_filepath
+            ),
+        )
+    except StaleLexiconError as e:
+        logger.warning(
+            f"{e}. Building it instead; run `make compile-lexicon` to update it"
+        )
+    except (OSError, LexiconFileError) as e:
+        logger.info(f"Could not read compiled lexicon, building it instead: {e}")
+
+    from nltk.corpus import cmudict
+
+    syllable_dict = get_syllable_dict(syllable_filepath) if syllable_filepath else {}
+    emoticons_list = (
+        get_emoticons_list(emoticons_filepath) if emoticons_filepath else []
+    )
+
+    return SyllableLexicon.from_dicts(syllable_dict, cmudict.dict(), emoticons_list)
+
+
+class LazyInflectEngine:
+    """inflect.engine() that imports inflect when first used, as that takes seconds.
+    Call load() in a background thread to have it ready before then.
+    """
+
+    def __init__(self):
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._engine is None:
+                import inflect
+
+                self._engine = inflect.engine()
+        return self._engine
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
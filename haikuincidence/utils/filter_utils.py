@@ -0,0 +1,87 @@
+import logging
+import time
+from collections.abc import Callable
+
+logger = logging.getLogger("haiku_logger")
+
+
+class FilterStage:
+    """A named check that passes or rejects an item, with pass/reject counters and
+    the time spent. A stage that is not reorderable keeps its position.
+    """
+
+    def __init__(self, name: str, check: Callable, reorderable: bool = None):
+        self.name = name
+        self.check = check
+        self.reorderable = reorderable if reorderable is not None else True
+        self.passed = 0
+        self.rejected = 0
+        self.time_ns = 0
+
+    @property
+    def calls(self) -> int:
+        return self.passed + self.rejected
+
+    def cost_per_rejection(self) -> float:
+        """Mean time spent per rejected item; cheap, selective stages should go first"""
+        if not self.rejected:
+            return float("inf")
+        return self.time_ns / self.rejected
+
+    def stats(self) -> dict:
+        return {
+            "passed": self.passed,
+            "rejected": self.rejected,
+            "seconds": self.time_ns / 1e9,
+            "reject_rate": self.rejected / self.calls if self.calls else 0.0,
+        }
+
+
+class FilterPipeline:
+    """Ordered stages that an item must all pass. Stops at the first stage that rejects.
+
+    With reorder_every, the reorderable stages are sorted by their observed cost per
+    rejection after every reorder_every items, so cheap and selective stages run first.
+    """
+
+    def __init__(self, stages: list[FilterStage], reorder_every: int = None):
+        self._stages = list(stages)
+        self.reorder_every = reorder_every if reorder_every is not None else 0
+        self.items = 0
+
+    @property
+    def stages(self) -> list[FilterStage]:
+        return list(self._stages)
+
+    def first_failure(self, item) -> str | None:
+        """Name of the first stage that rejects the item, or None if all pass"""
+        self.items += 1
+        if self.reorder_every and self.items % self.reorder_every == 0:
+            self.reorder()
+
+        for stage in self._stages:
+            start = time.perf_counter_ns()
+            passes = stage.check(item)
+            stage.time_ns += time.perf_counter_ns() - start
+            if not passes:
+                stage.rejected += 1
+                return stage.name
+            stage.passed += 1
+        return None
+
+    def reorder(self):
+        """Sort the reorderable stages by cost per rejection, in their own positions"""
+        movable = sorted(
+            (stage for stage in self._stages if stage.reorderable),
+            key=FilterStage.cost_per_rejection,
+        )
+        movable_iter = iter(movable)
+        stages = [
+            next(movable_iter) if stage.reorderable else stage for stage in self._stages
+        ]
+        if [stage.name for stage in stages] != [stage.name for stage in self._stages]:
+            logger.debug(f"Reordered filter stages: {[stage.name for stage in stages]}")
+        self._stages = stages
+
+    def stats(self) -> dict:
+        return {stage.name: stage.stats() for stage in self._stages}
@@ -1,13 +1,23 @@
 import logging
 import math
 import re
+import unicodedata
+from functools import lru_cache
+from itertools import accumulate
 
+from .cache_utils import SyllableCache
 from .data_base import Haiku
+from .lexicon_utils import SyllableLexicon
 from .text_utils import (
+    EmoticonMatcher,
+    PreparedTweet,
     clean_token,
+    get_emoji_index,
     remove_repeat_last_letter,
     text_might_contain_acronym,
+    text_tokens,
 )
+from .twitter_utils import StatusLookup
 
 # import random
 
@@ -20,21 +30,91 @@ punct_to_keep = ["'", ",", "."]
 # endings of contractions, for counting syllables
 contraction_ends = ["d", "ll", "m", "re", "s", "t", "ve"]
 
+# cumulative syllables at the end of each line of a haiku
+haiku_form = [5, 12, 17]
+
+# tokens with characters other than letters, digits, and apostrophes
+non_word_re = re.compile(r"[^\w']")
+
+
+def get_lexicon_version(
+    lexicon: SyllableLexicon, emoticons_list: EmoticonMatcher
+) -> tuple:
+    """Identify the lexicon so cached syllable counts are dropped when it changes"""
+    return (lexicon.version, id(emoticons_list), len(emoticons_list))
+
 
 def count_syllables(
     token: str,
     inflect_p,
-    pronounce_dict: dict,
-    syllable_dict: dict,
-    emoticons_list: list,
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
     guess_syl_method: str,
+    syllable_cache: SyllableCache = None,
 ) -> int:
-    if token in emoticons_list:
+    """Count the syllables in a token, remembering the result if given a cache"""
+    # emoji are silent, without looking anything up
+    if get_emoji_index().is_silent(token):
+        return 0
+
+    if syllable_cache is None:
+        return _count_syllables(
+            token,
+            inflect_p,
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+        )
+
+    lexicon_version = get_lexicon_version(lexicon, emoticons_list)
+    token_syl = syllable_cache.get_syllables(token, guess_syl_method, lexicon_version)
+    if token_syl is None:
+        token_syl = _count_syllables_into_cache(
+            token,
+            inflect_p,
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+            syllable_cache,
+            lexicon_version,
+        )
+    return token_syl
+
+
+def _count_syllables_into_cache(
+    token: str,
+    inflect_p,
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
+    guess_syl_method: str,
+    syllable_cache: SyllableCache,
+    lexicon_version,
+) -> int:
+    """Count a token that is not in the cache, and add it"""
+    token_syl = _count_syllables(
+        token,
+        inflect_p,
+        lexicon,
+        emoticons_list,
+        guess_syl_method,
+    )
+    syllable_cache.put_syllables(token, guess_syl_method, lexicon_version, token_syl)
+    return token_syl
+
+
+def _count_syllables(
+    token: str,
+    inflect_p,
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
+    guess_syl_method: str,
+) -> int:
+    if emoticons_list.covers(token):
         return 0
 
     # find whether the token is an exact match to a dictionary entry
-    if token in syllable_dict:
-        token_syl = syllable_dict[token]["syllables"]
+    token_syl = lexicon.get_custom(token)
+    if token_syl is not None:
         source = "Syllable dictionary"
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug(f"    {source}: {token}: {token_syl}")
@@ -44,234 +124,183 @@ def count_syllables(
 
     sub_syllable_count = 0
     for sub_token in token_clean.split():
-        # remove starting or ending punctuation
-        for punct in punct_to_keep:
-            sub_token = sub_token.strip(punct)
+        sub_syllable_count += _count_sub_token_syllables(
+            sub_token, inflect_p, lexicon, emoticons_list, guess_syl_method
+        )
 
-        # keep capitalization for checking acronyms
-        sub_token_orig = sub_token
-        # lowercase for checking against syllable_dict and pronounce_dict
-        sub_token = sub_token.lower()
+    return sub_syllable_count
 
-        if logger.isEnabledFor(logging.DEBUG):
-            logger.debug(f"    Sub-token: {sub_token}")
-
-        if sub_token.replace(",", "").replace(".", "").isdigit():
-            # split a string that looks like a year
-            if len(sub_token) == 4:
-                if sub_token.isdigit():
-                    if (int(sub_token[:2]) % 10 == 0) and (int(sub_token[2:]) < 10):
-                        sub_token = inflect_p.number_to_words(sub_token, andword="")
-                    else:
-                        sub_token = f"{sub_token[:2]} {sub_token[2:]}"
-                else:
-                    sub_token = inflect_p.number_to_words(sub_token, andword="")
-            elif len(sub_token) == 2:
-                if sub_token.isdigit():
-                    # pronounce zero as "oh"
-                    if sub_token[0] == "0":
-                        sub_token = f"oh {sub_token[1]}"
-                    else:
-                        sub_token = inflect_p.number_to_words(sub_token, andword="")
-                else:
-                    sub_token = inflect_p.number_to_words(sub_token, andword="")
+
+def verbalize_number(number: str, inflect_p) -> str:
+    """Spell out a string of digits (which may contain commas and periods)"""
+    # split a string that looks like a year
+    if len(number) == 4:
+        if number.isdigit():
+            if (int(number[:2]) % 10 == 0) and (int(number[2:]) < 10):
+                number = inflect_p.number_to_words(number, andword="")
             else:
-                sub_token = inflect_p.number_to_words(sub_token, andword="")
-            # remove all punctuation except apostrophes
-            sub_token = re.sub(r"[^\w']", " ", sub_token).strip()
-
-        if sub_token in syllable_dict:
-            sub_token_syl = syllable_dict[sub_token]["syllables"]
-            source = "Syllable dictionary"
-            sub_syllable_count += sub_token_syl
-        elif remove_repeat_last_letter(sub_token) in syllable_dict:
-            sub_token_syl = syllable_dict[remove_repeat_last_letter(sub_token)][
-                "syllables"
-            ]
-            source = "Syllable dictionary (remove repeat last letter)"
-            sub_syllable_count += sub_token_syl
-        elif (sub_token_orig.endswith("s") or sub_token_orig.endswith("z")) and (
-            sub_token[:-1] in syllable_dict
-        ):
-            sub_token_syl = syllable_dict[sub_token[:-1]]["syllables"]
-            source = "Syllable dictionary (singular)"
-            sub_syllable_count += sub_token_syl
-        elif sub_token in pronounce_dict:
-            sub_token_syl = max(
-                [
-                    len([y for y in x if y[-1].isdigit()])
-                    for x in pronounce_dict[sub_token]
-                ]
-            )
-            source = "CMU dictionary"
-            sub_syllable_count += sub_token_syl
-        elif remove_repeat_last_letter(sub_token) in pronounce_dict:
-            sub_token_syl = max(
-                [
-                    len([y for y in x if y[-1].isdigit()])
-                    for x in pronounce_dict[remove_repeat_last_letter(sub_token)]
-                ]
+                number = f"{number[:2]} {number[2:]}"
+        else:
+            number = inflect_p.number_to_words(number, andword="")
+    elif len(number) == 2:
+        if number.isdigit():
+            # pronounce zero as "oh"
+            if number[0] == "0":
+                number = f"oh {number[1]}"
+            else:
+                number = inflect_p.number_to_words(number, andword="")
+        else:
+            number = inflect_p.number_to_words(number, andword="")
+    else:
+        number = inflect_p.number_to_words(number, andword="")
+    # remove all punctuation except apostrophes
+    return re.sub(r"[^\w']", " ", number).strip()
+
+
+def build_number_syllables(
+    inflect_p,
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
+    guess_syl_method: str = None,
+    max_digits: int = 4,
+) -> dict:
+    """Syllable counts for every string of up to max_digits digits (including leading
+    zeros and years), counted exactly as count_syllables would with inflect
+    """
+    guess_syl_method = guess_syl_method or "mean"
+    numbers = {}
+    for n_digits in range(1, max_digits + 1):
+        for i in range(10**n_digits):
+            number = f"{i:0{n_digits}d}"
+            numbers[number] = _count_sub_token_syllables(
+                number,
+                inflect_p,
+                lexicon,
+                emoticons_list,
+                guess_syl_method,
+                use_number_table=False,
             )
-            source = "CMU dictionary (remove repeat last letter)"
-            sub_syllable_count += sub_token_syl
-        elif (sub_token_orig.endswith("s") or sub_token_orig.endswith("z")) and (
-            sub_token[:-1] in pronounce_dict
-        ):
-            sub_token_syl = max(
-                [
-                    len([y for y in x if y[-1].isdigit()])
-                    for x in pronounce_dict[sub_token[:-1]]
-                ]
+    return numbers
+
+
+def _count_sub_token_syllables(
+    sub_token: str,
+    inflect_p,
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
+    guess_syl_method: str,
+    use_number_table: bool = None,
+) -> int:
+    use_number_table = use_number_table if use_number_table is not None else True
+
+    # remove starting or ending punctuation
+    for punct in punct_to_keep:
+        sub_token = sub_token.strip(punct)
+
+    # keep capitalization for checking acronyms
+    sub_token_orig = sub_token
+    # lowercase for checking against the lexicon
+    sub_token = sub_token.lower()
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"    Sub-token: {sub_token}")
+
+    if sub_token.replace(",", "").replace(".", "").isdigit():
+        sub_token_syl = lexicon.get_number(sub_token) if use_number_table else None
+        if sub_token_syl is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"    Number table: {sub_token}: {sub_token_syl}")
+            return sub_token_syl
+        sub_token = verbalize_number(sub_token, inflect_p)
+
+    found = lexicon.lookup(sub_token, sub_token_orig)
+    if found is not None:
+        sub_token_syl, source = found
+    else:
+        # it's not a "real" word
+        if re.findall(r"[^\w']", sub_token):
+            # there are non-letter characters remaining (shouldn't be possible);
+            # run it through again
+            sub_token_syl = count_syllables(
+                sub_token,
+                inflect_p,
+                lexicon,
+                emoticons_list,
+                guess_syl_method,
             )
-            source = "CMU dictionary (singular)"
-            sub_syllable_count += sub_token_syl
+            source = "Non-letter characters"
         else:
-            # it's not a "real" word
-            if re.findall(r"[^\w']", sub_token):
-                # there are non-letter characters remaining (shouldn't be possible);
-                # run it through again
-                sub_token_syl = count_syllables(
-                    sub_token,
-                    inflect_p,
-                    pronounce_dict,
-                    syllable_dict,
-                    emoticons_list,
-                    guess_syl_method,
-                )
-                source = "Non-letter characters"
-                sub_syllable_count += sub_token_syl
-            else:
-                if "'" in sub_token:
-                    # contains an apostrophe
-                    if sub_token.rsplit("'")[-1] in contraction_ends:
-                        # ends with one of the contraction endings; make a guess
-                        sub_token_syl = guess_syllables(sub_token, guess_syl_method)
-                        source = "Syllable guess"
-                        sub_syllable_count += sub_token_syl
-                    else:
-                        # doesn't end with a contraction ending;
-                        # count each chunk between apostrophes
-                        for sub_sub_token in sub_token.rsplit("'"):
-                            sub_token_syl = count_syllables(
-                                sub_sub_token,
-                                inflect_p,
-                                pronounce_dict,
-                                syllable_dict,
-                                emoticons_list,
-                                guess_syl_method,
-                            )
-                            source = "Multiple apostrophes"
-                            sub_syllable_count += sub_token_syl
+            if "'" in sub_token:
+                # contains an apostrophe
+                if sub_token.rsplit("'")[-1] in contraction_ends:
+                    # ends with one of the contraction endings; make a guess
+                    sub_token_syl = guess_syllables(sub_token, guess_syl_method)
+                    source = "Syllable guess"
                 else:
-                    # no apostrophes; might be an acronym,
-                    # split the letters apart and run it through again
-                    if text_might_contain_acronym(sub_token_orig):
-                        sub_token_syl = count_syllables(
-                            " ".join(sub_token),
+                    # doesn't end with a contraction ending;
+                    # count each chunk between apostrophes
+                    sub_token_syl = 0
+                    for sub_sub_token in sub_token.rsplit("'"):
+                        sub_token_syl += count_syllables(
+                            sub_sub_token,
                             inflect_p,
-                            pronounce_dict,
-                            syllable_dict,
+                            lexicon,
                             emoticons_list,
                             guess_syl_method,
                         )
-                        source = "Acronym"
-                        sub_syllable_count += sub_token_syl
-                    else:
-                        # make a guess
-                        sub_token_syl = guess_syllables(
-                            remove_repeat_last_letter(sub_token), guess_syl_method
-                        )
-                        source = "Syllable guess"
-                        sub_syllable_count += sub_token_syl
-        if logger.isEnabledFor(logging.DEBUG):
-            logger.debug(f"    {source}: {sub_token}: {sub_token_syl}")
+                    source = "Multiple apostrophes"
+            else:
+                # no apostrophes; might be an acronym,
+                # split the letters apart and run it through again
+                if text_might_contain_acronym(sub_token_orig):
+                    sub_token_syl = count_syllables(
+                        " ".join(sub_token),
+                        inflect_p,
+                        lexicon,
+                        emoticons_list,
+                        guess_syl_method,
+                    )
+                    source = "Acronym"
+                else:
+                    # make a guess
+                    sub_token_syl = guess_syllables(
+                        remove_repeat_last_letter(sub_token), guess_syl_method
+                    )
+                    source = "Syllable guess"
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"    {source}: {sub_token}: {sub_token_syl}")
 
-    return sub_syllable_count
+    return sub_token_syl
 
 
-def guess_syllables(word: str, method: str = None, mean_round_dir: str = None) -> int:
-    """Guess the number of syllables in a string.
-    Returned value depends on the method used. Mean is usually good enough.
+# A run of vowels counts as one syllable. y acts as a vowel when the previous character
+# was not a vowel, so it can only start a run; a y right after a run acts as a consonant
+# and is consumed with the run so it cannot start the next one.
+vowel_run_re = re.compile(r"(y[aeiou]*|[aeiou]+)y?")
+word_char_re = re.compile(r"\w")
 
-    A diphthong is two vowel sounds in a single syllable (e.g., pie, boy, cow)
-    """
-
-    def avg_syl(minsyl: int, maxsyl: int, mean_round_dir: str):
-        if mean_round_dir == "up":
-            syl = math.ceil((minsyl + maxsyl) / 2)
-        elif mean_round_dir == "down":
-            syl = (minsyl + maxsyl) // 2
-        return syl
-
-    def get_syl_count_str(minsyl: int, maxsyl: int, mean_round_dir: str):
-        return (
-            f"min syl {minsyl},"
-            f" mean syl {avg_syl(minsyl, maxsyl, mean_round_dir)},"
-            f" max syl {maxsyl}"
-        )
+guess_methods = ["min", "max", "mean"]
+mean_round_dirs = ["down", "up"]
 
-    vowels = ["a", "e", "i", "o", "u"]
 
-    method = method or "mean"
-    mean_round_dir = mean_round_dir or "down"
+@lru_cache(maxsize=100000)
+def guess_syllable_range(word: str) -> tuple[int, int]:
+    """Guess the (min, max) number of syllables in a string.
 
-    assert method in ["min", "max", "mean"]
-    if method == "mean":
-        assert mean_round_dir in ["down", "up"]
+    A diphthong is two vowel sounds in a single syllable (e.g., pie, boy, cow)
+    """
+    vowels = "aeiou"
 
-    logger.debug(f"Guessing syllable count with method: {method}")
-    if method == "mean":
-        logger.debug(f"    Rounding direction: {mean_round_dir}")
+    word = word.lower()
 
-    on_vowel = False
-    in_diphthong = False
     minsyl = 0
     maxsyl = 0
-    last_char = None
-
-    word = word.lower()
-    for i, c in enumerate(word):
-        is_vowel = c in vowels
-
-        # y is a special case:
-        # serves as a vowel when the previous character was not a vowel,
-        # serves as a consonant when the previous character was a vowel
-        if c == "y":
-            is_vowel = not on_vowel
-
-        if is_vowel:
-            logger.debug(f"vowel: {c}")
-            if not on_vowel:
-                # We weren't on a vowel before.
-                # Seeing a new vowel bumps the syllable count.
-                minsyl += 1
-                maxsyl += 1
-                logger.debug(
-                    "    new syllable:"
-                    f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
-                )
-            elif on_vowel and not in_diphthong and c != last_char:
-                # We were already in a vowel.
-                # Don't increment anything except the max count,
-                # and only do that once per diphthong.
-                in_diphthong = True
-                maxsyl += 1
-                logger.debug(
-                    "    diphthong:"
-                    f" {c}: {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
-                )
-        else:
-            in_diphthong = False
-            if re.findall(r"[\w]", c):
-                logger.debug(f"consonant: {c}")
-            else:
-                logger.debug(f"other: {c}")
-
-        if i + 1 == len(word):
-            break
-
-        on_vowel = is_vowel
-        last_char = c
+    for run in vowel_run_re.findall(word):
+        # Each vowel run is a new syllable.
+        # A run with more than one distinct vowel may be a diphthong,
+        # which only increments the max count, once per run.
+        minsyl += 1
+        maxsyl += 1 if run.count(run[0]) == len(run) else 2
 
     # May have counted too many syllables: If word ends in e, or past tense (-ed),
     # run some checks.
@@ -282,43 +311,22 @@ def guess_syllables(word: str, method: str = None, mean_round_dir: str = None) -
         and (word[-3] not in ["d", "t"])
     ):
         minsyl -= 1
-        # maxsyl -= 1
-        logger.debug(
-            f"Ends in e or ed (with conditions), removing a syllable for '{word}':"
-            f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
-        )
 
-    if (len(word) >= 3) and (word[-2:] == "le") and (word[-3] not in [*vowels, "l"]):
+    if (len(word) >= 3) and (word[-2:] == "le") and (word[-3] not in f"{vowels}l"):
         minsyl += 1
         maxsyl += 1
-        logger.debug(
-            f"Adding back a syllable for '{word}':"
-            f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
-        )
 
     # Possessive with word ending in certain sounds may not get enough syllables
     if (len(word) >= 3) and (word[-2:] == "'s") and (word[-3] in ["x"]):
         minsyl += 1
         maxsyl += 1
-        logger.debug(
-            f"Possessive: Adding a syllable for '{word}':"
-            f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
-        )
 
     # check on ending with a consonant followed by y
     if (len(word) >= 3) and (word[-2] not in vowels) and (word[-1] == "y"):
         if word[-3] == "e":
             minsyl -= 1
-            logger.debug(
-                f"Ends with e + consonant + y: Removing a syllable for '{word}':"
-                f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
-            )
         else:
             maxsyl += 1
-            logger.debug(
-                f"Ends with consonant + y: Adding a syllable for '{word}':"
-                f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
-            )
 
     # other special cases
     if word.endswith("phobia") or word.endswith("bio"):
@@ -326,112 +334,392 @@ def guess_syllables(word: str, method: str = None, mean_round_dir: str = None) -
 
     # if found no syllables but there's at least one letter,
     # count as one syllable
-    if re.findall(r"[\w]", word):
+    if word_char_re.search(word):
         if not minsyl:
             minsyl = 1
         if not maxsyl:
             maxsyl = 1
 
+    return minsyl, maxsyl
+
+
+def choose_syllables(minsyl: int, maxsyl: int, method: str, mean_round_dir: str) -> int:
     if method == "min":
-        syl = minsyl
-    elif method == "mean":
-        syl = avg_syl(minsyl, maxsyl, mean_round_dir)
+        return minsyl
     elif method == "max":
-        syl = maxsyl
+        return maxsyl
+    elif mean_round_dir == "up":
+        return math.ceil((minsyl + maxsyl) / 2)
+    return (minsyl + maxsyl) // 2
+
+
+def guess_syllables(word: str, method: str = None, mean_round_dir: str = None) -> int:
+    """Guess the number of syllables in a string.
+    Returned value depends on the method used. Mean is usually good enough.
+    """
+    method = method or "mean"
+    mean_round_dir = mean_round_dir or "down"
+
+    assert method in guess_methods
+    if method == "mean":
+        assert mean_round_dir in mean_round_dirs
+
+    minsyl, maxsyl = guess_syllable_range(word)
+    syl = choose_syllables(minsyl, maxsyl, method, mean_round_dir)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Guessed syllables for '{word}' with method {method}"
+            f" (rounding {mean_round_dir}): min syl {minsyl}, max syl {maxsyl},"
+            f" guess {syl}"
+        )
 
     return syl
 
 
+def guess_syllables_batch(
+    words: list[str], method: str = None, mean_round_dir: str = None
+) -> list[int]:
+    """Guess the number of syllables for many strings at once.
+    Each distinct string is only analyzed once.
+    """
+    method = method or "mean"
+    mean_round_dir = mean_round_dir or "down"
+
+    assert method in guess_methods
+    if method == "mean":
+        assert mean_round_dir in mean_round_dirs
+
+    guesses = {
+        word: choose_syllables(*guess_syllable_range(word), method, mean_round_dir)
+        for word in set(words)
+    }
+    return [guesses[word] for word in words]
+
+
+# cheap bounds on syllable counts, to skip texts that cannot be a haiku
+# a word, optionally with one apostrophe, that clean_token leaves as it is
+simple_token_re = re.compile(r"([A-Za-z]+(?:'[A-Za-z]+)?)[.,!?]?")
+# symbols that clean_token spells out; runs of them become one guessed word
+spelled_symbol_re = re.compile(r"[@#&%=×+*]")  # noqa: RUF001
+max_syllables_per_symbol = 4
+# no lexicon entry has more syllables per character ("www" is 9 syllables)
+max_syllables_per_char = 3
+
+
+def syllable_bounds(
+    token: str, lexicon: SyllableLexicon, emoticons_list: EmoticonMatcher
+) -> tuple[int, float]:
+    """Cheap (min, max) bounds on count_syllables for a token.
+    Exact for words in the lexicon. Uses vowel groups for other words,
+    and a bound per character for anything clean_token would need to split.
+    """
+    if emoticons_list.covers(token) or get_emoji_index().is_silent(token):
+        return 0, 0
+    match = simple_token_re.fullmatch(token)
+    # custom words are lowercase, so lookup() below finds exact matches of words
+    if match is None or match.group(1) != token:
+        token_syl = lexicon.get_custom(token)
+        if token_syl is not None:
+            return token_syl, token_syl
+
+    if match:
+        word_orig = match.group(1)
+        word = word_orig.lower()
+        found = lexicon.lookup(word, word_orig)
+        if found is not None:
+            return found[0], found[0]
+        if "'" not in word:
+            if not text_might_contain_acronym(word_orig):
+                return guess_syllable_range(remove_repeat_last_letter(word))
+            # acronyms are counted letter by letter
+            letters = [lexicon.lookup(letter) for letter in word]
+            if None not in letters:
+                token_syl = sum(letter_syl for letter_syl, _ in letters)
+                return token_syl, token_syl
+
+    if not token.isascii():
+        token = unicodedata.normalize("NFKC", token)
+    if any(map(str.isnumeric, token)):
+        # numbers can have any number of syllables
+        return 0, math.inf
+    return 0, (
+        max_syllables_per_char * len(word_char_re.findall(token))
+        + max_syllables_per_symbol * len(spelled_symbol_re.findall(token))
+    )
+
+
+def _cached_syllables_or_bounds(
+    token: str,
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
+    guess_syl_method: str,
+    syllable_cache: SyllableCache,
+    lexicon_version,
+) -> int | tuple[int, float]:
+    """The count of a token, or its (min, max) bounds if it was not counted yet,
+    with one cache lookup. Bounds that are exact are cached as the count.
+    """
+    syllables = syllable_cache.get_syllables_or_bounds(
+        token, guess_syl_method, lexicon_version
+    )
+    if syllables is not None:
+        return syllables
+
+    min_syl, max_syl = syllable_bounds(token, lexicon, emoticons_list)
+    if min_syl == max_syl:
+        # exact bounds are the count, so get_haiku need not count it again
+        syllable_cache.put_syllables(token, guess_syl_method, lexicon_version, min_syl)
+        return min_syl
+    syllable_cache.put_syllable_bounds(
+        token, guess_syl_method, lexicon_version, (min_syl, max_syl)
+    )
+    return min_syl, max_syl
+
+
+def _prefilter_syllables(
+    tokens: list[str],
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
+    guess_syl_method: str = None,
+    syllable_cache: SyllableCache = None,
+) -> list | None:
+    """The count of each token where it is known, or else its (min, max) bounds.
+    None if the syllables cannot add up to a haiku.
+    """
+    if syllable_cache is not None:
+        lexicon_version = get_lexicon_version(lexicon, emoticons_list)
+
+    syllables = []
+    min_total = 0
+    max_total = 0
+    for token in tokens:
+        if syllable_cache is None:
+            token_syl = syllable_bounds(token, lexicon, emoticons_list)
+            if token_syl[0] == token_syl[1]:
+                token_syl = token_syl[0]
+        else:
+            token_syl = _cached_syllables_or_bounds(
+                token,
+                lexicon,
+                emoticons_list,
+                guess_syl_method,
+                syllable_cache,
+                lexicon_version,
+            )
+        if isinstance(token_syl, tuple):
+            min_syl, max_syl = token_syl
+        else:
+            min_syl = max_syl = token_syl
+        min_total += min_syl
+        if min_total > haiku_form[-1]:
+            return None
+        max_total += max_syl
+        syllables.append(token_syl)
+    return syllables if max_total >= haiku_form[-1] else None
+
+
+def _count_bounded_syllables(
+    tokens: list[str],
+    token_syllables: list,
+    inflect_p,
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
+    guess_syl_method: str,
+    syllable_cache: SyllableCache = None,
+):
+    """Yield the count of each token, from _prefilter_syllables where it found one.
+    Tokens it only bounded are counted lazily, without looking them up again.
+    """
+    if syllable_cache is not None:
+        lexicon_version = get_lexicon_version(lexicon, emoticons_list)
+    for token, token_syl in zip(tokens, token_syllables, strict=True):
+        if not isinstance(token_syl, tuple):
+            yield token_syl
+        elif syllable_cache is None:
+            yield count_syllables(
+                token, inflect_p, lexicon, emoticons_list, guess_syl_method
+            )
+        else:
+            yield _count_syllables_into_cache(
+                token,
+                inflect_p,
+                lexicon,
+                emoticons_list,
+                guess_syl_method,
+                syllable_cache,
+                lexicon_version,
+            )
+
+
+def might_be_haiku(
+    text: str | PreparedTweet,
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
+    guess_syl_method: str = None,
+    syllable_cache: SyllableCache = None,
+) -> bool:
+    """False if the syllables in text cannot add up to a haiku, so that get_haiku
+    can be skipped. Uses counts from the cache where it can, and cheap bounds
+    for the other tokens. Exact bounds are added to the cache.
+    """
+    return (
+        _prefilter_syllables(
+            text_tokens(text),
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+            syllable_cache,
+        )
+        is not None
+    )
+
+
 def get_haiku(
-    text: str,
+    text: str | PreparedTweet,
     inflect_p,
-    pronounce_dict: dict,
-    syllable_dict: dict,
-    emoticons_list: list,
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
     guess_syl_method: str,
+    syllable_cache: SyllableCache = None,
+    prefilter: bool = None,
 ) -> str:
     """Attempt to turn a string into a haiku.
     Returns haiku if able, otherwise returns empty string.
 
+    With prefilter, first checks that the syllables might add up to a haiku (see
+    might_be_haiku), and reuses the counts it found, so each token is looked up in
+    the cache once.
+
     Inspired by https://github.com/tomwardill/python-haiku/blob/master/haiku_checker.py
     """
-    haiku_form = [5, 12, 17]
+    prefilter = prefilter if prefilter is not None else False
+    text_split = text_tokens(text)
+    if prefilter:
+        token_syllables = _prefilter_syllables(
+            text_split, lexicon, emoticons_list, guess_syl_method, syllable_cache
+        )
+        if token_syllables is None:
+            return ""
+        syllables = _count_bounded_syllables(
+            text_split,
+            token_syllables,
+            inflect_p,
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+            syllable_cache,
+        )
+        return arrange_haiku(text_split, syllables)
+
+    # Count syllables lazily, so tokens after an overshoot are never counted
+    syllables = (
+        count_syllables(
+            token,
+            inflect_p,
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+            syllable_cache,
+        )
+        for token in text_split
+    )
+    return arrange_haiku(text_split, syllables)
+
+
+def get_haikus(
+    texts: list[str | PreparedTweet],
+    inflect_p,
+    lexicon: SyllableLexicon,
+    emoticons_list: EmoticonMatcher,
+    guess_syl_method: str,
+    syllable_cache: SyllableCache = None,
+) -> list[str]:
+    """Attempt to turn each string in a batch into a haiku.
+    Returns a haiku or empty string for each text, in the same order.
+
+    Each distinct token in the batch is counted once. Prefix sums of the syllables
+    in each text must hit every line boundary before arranging the lines.
+    """
+    texts_split = [text_tokens(text) for text in texts]
+    token_syllables = {
+        token: count_syllables(
+            token,
+            inflect_p,
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+            syllable_cache,
+        )
+        for token in {token for text_split in texts_split for token in text_split}
+    }
+
+    haikus = []
+    for text_split in texts_split:
+        syllables = [token_syllables[token] for token in text_split]
+        syllable_counts = set(accumulate(syllables))
+        if all(syllable_count in syllable_counts for syllable_count in haiku_form):
+            haikus.append(arrange_haiku(text_split, syllables))
+        else:
+            haikus.append("")
+    return haikus
+
+
+def arrange_haiku(tokens: list, syllables) -> str:
+    """Split tokens into the lines of a haiku, given the syllables of each token.
+    Returns haiku if able, otherwise returns empty string.
+
+    syllables can be a lazy iterable; it is consumed once, one token at a time,
+    and not at all past the point where the running total overshoots.
+    """
     haiku = [[] for _ in range(len(haiku_form))]
     syllable_count = 0
     haiku_line = 0
     haiku_line_prev = 0
 
-    text_split = text.split()
     # Add tokens to create potential haiku
-    for i, token in enumerate(text_split):
+    for token, token_syllables in zip(tokens, syllables, strict=True):
         if logger.isEnabledFor(logging.DEBUG):
-            logger.debug(f"Original token: {token}")
+            logger.debug(f"Original token: {token} ({token_syllables} syllables)")
+        if haiku_line == len(haiku_form):
+            if token_syllables > 0:
+                # There are syllables in the remaining tokens,
+                # but have reached the number of lines in a haiku.
+                # Therefore not a haiku coincidence!
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Not a haiku because of more syllables: {token}")
+                return ""
+            # Trailing tokens with no syllables go at the end of the last line
+            haiku[-1].append(token)
+            continue
         # Add tokens with no syllables (punctuation, emoji)) to the end of the
         # previous line instead of the start of the current line
-        if re.findall(r"[^\w']", token) and (
-            count_syllables(
-                token,
-                inflect_p,
-                pronounce_dict,
-                syllable_dict,
-                emoticons_list,
-                guess_syl_method,
-            )
-            == 0
-        ):
+        if token_syllables == 0 and non_word_re.search(token):
             if haiku_line_prev == haiku_line:
                 haiku[haiku_line].append(token)
             else:
                 haiku[haiku_line - 1].append(token)
             continue
-        else:
-            # Add token to this line of the potential haiku
-            haiku[haiku_line].append(token)
-            # note what line was being worked on for this token
-            haiku_line_prev = haiku_line
 
-        # Count number of syllables for this token
-        syllable_count += count_syllables(
-            token,
-            inflect_p,
-            pronounce_dict,
-            syllable_dict,
-            emoticons_list,
-            guess_syl_method,
-        )
+        # Add token to this line of the potential haiku
+        haiku[haiku_line].append(token)
+        # note what line was being worked on for this token
+        haiku_line_prev = haiku_line
+
+        # Running total of syllables, i.e., the prefix sum at this token
+        syllable_count += token_syllables
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug(f"{syllable_count} syllables counted total")
 
         if syllable_count == haiku_form[haiku_line]:
             # Reached exactly the number of syllables for this line, go to next line
             haiku_line += 1
-        if (
-            i < len(text_split) - 1
-            and haiku_line >= len(haiku_form)
-            and (
-                count_syllables(
-                    " ".join(text_split[i + 1 :]),
-                    inflect_p,
-                    pronounce_dict,
-                    syllable_dict,
-                    emoticons_list,
-                    guess_syl_method,
-                )
-                > 0
-            )
-        ):
-            # There are syllables in the remaining tokens to check,
-            # but have reached the number of lines in a haiku.
-            # Therefore not a haiku coincidence!
-            if logger.isEnabledFor(logging.DEBUG):
-                logger.debug(
-                    "Not a haiku because are more lines to check:"
-                    f" {' '.join(text_split[i + 1:])}"
-                )
+        elif syllable_count > haiku_form[haiku_line]:
+            # Overshot this line, and the total never goes down. Not a haiku!
             return ""
     if haiku_line == len(haiku_form):
         # Reached the end, and found the right number of lines. Haiku coincidence!
-        return ["\n".join([" ".join(line) for line in haiku])][0]
+        return "\n".join([" ".join(line) for line in haiku])
     else:
         # Did not find the right number of lines. Not a haiku coincidence!
         return ""
@@ -451,14 +739,20 @@ def construct_haiku_to_post(h, this_status) -> dict:
     }
 
 
-def get_best_haiku(haikus, twitter, db_session) -> dict:
+def get_best_haiku(haikus, twitter, db_session, status_lookup=None) -> dict:
     """Attempt to get the haiku by assessing verified user,
     or number of favorites, retweets, or followers.
     High probability that followers will yield a tweet.
     Otherwise get the most recent one.
 
+    The statuses are looked up in bulk, with status_lookup if given, and haikus
+    whose tweets no longer exist are soft deleted.
+
     TODO: If there's more than 1 verified user (extremely unlikely), rank tweets
     """
+    status_lookup = (
+        status_lookup if status_lookup is not None else StatusLookup(twitter)
+    )
     # initialize
     haiku_to_post = {
         "status_id_str": "",
@@ -466,18 +760,17 @@ def get_best_haiku(haikus, twitter, db_session) -> dict:
         "retweet_count": 0,
         "followers_count": 0,
     }
+    statuses, missing = status_lookup.lookup([h.status_id_str for h in haikus])
+    if missing:
+        # Tweets no longer exist
+        logger.info(f"Statuses no longer exist: {sorted(missing)}")
+        # soft delete
+        Haiku.update_haikus_deleted(db_session, missing)
+
     # find the best haiku
     for h in haikus:
         logger.debug(f"Haiku: {h.haiku}")
-        try:
-            this_status = twitter.show_status(id=h.status_id_str)
-        except Exception as e:
-            logger.warning(f"Exception when checking statuses (1): {e}")
-            logger.info(f"{h.user_screen_name}/status/{h.status_id_str}")
-            # Tweet no longer exists
-            this_status = {}
-            # soft delete
-            Haiku.update_haiku_deleted(db_session, h.status_id_str)
+        this_status = statuses.get(h.status_id_str)
 
         if this_status and (
             this_status["user"]["verified"]
@@ -492,15 +785,7 @@ def get_best_haiku(haikus, twitter, db_session) -> dict:
         # h = random.choice(haikus)
         # if no tweet was better than another, pick the most recent tweet
         for h in haikus[::-1]:
-            try:
-                this_status = twitter.show_status(id=h.status_id_str)
-            except Exception as e:
-                logger.warning(f"Exception when getting best status (2): {e}")
-                logger.info(f"{h.user_screen_name}/status/{h.status_id_str}")
-                # Tweet no longer exists, not going to post a haiku this time
-                this_status = {}
-                # soft delete
-                Haiku.update_haiku_deleted(db_session, h.status_id_str)
+            this_status = statuses.get(h.status_id_str)
             if this_status:
                 haiku_to_post = construct_haiku_to_post(h, this_status)
                 break
@@ -0,0 +1,408 @@
+import hashlib
+import itertools
+import logging
+import mmap
+import os
+import struct
+import zlib
+
+from .text_utils import EmoticonMatcher, remove_repeat_last_letter
+
+logger = logging.getLogger("haiku_logger")
+
+# Compiled lexicon file layout (little-endian):
+#   header: magic, format version, section count, payload length, sha256 of payload,
+#     size, mtime (ns), and sha256 of each source file (zeros if there was none)
+#   payload: sections, each an open-addressing hash table of words keyed by crc32:
+#     section header: name, entry count, slot count, key blob length
+#     slots: (key offset + 1 into the blob, key length, packed syllables); 0 = empty
+#     key blob: utf-8 words
+#   sections: custom words, CMU words, emoticons, numbers (syllables are not packed)
+LEXICON_MAGIC = b"HKLX"
+LEXICON_FORMAT_VERSION = 4
+LEXICON_SECTIONS = [b"CUST", b"CMU ", b"EMOT", b"NUMS"]
+# data/syllables.json, data/emoticons.txt, and the NLTK CMU dictionary
+LEXICON_SOURCES = ["syllables", "emoticons", "cmudict"]
+_NO_SOURCE = (0, 0, bytes(32))
+_HEADER = struct.Struct("<4sHHQ32s" + "Qq32s" * len(LEXICON_SOURCES))
+_SECTION = struct.Struct("<4sIII")
+_SLOT = struct.Struct("<IBB")
+_MAX_KEY_BYTES = 0xFF
+
+# Every lexicon (and every change to one) gets a new version,
+# so that cached syllable counts can be invalidated
+_lexicon_versions = itertools.count(1)
+
+# Syllable counts are packed into one small int per word: (min << 4) | max
+MAX_PACKED_SYLLABLES = 0xF
+
+
+def pack_syllables(min_syl: int, max_syl: int) -> int:
+    min_syl = min(min_syl, MAX_PACKED_SYLLABLES)
+    max_syl = min(max_syl, MAX_PACKED_SYLLABLES)
+    return (min_syl << 4) | max_syl
+
+
+def unpack_syllables(packed: int) -> tuple[int, int]:
+    return packed >> 4, packed & MAX_PACKED_SYLLABLES
+
+
+def count_phoneme_syllables(phonemes) -> int:
+    """CMU phonemes carry a stress digit on each vowel sound"""
+    return len([ph for ph in phonemes if ph[-1].isdigit()])
+
+
+def _hash_file(filepath) -> bytes:
+    with open(filepath, "rb") as fp:
+        return hashlib.sha256(fp.read()).digest()
+
+
+def describe_source_file(filepath) -> tuple[int, int, bytes]:
+    """(size, mtime in ns, sha256) of a file the lexicon is built from, or zeros if
+    there is none
+    """
+    if filepath is None:
+        return _NO_SOURCE
+    try:
+        stat = os.stat(filepath)
+        return stat.st_size, stat.st_mtime_ns, _hash_file(filepath)
+    except OSError:
+        return _NO_SOURCE
+
+
+def source_file_unchanged(filepath, saved: tuple[int, int, bytes]) -> bool:
+    """Whether a source file is the one described by describe_source_file.
+    Only hashed if its size or mtime differ, e.g., after a copy.
+    """
+    try:
+        stat = os.stat(filepath) if filepath is not None else None
+    except OSError:
+        stat = None
+    if stat is None:
+        return saved == _NO_SOURCE
+    if (stat.st_size, stat.st_mtime_ns) == saved[:2]:
+        return True
+    try:
+        return stat.st_size == saved[0] and _hash_file(filepath) == saved[2]
+    except OSError:
+        return False
+
+
+class LexiconFileError(Exception):
+    pass
+
+
+class StaleLexiconError(LexiconFileError):
+    """The source files changed after the lexicon was compiled"""
+
+
+def _hash_key(key: bytes) -> int:
+    # crc32 is stable across processes, unlike hash() with PYTHONHASHSEED=random
+    return zlib.crc32(key)
+
+
+def _pack_section(name: bytes, table: dict) -> bytes:
+    entries = [
+        (word.encode("utf-8"), packed)
+        for word, packed in sorted(table.items())
+        if len(word.encode("utf-8")) <= _MAX_KEY_BYTES
+    ]
+    n_slots = 1
+    while n_slots < 2 * len(entries):
+        n_slots *= 2
+    mask = n_slots - 1
+
+    slots = [(0, 0, 0)] * n_slots
+    blob = bytearray()
+    for key, packed in entries:
+        i = _hash_key(key) & mask
+        while slots[i][0]:
+            i = (i + 1) & mask
+        slots[i] = (len(blob) + 1, len(key), packed)
+        blob += key
+
+    return b"".join(
+        [
+            _SECTION.pack(name, len(entries), n_slots, len(blob)),
+            b"".join(_SLOT.pack(*slot) for slot in slots),
+            bytes(blob),
+        ]
+    )
+
+
+class MappedTable:
+    """Read-only word -> packed syllables table backed by a compiled lexicon file"""
+
+    __slots__ = ("_buf", "_n_entries", "_mask", "_slots_start", "_blob_start", "end")
+
+    def __init__(self, buf, offset: int):
+        _, n_entries, n_slots, blob_len = _SECTION.unpack_from(buf, offset)
+        self._buf = buf
+        self._n_entries = n_entries
+        self._mask = n_slots - 1
+        self._slots_start = offset + _SECTION.size
+        self._blob_start = self._slots_start + n_slots * _SLOT.size
+        self.end = self._blob_start + blob_len
+
+    def __len__(self) -> int:
+        return self._n_entries
+
+    def __contains__(self, word: str) -> bool:
+        return self.get(word) is not None
+
+    def get(self, word: str, default=None):
+        try:
+            key = word.encode("utf-8")
+        except UnicodeEncodeError:
+            return default
+        buf = self._buf
+        i = _hash_key(key) & self._mask
+        while True:
+            key_offset, key_len, packed = _SLOT.unpack_from(
+                buf, self._slots_start + i * _SLOT.size
+            )
+            if not key_offset:
+                return default
+            if key_len == len(key):
+                start = self._blob_start + key_offset - 1
+                if buf[start : start + key_len] == key:
+                    return packed
+            i = (i + 1) & self._mask
+
+    def items(self):
+        for i in range(self._mask + 1):
+            key_offset, key_len, packed = _SLOT.unpack_from(
+                self._buf, self._slots_start + i * _SLOT.size
+            )
+            if key_offset:
+                start = self._blob_start + key_offset - 1
+                yield self._buf[start : start + key_len].decode("utf-8"), packed
+
+
+class SyllableLexicon:
+    """Compact word to syllable count table.
+
+    Merges the pre-defined counts in data/syllables.json ("custom") with the CMU
+    pronouncing dictionary ("cmu"). Each word maps to a single small int holding its
+    (min, max) syllable count over all pronunciations, instead of lists of phonemes.
+    Custom counts take precedence over CMU counts, as they always have.
+    """
+
+    __slots__ = ("_custom", "_cmu", "_numbers", "emoticons", "version")
+
+    def __init__(
+        self,
+        custom: dict = None,
+        cmu: dict = None,
+        emoticons: EmoticonMatcher | list = None,
+        numbers: dict = None,
+        version=None,
+    ):
+        self._custom = custom if custom is not None else {}
+        self._cmu = cmu if cmu is not None else {}
+        self._numbers = numbers if numbers is not None else {}
+        self.emoticons = (
+            emoticons
+            if isinstance(emoticons, EmoticonMatcher)
+            else EmoticonMatcher(emoticons)
+        )
+        self.version = version if version is not None else next(_lexicon_versions)
+
+    @classmethod
+    def from_dicts(
+        cls,
+        syllable_dict: dict = None,
+        pronounce_dict: dict = None,
+        emoticons_list: list = None,
+    ):
+        """Build from get_syllable_dict, cmudict.dict(), and get_emoticons_list"""
+        syllable_dict = syllable_dict or {}
+        pronounce_dict = pronounce_dict or {}
+
+        custom = {
+            word.lower(): pack_syllables(entry["syllables"], entry["syllables"])
+            for word, entry in syllable_dict.items()
+        }
+        cmu = {}
+        for word, pronunciations in pronounce_dict.items():
+            counts = [count_phoneme_syllables(p) for p in pronunciations]
+            cmu[word] = pack_syllables(min(counts), max(counts))
+
+        logger.info(
+            f"Built syllable lexicon: {len(custom):,} custom words,"
+            f" {len(cmu):,} CMU words"
+        )
+        return cls(custom=custom, cmu=cmu, emoticons=emoticons_list)
+
+    def save(self, filepath, source_files: dict = None):
+        """Write a compiled lexicon file that can be memory-mapped with load().
+        source_files (describe_source_file by LEXICON_SOURCES name) record what it
+        was built from.
+        """
+        source_files = source_files or {}
+        payload = b"".join(
+            [
+                _pack_section(b"CUST", dict(self._custom.items())),
+                _pack_section(b"CMU ", dict(self._cmu.items())),
+                _pack_section(b"EMOT", {e: 0 for e in self.emoticons}),
+                _pack_section(b"NUMS", dict(self._numbers.items())),
+            ]
+        )
+        checksum = hashlib.sha256(payload).digest()
+        with open(filepath, "wb") as fp:
+            fp.write(
+                _HEADER.pack(
+                    LEXICON_MAGIC,
+                    LEXICON_FORMAT_VERSION,
+                    len(LEXICON_SECTIONS),
+                    len(payload),
+                    checksum,
+                    *(
+                        field
+                        for name in LEXICON_SOURCES
+                        for field in source_files.get(name, _NO_SOURCE)
+                    ),
+                )
+            )
+            fp.write(payload)
+        logger.info(
+            f"Wrote lexicon to {filepath}:"
+            f" {_HEADER.size + len(payload):,} bytes, sha256 {checksum.hex()}"
+        )
+        return checksum.hex()
+
+    @classmethod
+    def load(cls, filepath, verify: bool = None, source_paths: dict = None):
+        """Memory-map a compiled lexicon file read-only.
+        Pages are shared between processes instead of copied.
+        With source_paths (by LEXICON_SOURCES name), raises StaleLexiconError if a
+        source file has changed since the lexicon was compiled.
+        """
+        verify = verify if verify is not None else True
+
+        with open(filepath, "rb") as fp:
+            buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(buf) < _HEADER.size:
+            raise LexiconFileError(f"Lexicon file is truncated: {filepath}")
+        (
+            magic,
+            format_version,
+            n_sections,
+            payload_len,
+            checksum,
+            *saved_source_fields,
+        ) = _HEADER.unpack_from(buf, 0)
+        if magic != LEXICON_MAGIC:
+            raise LexiconFileError(f"Not a lexicon file: {filepath}")
+        if format_version != LEXICON_FORMAT_VERSION or n_sections != len(
+            LEXICON_SECTIONS
+        ):
+            raise LexiconFileError(
+                f"Unsupported lexicon format version {format_version}: {filepath}"
+            )
+        if len(buf) != _HEADER.size + payload_len:
+            raise LexiconFileError(f"Lexicon file is truncated: {filepath}")
+        if verify and hashlib.sha256(buf[_HEADER.size :]).digest() != checksum:
+            raise LexiconFileError(f"Lexicon checksum mismatch: {filepath}")
+        if source_paths is not None:
+            changed = [
+                name
+                for i, name in enumerate(LEXICON_SOURCES)
+                if not source_file_unchanged(
+                    source_paths.get(name),
+                    tuple(saved_source_fields[3 * i : 3 * i + 3]),
+                )
+            ]
+            if changed:
+                raise StaleLexiconError(
+                    f"Lexicon is older than its {', '.join(changed)} source: {filepath}"
+                )
+
+        custom = MappedTable(buf, _HEADER.size)
+        cmu = MappedTable(buf, custom.end)
+        emoticons_table = MappedTable(buf, cmu.end)
+        emoticons = [e for e, _ in emoticons_table.items()]
+        numbers = MappedTable(buf, emoticons_table.end)
+
+        logger.info(
+            f"Loaded lexicon from {filepath}: {len(custom):,} custom words,"
+            f" {len(cmu):,} CMU words, {len(emoticons):,} emoticons,"
+            f" {len(numbers):,} numbers"
+        )
+        return cls(
+            custom=custom,
+            cmu=cmu,
+            emoticons=emoticons,
+            numbers=numbers,
+            version=checksum.hex(),
+        )
+
+    def __len__(self) -> int:
+        return len(self._custom) + len(self._cmu)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._custom or word in self._cmu
+
+    def update(self, syllable_dict: dict):
+        """Add or replace custom syllable counts"""
+        if not isinstance(self._custom, dict):
+            # copy a read-only memory-mapped table before changing it
+            self._custom = dict(self._custom.items())
+        for word, entry in syllable_dict.items():
+            syllables = entry["syllables"] if isinstance(entry, dict) else entry
+            self._custom[word.lower()] = pack_syllables(syllables, syllables)
+        self.version = next(_lexicon_versions)
+
+    @property
+    def has_numbers(self) -> bool:
+        return len(self._numbers) > 0
+
+    def set_numbers(self, numbers: dict):
+        """Set the syllable counts of digit strings (see build_number_syllables).
+        They are derived from the lexicon, so the version does not change.
+        """
+        self._numbers = numbers
+
+    def get_number(self, number: str):
+        """Syllable count of a string of digits from the number table, or None"""
+        return self._numbers.get(number)
+
+    def get_custom(self, word: str):
+        """Syllable count of an exact match in the custom table, or None"""
+        packed = self._custom.get(word)
+        return None if packed is None else packed & MAX_PACKED_SYLLABLES
+
+    def syllable_range(self, word: str):
+        """(min, max) syllable count of an exact match, or None"""
+        packed = self._custom.get(word)
+        if packed is None:
+            packed = self._cmu.get(word)
+        return None if packed is None else unpack_syllables(packed)
+
+    def lookup(self, word: str, word_orig: str = None):
+        """Return (syllable count, source) for a lowercase word, or None.
+
+        Tries each table in order: the word itself, the word with a repeated last
+        letter removed (lmaoooo), and the singular if the original (case-preserved)
+        word ends in s or z. CMU words count the pronunciation with most syllables.
+        """
+        word_orig = word_orig if word_orig is not None else word
+        word_rrl = remove_repeat_last_letter(word)
+        word_singular = word[:-1] if word_orig.endswith(("s", "z")) else None
+
+        for table, name in ((self._custom, "Syllable"), (self._cmu, "CMU")):
+            packed = table.get(word)
+            if packed is not None:
+                source = f"{name} dictionary"
+            else:
+                packed = table.get(word_rrl)
+                if packed is not None:
+                    source = f"{name} dictionary (remove repeat last letter)"
+                elif word_singular is not None:
+                    packed = table.get(word_singular)
+                    source = f"{name} dictionary (singular)"
+            if packed is not None:
+                return packed & MAX_PACKED_SYLLABLES, source
+
+        return None
@@ -0,0 +1,164 @@
+import logging
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    select,
+    text,
+)
+
+logger = logging.getLogger("haiku_logger")
+
+# Migrations that were applied, in their own metadata so create_all leaves it alone
+schema_metadata = MetaData()
+schema_version_table = Table(
+    "schema_version",
+    schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+# The tables as of version 1, frozen: a change to the models in data_base needs a new
+# migration, not a change here
+schema_v1_metadata = MetaData()
+Table(
+    "haikus",
+    schema_v1_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("status_id_str", String, nullable=False),
+    Column("user_screen_name", String, nullable=False),
+    Column("user_id_str", String, nullable=False),
+    Column("user_verified", Boolean, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("text_original", String, nullable=False),
+    Column("text_clean", String, nullable=False),
+    Column("haiku", String, nullable=False),
+    Column("date_posted", DateTime, nullable=True),
+    Column("date_deleted", DateTime, nullable=True),
+)
+Table(
+    "outbox",
+    schema_v1_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("action", String, nullable=False),
+    Column("action_key", String, nullable=False, unique=True),
+    Column("payload", String, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("next_attempt_at", DateTime, nullable=False),
+    Column("last_error", String, nullable=True),
+    Column("date_done", DateTime, nullable=True),
+    Column("date_failed", DateTime, nullable=True),
+)
+
+
+def create_tables(connection):
+    """Create the tables as of version 1 that do not exist yet, like the haikus table
+    before migrations, which had only a primary key
+    """
+    schema_v1_metadata.create_all(connection)
+
+
+def add_haiku_indexes(connection):
+    """Index the haikus table for its queries, after removing duplicate statuses so
+    status_id_str can be unique. Of duplicates, a posted row is kept, then the oldest.
+    """
+    # Temporary, so finding duplicates does not scan the table for every row
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_haikus_status_id_str_tmp"
+            " ON haikus (status_id_str)"
+        )
+    )
+    result = connection.execute(
+        text(
+            "DELETE FROM haikus WHERE EXISTS ("
+            " SELECT 1 FROM haikus AS other"
+            " WHERE other.status_id_str = haikus.status_id_str"
+            " AND ("
+            "  (other.date_posted IS NOT NULL AND haikus.date_posted IS NULL)"
+            "  OR (other.id < haikus.id"
+            "   AND (other.date_posted IS NOT NULL OR haikus.date_posted IS NULL))"
+            " )"
+            ")"
+        )
+    )
+    if result.rowcount:
+        logger.info(f"Deleted {result.rowcount} haikus with duplicate statuses")
+    for statement in [
+        # Status updates and lookups, e.g., update_haiku_posted
+        (
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_haikus_status_id_str"
+            " ON haikus (status_id_str)"
+        ),
+        "DROP INDEX IF EXISTS ix_haikus_status_id_str_tmp",
+        # Retention by age and by row count
+        "CREATE INDEX IF NOT EXISTS ix_haikus_created_at ON haikus (created_at)",
+        # Posted haikus. Partial, as most haikus are never posted, and an index on
+        # all of them would look selective to queries for unposted haikus.
+        (
+            "CREATE INDEX IF NOT EXISTS ix_haikus_posted_date_posted"
+            " ON haikus (date_posted) WHERE date_posted IS NOT NULL"
+        ),
+        # Candidates to post: recent haikus that were not posted or deleted
+        (
+            "CREATE INDEX IF NOT EXISTS ix_haikus_unposted_created_at"
+            " ON haikus (created_at)"
+            " WHERE date_posted IS NULL AND date_deleted IS NULL"
+        ),
+        # Statistics for the query planner to choose between the indexes
+        "ANALYZE haikus",
+    ]:
+        connection.execute(text(statement))
+
+
+# (version, description, function), in order. Never change a migration that was
+# released; add a new one instead. The SQL works in SQLite and Postgres.
+MIGRATIONS: list[tuple[int, str, Callable]] = [
+    (1, "Create tables", create_tables),
+    (2, "Add haiku indexes and unique status ids", add_haiku_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(connection) -> int:
+    """The last migration that was applied, or 0"""
+    schema_metadata.create_all(connection)
+    versions = connection.execute(select(schema_version_table.c.version)).scalars()
+    return max(versions, default=0)
+
+
+def migrate(engine, target_version: int = None) -> int:
+    """Apply the migrations after the current schema version, up to target_version
+    (default: the latest). Each migration runs in its own transaction, with the
+    version it reaches. Returns the schema version.
+    """
+    target_version = target_version if target_version is not None else LATEST_VERSION
+    with engine.begin() as connection:
+        version = get_schema_version(connection)
+
+    for migration_version, description, migration in MIGRATIONS:
+        if migration_version <= version or migration_version > target_version:
+            continue
+        logger.info(f"Applying migration {migration_version}: {description}")
+        with engine.begin() as connection:
+            migration(connection)
+            connection.execute(
+                schema_version_table.insert().values(
+                    version=migration_version,
+                    description=description,
+                    applied_at=datetime.now(tz=timezone.utc),
+                )
+            )
+        version = migration_version
+    return version
@@ -0,0 +1,116 @@
+import json
+import logging
+import threading
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+
+from .data_base import OutboxAction
+
+logger = logging.getLogger("haiku_logger")
+
+
+class OutboxWorker:
+    """Does the actions in the outbox on a background thread, with its own database
+    session. A failed action is retried with exponential backoff, up to max_attempts.
+
+    Handlers take the worker's database session and the action's payload. They should
+    be idempotent: an action whose result was not recorded (e.g., on a crash) is done
+    again.
+    """
+
+    def __init__(
+        self,
+        db_session,
+        handlers: dict[str, Callable],
+        max_attempts: int = None,
+        retry_wait_seconds: float = None,
+        poll_seconds: float = None,
+    ):
+        self.db_session = db_session
+        self.handlers = handlers
+        self.max_attempts = max_attempts if max_attempts is not None else 3
+        self.retry_wait_seconds = (
+            retry_wait_seconds if retry_wait_seconds is not None else 60
+        )
+        self.poll_seconds = poll_seconds if poll_seconds is not None else 5
+        self.done = 0
+        self.retried = 0
+        self.failed = 0
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.run, name="outbox-worker", daemon=True
+        )
+        self._thread.start()
+
+    def wake(self):
+        """Check the outbox now, e.g., after adding an action"""
+        self._wake.set()
+
+    def stop(self):
+        """Finish the action in progress, then stop"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        while not self._stopping:
+            try:
+                tried = self.run_once()
+            except Exception as e:
+                logger.warning(f"Exception when checking the outbox: {e}")
+                self.db_session.rollback()
+                tried = 0
+            if not tried:
+                self._wake.wait(timeout=self.poll_seconds)
+                self._wake.clear()
+        # Give back the connection from this thread
+        self.db_session.close()
+
+    def run_once(self) -> int:
+        """Try each action that is due, and return how many were tried"""
+        actions = OutboxAction.get_actions_due(self.db_session)
+        for action in actions:
+            if self._stopping:
+                break
+            self.try_action(action)
+        return len(actions)
+
+    def try_action(self, action: OutboxAction):
+        handler = self.handlers.get(action.action)
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for outbox action: {action.action}")
+            handler(self.db_session, json.loads(action.payload))
+        except Exception as e:
+            attempts = action.attempts + 1
+            if handler is not None and attempts < self.max_attempts:
+                retry_at = datetime.now(tz=timezone.utc) + timedelta(
+                    seconds=self.retry_wait_seconds * 2 ** (attempts - 1)
+                )
+                self.retried += 1
+                logger.info(
+                    f"Outbox action {action.action_key} failed, retrying at"
+                    f" {retry_at}: {e}"
+                )
+            else:
+                retry_at = None
+                self.failed += 1
+                logger.warning(
+                    f"Outbox action {action.action_key} failed after {attempts}"
+                    f" attempts: {e}"
+                )
+            OutboxAction.update_action_attempted(
+                self.db_session, action.id, str(e), retry_at=retry_at
+            )
+            return
+        OutboxAction.update_action_done(self.db_session, action.id)
+        self.done += 1
+        logger.info(f"Outbox action done: {action.action_key}")
+
+    def stats(self) -> dict:
+        return {"done": self.done, "retried": self.retried, "failed": self.failed}
@@ -2,10 +2,11 @@ import logging
 import re
 import unicodedata
 from datetime import datetime, timezone
+from functools import cache, cached_property
 
-import emoji
-from ftfy import fix_text
-from unidecode import unidecode
+# emoji, ftfy, and unidecode are imported where used: together they take ~50 ms, and
+# only processes that clean tweet text need them (see preload_text_cleaning)
+from .filter_utils import FilterPipeline, FilterStage
 
 logging.basicConfig(format="{asctime} : {levelname} : {message}", style="{")
 logger = logging.getLogger("haiku_logger")
@@ -42,13 +43,11 @@ PRONOUNCED_LETTERS = [
     "z",
 ]
 
-# Escape backslash because they are compared with "unicode-escape"
 UNICODE_IGNORE = [
-    "\\u3164",  # Hangul Filler https://codepoints.net/U+3164
-    "\\uffa0",  # Halfwidth Hangul Filler https://codepoints.net/U+FFA0
+    "\u3164",  # Hangul Filler https://codepoints.net/U+3164
+    "\uffa0",  # Halfwidth Hangul Filler https://codepoints.net/U+FFA0
 ]
 
-# Do not need to escape backslash
 UNICODE_KEEP = [
     "\u200d",  # Zero Width Joiner https://codepoints.net/U+200D
     "\u2642",  # Male Sign  https://codepoints.net/U+2642
@@ -56,6 +55,20 @@ UNICODE_KEEP = [
     "\ufe0f",  # Variation Selector-16 for emoji https://codepoints.net/U+FE0F
 ]
 
+# Deletes the ignored letters with str.translate
+unicode_ignore_table = str.maketrans("", "", "".join(UNICODE_IGNORE))
+# Runs of letters to decode with unidecode; ASCII and kept letters are left as is
+unicode_decode_re = re.compile(f"[^\\x00-\\x7f{''.join(UNICODE_KEEP)}]+")
+# Plain ASCII text that ftfy would not change: no HTML entities or control characters
+plain_ascii_re = re.compile(r"[\t\n\f\r -%'-~]*")
+
+
+def decode_letters(text: str) -> str:
+    """unidecode the unicode letters, except the ones to keep"""
+    from unidecode import unidecode
+
+    return unicode_decode_re.sub(lambda match: unidecode(match.group()), text)
+
 
 def clean_text(text: str) -> str:
     """Process text so it's ready for syllable counting"""
@@ -64,45 +77,417 @@ def clean_text(text: str) -> str:
     if text is None:
         return text
 
+    if plain_ascii_re.fullmatch(text):
+        # Nothing for ftfy or unidecode to do, and no emoji except ones in text form
+        text_cleaned = " ".join(text.split())
+        if ":" in text_cleaned:
+            import emoji
+
+            text_cleaned = emoji.emojize(text_cleaned)
+        return text_cleaned
+
+    import emoji
+    from ftfy import fix_text
+
     # Remove some unicode letters
-    text_cleaned = " ".join(
-        [
-            "".join(
-                [
-                    letter
-                    for letter in word
-                    if letter.encode("unicode-escape").decode() not in UNICODE_IGNORE
-                ]
-            )
-            for word in fix_text(text).split()
-        ]
-    )
+    text_cleaned = " ".join(fix_text(text).translate(unicode_ignore_table).split())
+
+    # Decode unicode letters, leaving emoji as they are
+    pieces = []
+    end = 0
+    for start, end_emoji in get_emoji_index().spans(text_cleaned):
+        pieces.append(decode_letters(text_cleaned[end:start]))
+        pieces.append(text_cleaned[start:end_emoji])
+        end = end_emoji
+    pieces.append(decode_letters(text_cleaned[end:]))
+    text_decoded = "".join(pieces)
+
+    # Convert emoji written as text (:red_heart:) to emoji
+    if ":" in text_decoded:
+        text_decoded = emoji.emojize(text_decoded)
 
-    # Convert emoji to text
-    text_cleaned = emoji.demojize(text_cleaned)
+    return text_decoded
 
-    # Decode unicode letters
-    text_decoded = " ".join(
-        [
-            "".join(
-                [
-                    unidecode(letter) if (letter not in UNICODE_KEEP) else letter
-                    for letter in word
-                ]
+
+class AhoCorasick:
+    """Aho-Corasick automaton: finds every occurrence of a set of strings
+    in a single pass over a text
+    """
+
+    def __init__(self, patterns):
+        # trie of the patterns, as a list of nodes; node 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._out[node].append(pattern)
+
+        # breadth-first, link each node to the longest proper suffix in the trie
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def find_all(self, text: str):
+        """Yield (start, end, pattern) for each match, ordered by end"""
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern in out[node]:
+                yield i + 1 - len(pattern), i + 1, pattern
+
+    def contains_any(self, text: str) -> bool:
+        return next(self.find_all(text), None) is not None
+
+
+class EmoticonMatcher:
+    """Text emoticons, as a set for exact matches of a token,
+    and an automaton for emoticons inside a longer token
+    """
+
+    def __init__(self, emoticons=None):
+        self._emoticons = frozenset(emoticons or [])
+        self._automaton = AhoCorasick(self._emoticons)
+        self._first_chars = {emoticon[0] for emoticon in self._emoticons if emoticon}
+
+    def __contains__(self, token: str) -> bool:
+        return token in self._emoticons
+
+    def __iter__(self):
+        return iter(sorted(self._emoticons))
+
+    def __len__(self) -> int:
+        return len(self._emoticons)
+
+    def find_all(self, text: str) -> list[tuple[int, int, str]]:
+        """(start, end, emoticon) of every emoticon in the text"""
+        return list(self._automaton.find_all(text))
+
+    def covers(self, token: str) -> bool:
+        """True if the token is one or more emoticons back to back (<3<3, :D:D)"""
+        if token in self._emoticons:
+            return True
+        if not token or token[0] not in self._first_chars:
+            return False
+        # whether the token up to each position can be split into emoticons
+        covered = [True] + [False] * len(token)
+        for start, end, _ in self._automaton.find_all(token):
+            if covered[start]:
+                covered[end] = True
+        return covered[-1]
+
+
+class EmojiIndex:
+    """Every emoji sequence in a trie, to find the emoji in a text in a single scan.
+    Like emoji.demojize, takes the longest emoji at the leftmost position.
+    """
+
+    def __init__(self, emojis=None):
+        # nested dicts of characters; the None key marks the end of an emoji
+        self._trie = {}
+        ascii_starts = set()
+        for emoji_str in emojis or []:
+            if not emoji_str:
+                continue
+            node = self._trie
+            for char in emoji_str:
+                node = node.setdefault(char, {})
+            # emoji that normalize to letters or digits (1️⃣, ™) are read aloud
+            node[None] = not any(
+                char.isascii() for char in unicodedata.normalize("NFKC", emoji_str)
             )
-            for word in text_cleaned.split()
-        ]
-    )
+            if emoji_str[0].isascii():
+                ascii_starts.add(emoji_str[0])
+        # where an emoji can start; ASCII only when followed by a non-ASCII character
+        start_pattern = "[^\\x00-\\x7f]"
+        if ascii_starts:
+            ascii_chars = re.escape("".join(sorted(ascii_starts)))
+            start_pattern += f"|[{ascii_chars}](?=[^\\x00-\\x7f])"
+        self._start_re = re.compile(start_pattern)
+
+    def _match(self, text: str, start: int) -> tuple[int, bool]:
+        """End of the longest emoji at start (or start), and whether it is silent"""
+        node = self._trie
+        end, silent = start, False
+        for i in range(start, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if None in node:
+                end, silent = i + 1, node[None]
+        return end, silent
+
+    def __contains__(self, token: str) -> bool:
+        return bool(token) and self._match(token, 0)[0] == len(token)
+
+    def spans(self, text: str):
+        """Yield (start, end) of each emoji in the text"""
+        match = self._start_re.search(text)
+        while match is not None:
+            start = match.start()
+            end, _ = self._match(text, start)
+            if end > start:
+                yield start, end
+            match = self._start_re.search(text, max(end, start + 1))
+
+    def is_silent(self, token: str) -> bool:
+        """True if the token is only emoji that are not read aloud (😂, 👍🏽👍🏽)"""
+        if not token or token[0] not in self._trie:
+            return False
+        start = 0
+        while start < len(token):
+            end, silent = self._match(token, start)
+            if not silent:
+                return False
+            start = end
+        return True
+
+
+@cache
+def get_emoji_index() -> EmojiIndex:
+    """Index of all emoji known to the emoji package, built on first use"""
+    import emoji
+
+    return EmojiIndex(emoji.EMOJI_DATA)
+
+
+def preload_text_cleaning():
+    """Import the packages clean_text uses and build the emoji index, so the first
+    tweet does not wait for them
+    """
+    import ftfy  # noqa: F401
+    import unidecode  # noqa: F401
 
-    # Convert text to emoji
-    text_decoded = emoji.emojize(text_decoded)
+    get_emoji_index()
 
-    return text_decoded
+
+class IgnoreListMatcher:
+    """Ignore list lines compiled for matching a text in about linear time.
+
+    A line matches when all of its tokens are in the text. An inverted index maps each
+    token (and its plural forms) to the lines that contain it, with one bit per token
+    of the line; a line matches once all of its bits are set. In substring mode, an
+    Aho-Corasick automaton finds all tokens of all lines in one pass.
+    """
+
+    def __init__(self, ignore_list: list[str] = None):
+        self.ignore_list = list(ignore_list or [])
+        self._required = []
+        # token -> [(line id, token bit)]
+        self._index = {}
+        # token or plural form -> [(line id, token bit)]
+        self._plural_index = {}
+        # a line without tokens matches every text
+        self._match_all = False
+        for line_id, ignore_line in enumerate(self.ignore_list):
+            tokens = list(dict.fromkeys(ignore_line.lower().split()))
+            if not tokens:
+                self._match_all = True
+            self._required.append((1 << len(tokens)) - 1)
+            for i, token in enumerate(tokens):
+                entry = (line_id, 1 << i)
+                self._index.setdefault(token, []).append(entry)
+                for form in dict.fromkeys(
+                    [token, f"{token}s", f"{token}z", f"{token}es"]
+                ):
+                    self._plural_index.setdefault(form, []).append(entry)
+        self._automaton = AhoCorasick(self._index)
+
+    def __iter__(self):
+        return iter(self.ignore_list)
+
+    def __len__(self) -> int:
+        return len(self.ignore_list)
+
+    def matches(
+        self, text: str, plurals: bool = None, match_substring: bool = None
+    ) -> bool:
+        """True if all tokens of any line are in the text.
+        With plurals, the text also matches plural forms of the tokens, and text tokens
+        with repeated last letters removed.
+        """
+        plurals = plurals if plurals is not None else False
+        match_substring = match_substring if match_substring is not None else False
+
+        if self._match_all:
+            return True
+
+        text_tokens = text.lower().split()
+        if plurals:
+            text_tokens += [remove_repeat_last_letter(t) for t in text_tokens]
+
+        if match_substring:
+            # plural forms of a token contain the token itself
+            index = self._index
+            found_tokens = {
+                token for _, _, token in self._automaton.find_all(" ".join(text_tokens))
+            }
+        else:
+            index = self._plural_index if plurals else self._index
+            found_tokens = set(text_tokens)
+
+        found = {}
+        for token in found_tokens:
+            for line_id, token_bit in index.get(token, ()):
+                found[line_id] = found.get(line_id, 0) | token_bit
+                if found[line_id] == self._required[line_id]:
+                    return True
+        return False
+
+
+# inline flags for a whole regular expression, like (?i)
+global_flags_re = re.compile(r"\(\?[aiLmsux]+\)")
+
+
+class UserBlocklist:
+    """Users to ignore, indexed once for a roughly constant cost per tweet.
+
+    Exact user ids and screen names are in sets. Screen name patterns are searched for
+    anywhere in the screen name, ignoring case: plain strings with one automaton, and
+    regular expressions combined into one alternation.
+    """
+
+    def __init__(
+        self,
+        id_strs: list[str] = None,
+        screen_names: list[str] = None,
+        screen_name_patterns: list[str] = None,
+    ):
+        self.id_strs = frozenset(id_strs or [])
+        self.screen_names = frozenset(name.lower() for name in screen_names or [])
+        self.screen_name_patterns = list(dict.fromkeys(screen_name_patterns or []))
+        literals = []
+        combinable = []
+        self._separate_regexes = []
+        for pattern in self.screen_name_patterns:
+            if re.escape(pattern) == pattern:
+                literals.append(pattern.lower())
+                continue
+            try:
+                regex = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                logger.warning(f"Skipping invalid screen name pattern {pattern!r}: {e}")
+                continue
+            # groups and inline flags would change meaning in a combined alternation
+            if regex.groups or global_flags_re.match(pattern):
+                self._separate_regexes.append(regex)
+            else:
+                combinable.append(pattern)
+        self._literal_automaton = AhoCorasick(literals) if literals else None
+        self._match_all = "" in self.screen_name_patterns
+        self._regex = (
+            re.compile("|".join(f"(?:{pattern})" for pattern in combinable), re.I)
+            if combinable
+            else None
+        )
+
+    def __len__(self) -> int:
+        return (
+            len(self.id_strs) + len(self.screen_names) + len(self.screen_name_patterns)
+        )
+
+    def blocks_id_str(self, id_str: str) -> bool:
+        return id_str in self.id_strs
+
+    def blocks_screen_name(self, screen_name: str) -> bool:
+        screen_name_lower = screen_name.lower()
+        if self._match_all or screen_name_lower in self.screen_names:
+            return True
+        if self._literal_automaton is not None and (
+            self._literal_automaton.contains_any(screen_name_lower)
+        ):
+            return True
+        if self._regex is not None and self._regex.search(screen_name) is not None:
+            return True
+        return any(regex.search(screen_name) for regex in self._separate_regexes)
+
+    def blocks(self, status) -> bool:
+        return self.blocks_id_str(status["user"]["id_str"]) or self.blocks_screen_name(
+            status["user"]["screen_name"]
+        )
+
+
+class PreparedTweet:
+    """A status whose text is normalized once: the body, cleaned text, tokens, and
+    text features are each computed on first use and remembered.
+    Reads like the status dict, so the checks can take either.
+    """
+
+    def __init__(self, status: dict):
+        self.status = status
+
+    def __getitem__(self, key):
+        return self.status[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.status
+
+    def get(self, key, default=None):
+        return self.status.get(key, default)
+
+    @cached_property
+    def body(self) -> str:
+        return get_tweet_body(self.status)
+
+    @cached_property
+    def text(self) -> str:
+        """Text cleaned for syllable counting"""
+        return clean_text(self.body)
+
+    @cached_property
+    def tokens(self) -> list[str]:
+        return self.text.split()
+
+    @cached_property
+    def normalized_text(self) -> str:
+        """Cleaned text with punctuation replaced, for matching the ignore list"""
+        return clean_token(self.text)
+
+    @cached_property
+    def contains_url(self) -> bool:
+        return text_contains_url(self.text)
+
+    @cached_property
+    def is_all_uppercase(self) -> bool:
+        return text_is_all_uppercase(self.text)
+
+    @cached_property
+    def has_chars_digits_together(self) -> bool:
+        return text_has_chars_digits_together(self.text)
+
+
+def prepare_tweet(status: dict | PreparedTweet) -> PreparedTweet:
+    return status if isinstance(status, PreparedTweet) else PreparedTweet(status)
+
+
+def text_tokens(text: str | PreparedTweet) -> list[str]:
+    """Tokens of a cleaned text, reusing the ones of a PreparedTweet"""
+    return text.tokens if isinstance(text, PreparedTweet) else text.split()
 
 
 def check_profile(
     status,
-    ignore_profile_list: list[str],
+    ignore_profile_list: IgnoreListMatcher | list[str],
     match_substring: bool = None,
     remove_punct: bool = None,
 ) -> bool:
@@ -128,38 +513,67 @@ def check_profile(
     )
 
 
-def check_text_wrapper(status, ignore_list: list[str]) -> bool:
-    tweet_body = get_tweet_body(status)
-    text = clean_text(tweet_body)
+def get_text_filter(
+    ignore_list: IgnoreListMatcher | list[str], reorder_every: int = None
+) -> FilterPipeline:
+    """Checks of the cleaned text of a tweet, cheapest first"""
+    if not isinstance(ignore_list, IgnoreListMatcher):
+        ignore_list = IgnoreListMatcher(ignore_list)
 
-    valid_body = tweet_body is not None
-    valid_length = len(text) >= 17
-    valid_contains_url = not text_contains_url(text)
-    valid_contains_ignore_words = not text_contains_ignore_list_plural(
-        clean_token(text), ignore_list
+    return FilterPipeline(
+        [
+            FilterStage("valid_length", lambda tweet: len(tweet.text) >= 17),
+            FilterStage(
+                "valid_is_all_uppercase", lambda tweet: not tweet.is_all_uppercase
+            ),
+            FilterStage(
+                "valid_has_chars_digits_together",
+                lambda tweet: not tweet.has_chars_digits_together,
+            ),
+            FilterStage("valid_contains_url", lambda tweet: not tweet.contains_url),
+            FilterStage(
+                "valid_contains_ignore_words",
+                lambda tweet: not text_contains_ignore_list_plural(
+                    tweet.normalized_text, ignore_list
+                ),
+            ),
+            # FilterStage(
+            #     "valid_is_all_alpha", lambda tweet: text_is_all_alpha(tweet.text)
+            # ),
+        ],
+        reorder_every=reorder_every,
+    )
+
+
+def check_text_wrapper(
+    status: dict | PreparedTweet,
+    ignore_list: IgnoreListMatcher | list[str] = None,
+    text_filter: FilterPipeline = None,
+) -> bool:
+    """Return True if the text of the tweet satisfies specific criteria.
+    Reuse a text_filter from get_text_filter to keep its counters across tweets;
+    the ignore_list is then not needed.
+    """
+    text_filter = (
+        text_filter if text_filter is not None else get_text_filter(ignore_list or [])
     )
-    valid_has_chars_digits_together = not text_has_chars_digits_together(text)
-    valid_is_all_uppercase = not text_is_all_uppercase(text)
-    # valid_is_all_alpha = text_is_all_alpha(text)
-
-    checks = {
-        "valid_body": valid_body,
-        "valid_length": valid_length,
-        "valid_contains_url": valid_contains_url,
-        "valid_contains_ignore_words": valid_contains_ignore_words,
-        "valid_has_chars_digits_together": valid_has_chars_digits_together,
-        "valid_is_all_uppercase": valid_is_all_uppercase,
-        # "valid_is_all_alpha": valid_is_all_alpha,
-    }
 
-    for check, value in checks.items():
-        if not value:
-            logger.debug(f"Tweet {status['id_str']} failed check {str(check)}: {text}")
+    tweet = prepare_tweet(status)
+    if tweet.body is None:
+        logger.debug(f"Tweet {tweet['id_str']} failed check valid_body")
+        return False
 
-    return all(checks.values())
+    failed_check = text_filter.first_failure(tweet)
+    if failed_check is not None:
+        logger.debug(
+            f"Tweet {tweet['id_str']} failed check {failed_check}: {tweet.text}"
+        )
+    return failed_check is None
 
 
-def get_tweet_body(status):
+def get_tweet_body(status: dict | PreparedTweet) -> str:
+    if isinstance(status, PreparedTweet):
+        return status.body
     if "extended_tweet" in status:
         tweet_body = status["extended_tweet"]["full_text"]
     elif "full_text" in status:
@@ -171,8 +585,7 @@ def get_tweet_body(status):
     return tweet_body
 
 
-def check_tweet(
-    status,
+def get_tweet_filter(
     language: str = "en",
     ignore_user_screen_names: list[str] = None,
     ignore_user_id_str: list[str] = None,
@@ -182,10 +595,20 @@ def check_tweet(
     ignore_retweet_status: bool = None,
     min_friends_count: int = 10,
     min_followers_count: int = 100,
-) -> bool:
-    """Return True if tweet satisfies specific criteria"""
-    ignore_user_screen_names = ignore_user_screen_names or []
-    ignore_user_id_str = ignore_user_id_str or []
+    reorder_every: int = None,
+    user_blocklist: UserBlocklist = None,
+) -> FilterPipeline:
+    """Checks of a tweet's metadata: cheap structural checks first, patterns last.
+    Users are blocked by the user_blocklist, or else by the lists of user ids and
+    screen name patterns.
+    """
+    user_blocklist = (
+        user_blocklist
+        if user_blocklist is not None
+        else UserBlocklist(
+            id_strs=ignore_user_id_str, screen_name_patterns=ignore_user_screen_names
+        )
+    )
 
     ignore_possibly_sensitive = (
         ignore_possibly_sensitive if ignore_possibly_sensitive is not None else False
@@ -200,71 +623,122 @@ def check_tweet(
         ignore_retweet_status if ignore_retweet_status is not None else True
     )
 
-    tweet_body = get_tweet_body(status)
-    if not tweet_body:
-        # Likely has been deleted
-        logger.debug(f"Tweet has no body: {status}")
-        return False
-
-    valid_language = status["lang"] == language
-    valid_screen_name = all(
-        [
-            re.search(name, status["user"]["screen_name"], flags=re.IGNORECASE) is None
-            for name in ignore_user_screen_names
-        ]
-    )
-    valid_user_id = status["user"]["id_str"] not in ignore_user_id_str
-    # valid_verified = status["user"]["verified"]
-    # valid_no_media = "media" not in status["entities"]
-    valid_no_hashtags = not status["entities"]["hashtags"]
-    valid_no_urls = not status["entities"]["urls"]
-    valid_no_user_mentions = not status["entities"]["user_mentions"]
-    valid_no_symbols = not status["entities"]["symbols"]
-    valid_not_truncated = not status["truncated"]
-    valid_possibly_sensitive = (
-        not status.get("possibly_sensitive", False)
-        if ignore_possibly_sensitive
-        else True
-    )
-    valid_quoted = (
-        not status.get("is_quote_status", False) if ignore_quote_status else True
-    )
-    valid_reply = (
-        status.get("in_reply_to_status_id_str") is None if ignore_reply_status else True
-    )
-    valid_not_retweeted = (
-        status.get("retweeted_status") is None if ignore_retweet_status else True
-    )
-    # following
-    valid_friends_count = status["user"]["friends_count"] >= min_friends_count
-    # followers
-    valid_followers_count = status["user"]["followers_count"] >= min_followers_count
-
-    checks = {
-        # "valid_text": valid_text,
-        "valid_language": valid_language,
-        "valid_screen_name": valid_screen_name,
-        "valid_user_id": valid_user_id,
-        # "valid_verified": valid_verified,
-        # "valid_no_media": valid_no_media,
-        "valid_no_hashtags": valid_no_hashtags,
-        "valid_no_urls": valid_no_urls,
-        "valid_no_user_mentions": valid_no_user_mentions,
-        "valid_no_symbols": valid_no_symbols,
-        "valid_not_truncated": valid_not_truncated,
-        "valid_possibly_sensitive": valid_possibly_sensitive,
-        "valid_quoted": valid_quoted,
-        "valid_reply": valid_reply,
-        "valid_not_retweeted": valid_not_retweeted,
-        "valid_friends_count": valid_friends_count,
-        "valid_followers_count": valid_followers_count,
-    }
+    def valid_body(status) -> bool:
+        if not get_tweet_body(status):
+            # Likely has been deleted
+            logger.debug(f"Tweet has no body: {status}")
+            return False
+        return True
+
+    stages = [
+        # Deleted tweets have no other fields, so this always runs first
+        FilterStage("valid_body", valid_body, reorderable=False),
+        FilterStage("valid_language", lambda status: status["lang"] == language),
+        FilterStage("valid_not_truncated", lambda status: not status["truncated"]),
+        FilterStage(
+            "valid_no_hashtags", lambda status: not status["entities"]["hashtags"]
+        ),
+        FilterStage("valid_no_urls", lambda status: not status["entities"]["urls"]),
+        FilterStage(
+            "valid_no_user_mentions",
+            lambda status: not status["entities"]["user_mentions"],
+        ),
+        FilterStage(
+            "valid_no_symbols", lambda status: not status["entities"]["symbols"]
+        ),
+        # FilterStage("valid_verified", lambda status: status["user"]["verified"]),
+        # FilterStage(
+        #     "valid_no_media", lambda status: "media" not in status["entities"]
+        # ),
+    ]
+    if ignore_retweet_status:
+        stages.append(
+            FilterStage(
+                "valid_not_retweeted",
+                lambda status: status.get("retweeted_status") is None,
+            )
+        )
+    if ignore_quote_status:
+        stages.append(
+            FilterStage(
+                "valid_quoted", lambda status: not status.get("is_quote_status", False)
+            )
+        )
+    if ignore_reply_status:
+        stages.append(
+            FilterStage(
+                "valid_reply",
+                lambda status: status.get("in_reply_to_status_id_str") is None,
+            )
+        )
+    if ignore_possibly_sensitive:
+        stages.append(
+            FilterStage(
+                "valid_possibly_sensitive",
+                lambda status: not status.get("possibly_sensitive", False),
+            )
+        )
+    stages += [
+        # following
+        FilterStage(
+            "valid_friends_count",
+            lambda status: status["user"]["friends_count"] >= min_friends_count,
+        ),
+        # followers
+        FilterStage(
+            "valid_followers_count",
+            lambda status: status["user"]["followers_count"] >= min_followers_count,
+        ),
+        FilterStage(
+            "valid_user_id",
+            lambda status: not user_blocklist.blocks_id_str(status["user"]["id_str"]),
+        ),
+        FilterStage(
+            "valid_screen_name",
+            lambda status: not user_blocklist.blocks_screen_name(
+                status["user"]["screen_name"]
+            ),
+        ),
+    ]
+    return FilterPipeline(stages, reorder_every=reorder_every)
 
-    for check, value in checks.items():
-        if not value:
-            logger.debug(f"Tweet {status['id_str']} failed check {str(check)}")
 
-    return all(checks.values())
+def check_tweet(
+    status,
+    language: str = "en",
+    ignore_user_screen_names: list[str] = None,
+    ignore_user_id_str: list[str] = None,
+    ignore_possibly_sensitive: bool = None,
+    ignore_quote_status: bool = None,
+    ignore_reply_status: bool = None,
+    ignore_retweet_status: bool = None,
+    min_friends_count: int = 10,
+    min_followers_count: int = 100,
+    tweet_filter: FilterPipeline = None,
+    user_blocklist: UserBlocklist = None,
+) -> bool:
+    """Return True if tweet satisfies specific criteria.
+    Reuse a tweet_filter from get_tweet_filter to keep its counters across tweets;
+    the other criteria are then not needed.
+    """
+    if tweet_filter is None:
+        tweet_filter = get_tweet_filter(
+            language=language,
+            ignore_user_screen_names=ignore_user_screen_names,
+            ignore_user_id_str=ignore_user_id_str,
+            ignore_possibly_sensitive=ignore_possibly_sensitive,
+            ignore_quote_status=ignore_quote_status,
+            ignore_reply_status=ignore_reply_status,
+            ignore_retweet_status=ignore_retweet_status,
+            min_friends_count=min_friends_count,
+            min_followers_count=min_followers_count,
+            user_blocklist=user_blocklist,
+        )
+
+    failed_check = tweet_filter.first_failure(status)
+    if failed_check is not None and failed_check != "valid_body":
+        logger.debug(f"Tweet {status['id_str']} failed check {failed_check}")
+    return failed_check is None
 
 
 def date_string_to_datetime(
@@ -290,7 +764,8 @@ def remove_repeat_last_letter(text: str) -> str:
     if (len(set(text)) <= 1) and (set(text) & set(PRONOUNCED_LETTERS)):
         return text
 
-    return re.sub(rf"({text[-1]})\1+$", r"\1", text)
+    # Same as re.sub(rf"({text[-1]})\1+$", r"\1", text), without compiling a regex
+    return text.rstrip(text[-1]) + text[-1]
 
 
 def text_might_contain_acronym(text: str) -> bool:
@@ -314,7 +789,7 @@ def text_contains_url(text: str) -> bool:
 
 
 def text_contains_ignore_list_plural(
-    text: str, ignore_list: list[str], match_substring: bool = None
+    text: str, ignore_list: IgnoreListMatcher | list[str], match_substring: bool = None
 ) -> bool:
     """Return True if anything from the ignore list is in the text.
 
@@ -330,33 +805,14 @@ def text_contains_ignore_list_plural(
     if text is None:
         return text
 
-    match_substring = match_substring if match_substring is not None else False
+    if not isinstance(ignore_list, IgnoreListMatcher):
+        ignore_list = IgnoreListMatcher(ignore_list)
 
-    text_compare = text.lower() if match_substring else text.lower().split()
-
-    # Create versions of tokens without repeated final letters
-    text_compare.extend([remove_repeat_last_letter(t) for t in text_compare])
-
-    return any(
-        [
-            all(
-                [
-                    any(
-                        [
-                            t in text_compare
-                            for t in [token, f"{token}s", f"{token}z", f"{token}es"]
-                        ]
-                    )
-                    for token in ignore_line.split()
-                ]
-            )
-            for ignore_line in ignore_list
-        ]
-    )
+    return ignore_list.matches(text, plurals=True, match_substring=match_substring)
 
 
 def text_contains_ignore_list(
-    text: str, ignore_list: list[str], match_substring: bool = None
+    text: str, ignore_list: IgnoreListMatcher | list[str], match_substring: bool = None
 ) -> bool:
     """Return True if anything from the ignore list is in the text.
     Each ignore list line is considered separately (OR logic).
@@ -366,16 +822,10 @@ def text_contains_ignore_list(
     if text is None:
         return text
 
-    match_substring = match_substring if match_substring is not None else False
+    if not isinstance(ignore_list, IgnoreListMatcher):
+        ignore_list = IgnoreListMatcher(ignore_list)
 
-    text_compare = text.lower() if match_substring else text.lower().split()
-
-    return any(
-        [
-            all([token in text_compare for token in ignore_line.lower().split()])
-            for ignore_line in ignore_list
-        ]
-    )
+    return ignore_list.matches(text, plurals=False, match_substring=match_substring)
 
 
 def text_has_chars_digits_together(text: str) -> bool:
@@ -403,60 +853,87 @@ def text_is_all_uppercase(text: str) -> bool:
     return all([char.isupper() for char in re.sub(r"[^A-Za-z]", "", text)])
 
 
-def clean_token(token: str, unicode_normalize_form: str = "NFKC") -> str:
-    if token is None:
-        return token
-
-    # Normalize unicode letters
-    # NFKD: decomposes, NFKC: composes pre-combined characters again
-    token = unicodedata.normalize(unicode_normalize_form, token)
-
+# Rules of clean_token, applied in order: (characters that must be in the token for
+# the rule to apply, pattern, replacement). No rule adds any of these characters, so
+# the characters found before the first rule are enough to skip the others.
+CLEAN_TOKEN_RULES = [
     # # remove space before some punctuation if preceded by a letter or number
     # # ("hello ,how are you ? doing")
-    # token = re.sub(r"(\w)\s([.,;!?](?=\s|$)?)", r"\1\2", token)
-
+    # ("., ;!?", re.compile(r"(\w)\s([.,;!?](?=\s|$)?)"), r"\1\2"),
     # put space after some punctuation if followed by a letter or number ("cat,dog")
-    token = re.sub(r"(?<=[;!?])(?=[\w])", r" ", token)
-
+    (";!?", re.compile(r"(?<=[;!?])(?=[\w])"), " "),
     # put space after period if followed by a letter ("good.What")
-    token = re.sub(r"(?<=[.,])(?=[A-Za-z])", r" ", token)
-
+    (".,", re.compile(r"(?<=[.,])(?=[A-Za-z])"), " "),
     # remove spaces around apostrophe if letter-space-apostrophe-space-letter
-    token = re.sub(r"(\w)\s(['])[?=\s\w]", r"\1\2", token)
-
+    ("'", re.compile(r"(\w)\s(['])[?=\s\w]"), r"\1\2"),
     # add space around some punctuation if letters on both sides
-    token = re.sub(r"([\w])([#@&%=+/×\-](?=[\w]))", r"\1 \2 ", token)  # noqa: RUF001
-
+    (
+        "#@&%=+/×-",  # noqa: RUF001
+        re.compile(r"([\w])([#@&%=+/×\-](?=[\w]))"),  # noqa: RUF001
+        r"\1 \2 ",
+    ),
     # try to replace an asterisk (representing a missing vowel) with "u"
-    token = re.sub(r"([\w])[\*]((?=[\w]))", r"\1u\2", token)
-
+    ("*", re.compile(r"([\w])[\*]((?=[\w]))"), r"\1u\2"),
     # put a space after some punctuation that precedes a letter
-    token = re.sub(r"([#@&=+/×])((?=[\w]))", r"\1 \2", token)  # noqa: RUF001
-
+    ("#@&=+/×", re.compile(r"([#@&=+/×])((?=[\w]))"), r"\1 \2"),  # noqa: RUF001
     # put a space before some punctuation that follows a letter
-    token = re.sub(r"([\w])([#@&%=+/×])", r"\1 \2", token)  # noqa: RUF001
-
+    ("#@&%=+/×", re.compile(r"([\w])([#@&%=+/×])"), r"\1 \2"),  # noqa: RUF001
     # special cases
-    token = re.sub(r"\bb / c\b", "because", token, flags=re.IGNORECASE)
-    token = re.sub(r"\bb / t\b", "between", token, flags=re.IGNORECASE)
-    token = re.sub(r"\bw / o\b", "without", token, flags=re.IGNORECASE)
-    token = re.sub(r"\bw /\s\b", "with ", token, flags=re.IGNORECASE)
-    token = re.sub(r"\bw /\b", "with", token, flags=re.IGNORECASE)
-    token = re.sub(r"\ba\b\*", "a star", token, flags=re.IGNORECASE)
-
-    # replace some punctuation with words
-    token = token.replace("@", "at")
-    token = token.replace("#", "number")
-    token = token.replace("&", "and")
-    token = token.replace("%", "percent")
-    token = token.replace("=", "equals")
-    token = token.replace("×", "times")  # noqa: RUF001
-    token = token.replace("+", "plus")
-    # token = token.replace('*', 'star')
-    # token = token.replace('/', 'slash')
-
-    # keep the following punctuation: letters, apostrophes, commas, periods
-    token_clean = re.sub(r"[^\w',\.]", " ", token).strip()
+    ("/", re.compile(r"\bb / c\b", flags=re.IGNORECASE), "because"),
+    ("/", re.compile(r"\bb / t\b", flags=re.IGNORECASE), "between"),
+    ("/", re.compile(r"\bw / o\b", flags=re.IGNORECASE), "without"),
+    ("/", re.compile(r"\bw /\s\b", flags=re.IGNORECASE), "with "),
+    ("/", re.compile(r"\bw /\b", flags=re.IGNORECASE), "with"),
+    ("*", re.compile(r"\ba\b\*", flags=re.IGNORECASE), "a star"),
+]
+clean_token_triggers = "".join(
+    sorted({char for chars, _, _ in CLEAN_TOKEN_RULES for char in chars})
+)
+clean_token_trigger_re = re.compile(f"[{re.escape(clean_token_triggers)}]")
+
+# replace some punctuation with words, in one pass
+clean_token_words_table = str.maketrans(
+    {
+        "@": "at",
+        "#": "number",
+        "&": "and",
+        "%": "percent",
+        "=": "equals",
+        "×": "times",  # noqa: RUF001
+        "+": "plus",
+        # "*": "star",
+        # "/": "slash",
+    }
+)
+
+# keep the following punctuation: letters, apostrophes, commas, periods
+clean_token_drop_re = re.compile(r"[^\w',\.]")
+
+# tokens that clean_token leaves as they are
+plain_token_re = re.compile(r"[A-Za-z0-9_']*")
+
+
+def clean_token(token: str, unicode_normalize_form: str = "NFKC") -> str:
+    if token is None:
+        return token
+
+    if token.isascii():
+        # Unicode normalization does not change ASCII, and plain words need no rules
+        if plain_token_re.fullmatch(token):
+            return token
+    else:
+        # Normalize unicode letters
+        # NFKD: decomposes, NFKC: composes pre-combined characters again
+        token = unicodedata.normalize(unicode_normalize_form, token)
+
+    triggers = set(clean_token_trigger_re.findall(token))
+    if triggers:
+        for rule_chars, pattern, replacement in CLEAN_TOKEN_RULES:
+            if not triggers.isdisjoint(rule_chars):
+                token = pattern.sub(replacement, token)
+        token = token.translate(clean_token_words_table)
+
+    token_clean = clean_token_drop_re.sub(" ", token).strip()
 
     return token_clean
 
@@ -0,0 +1,172 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+
+from .cache_utils import StatusCache
+
+logger = logging.getLogger("haiku_logger")
+
+# Most statuses one lookup request can return
+LOOKUP_BATCH_SIZE = 100
+
+
+def lookup_statuses(twitter, id_strs: list[str]) -> list[dict]:
+    """Full statuses for up to LOOKUP_BATCH_SIZE ids in one request.
+    Deleted and protected statuses are left out.
+    """
+    if not id_strs:
+        return []
+    return twitter.lookup_status(
+        id=",".join(id_strs),
+        tweet_mode="extended",
+        include_entities=True,
+    )
+
+
+class StatusLookup:
+    """Looks up statuses in bulk, remembering them for a short while in a cache,
+    so ranking candidate haikus and posting the best one share requests.
+    """
+
+    def __init__(self, twitter, status_cache: StatusCache = None):
+        self.twitter = twitter
+        self.status_cache = status_cache
+        self.requests = 0
+
+    def lookup(self, id_strs: list[str]) -> tuple[dict, set]:
+        """Statuses by id, and the ids that no longer exist (e.g., deleted).
+        Ids in a request that failed are in neither.
+        """
+        statuses = {}
+        to_lookup = []
+        for id_str in dict.fromkeys(id_strs):
+            status = (
+                self.status_cache.get_status(id_str)
+                if self.status_cache is not None
+                else None
+            )
+            if status is not None:
+                statuses[id_str] = status
+            else:
+                to_lookup.append(id_str)
+
+        missing = set()
+        for i in range(0, len(to_lookup), LOOKUP_BATCH_SIZE):
+            batch = to_lookup[i : i + LOOKUP_BATCH_SIZE]
+            self.requests += 1
+            try:
+                found = {
+                    status["id_str"]: status
+                    for status in lookup_statuses(self.twitter, batch)
+                }
+            except Exception as e:
+                logger.warning(f"Exception when looking up {len(batch)} statuses: {e}")
+                continue
+            for id_str in batch:
+                if id_str in found:
+                    statuses[id_str] = found[id_str]
+                    if self.status_cache is not None:
+                        self.status_cache.put_status(found[id_str])
+                else:
+                    missing.add(id_str)
+        return statuses, missing
+
+    def get_status(self, id_str: str) -> dict | None:
+        """One status, from the cache if it was looked up recently"""
+        statuses, _ = self.lookup([id_str])
+        return statuses.get(id_str)
+
+
+class StatusHydrator:
+    """Gets the full text of truncated statuses in bulk, on a background thread.
+
+    Submitted statuses are looked up in batches of up to batch_size ids, once a batch
+    is full or its first status has waited max_delay_seconds. Each hydrated status is
+    handed to on_hydrated; a status that could not be hydrated is handed over as it
+    was submitted, so the usual checks can reject it.
+    """
+
+    def __init__(
+        self,
+        lookup: Callable,
+        on_hydrated: Callable,
+        batch_size: int = None,
+        max_delay_seconds: float = None,
+    ):
+        self.lookup = lookup
+        self.on_hydrated = on_hydrated
+        self.batch_size = min(
+            batch_size if batch_size is not None else LOOKUP_BATCH_SIZE,
+            LOOKUP_BATCH_SIZE,
+        )
+        self.max_delay_seconds = (
+            max_delay_seconds if max_delay_seconds is not None else 5.0
+        )
+        self.batches = 0
+        self.hydrated = 0
+        self.missing = 0
+        self._pending = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="status-hydrator", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, status: dict):
+        self._pending.put(status)
+
+    def close(self):
+        """Hydrate the statuses that were submitted, then stop"""
+        self._pending.put(None)
+        self._thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "hydrated": self.hydrated,
+            "missing": self.missing,
+        }
+
+    def _run(self):
+        closing = False
+        while not closing:
+            status = self._pending.get()
+            if status is None:
+                break
+            batch = [status]
+            deadline = time.monotonic() + self.max_delay_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    status = self._pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if status is None:
+                    closing = True
+                    break
+                batch.append(status)
+            self._hydrate(batch)
+
+    def _hydrate(self, batch: list[dict]):
+        self.batches += 1
+        try:
+            statuses = self.lookup(list(dict.fromkeys(s["id_str"] for s in batch)))
+        except Exception as e:
+            logger.info(f"Exception when hydrating {len(batch)} truncated tweets: {e}")
+            statuses = []
+        hydrated = {status["id_str"]: status for status in statuses}
+
+        for status in batch:
+            status_full = hydrated.get(status["id_str"])
+            if status_full is not None:
+                self.hydrated += 1
+            else:
+                self.missing += 1
+                logger.debug(f"Didn't get full text for truncated tweet {status['id']}")
+            try:
+                self.on_hydrated(status_full if status_full is not None else status)
+            except Exception as e:
+                logger.info(f"Exception when handling tweet {status['id_str']}: {e}")
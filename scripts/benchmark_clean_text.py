@@ -0,0 +1,176 @@
+"""
+Compare the throughput of clean_text with the letter-by-letter implementation it
+replaced, after checking that both give the same text, over the test corpora and a
+synthetic corpus of tweet-like texts.
+
+The reference converts emoji to text and back, which adds a variation selector to
+emoji written without one (❤ becomes ❤️); clean_text leaves emoji as they are, so
+variation selectors are ignored when comparing.
+
+Run as a module from the top-level folder like:
+poetry run python -m scripts.benchmark_clean_text
+"""
+
+import argparse
+import logging
+import random
+import time
+from pathlib import Path
+
+import emoji
+from ftfy import fix_text
+from unidecode import unidecode
+
+from haikuincidence.utils.text_utils import clean_text
+
+logging.basicConfig(format="{asctime} : {levelname} : {message}", style="{")
+logger = logging.getLogger("haiku_logger")
+logger.setLevel(logging.INFO)
+
+# Escape backslash because they are compared with "unicode-escape"
+UNICODE_IGNORE_REFERENCE = [
+    "\\u3164",  # Hangul Filler https://codepoints.net/U+3164
+    "\\uffa0",  # Halfwidth Hangul Filler https://codepoints.net/U+FFA0
+]
+
+UNICODE_KEEP_REFERENCE = [
+    "\u200d",  # Zero Width Joiner https://codepoints.net/U+200D
+    "\u2642",  # Male Sign  https://codepoints.net/U+2642
+    "\u2640",  # Female Sign  https://codepoints.net/U+2640
+    "\ufe0f",  # Variation Selector-16 for emoji https://codepoints.net/U+FE0F
+]
+
+# Pieces of synthetic tweets, from plain words to things that need cleaning
+PLAIN_PIECES = [
+    "the", "old", "pond", "frog", "jumps", "in", "sound", "of", "water", "haiku",
+    "I'm", "don't", "LOL", "2023", "#poetry", "@poet", "!", "?", "...", "(really)",
+    "b/c", "w/o", "$5", "100%", ":)", "<3", "x-D", "a+b=c", "\n", "  ",
+]  # fmt: skip
+UNICODE_PIECES = [
+    "café", "naïve", "Zoë", "…", "“quoted”", "it’s", "北京",  # noqa: RUF001
+    "Москва", "😂", "👍🏽", "💇🏽\u200d♀️", "❤️", "🇺🇸",  # noqa: RUF001
+    "\u3164", "\uffa0", "\u200d", "\u2642", "ﬁne", "ｗｉｄｅ",  # noqa: RUF001
+    "&amp;", "&lt;3", "&eacute;", ":red_heart:", ":thumbs_up:", "\x1b[31m", "\x00",
+    "\r\n", "\xa0", "\u3000", "ÃƒÂ©",
+]  # fmt: skip
+
+
+def clean_text_reference(text: str) -> str:
+    """Process text so it's ready for syllable counting"""
+    # change some characters that are difficult to count syllables for, but keep emojis
+    # split on whitespace and rejoin; removes multiple spaces and newlines
+    if text is None:
+        return text
+
+    # Remove some unicode letters
+    text_cleaned = " ".join(
+        [
+            "".join(
+                [
+                    letter
+                    for letter in word
+                    if letter.encode("unicode-escape").decode()
+                    not in UNICODE_IGNORE_REFERENCE
+                ]
+            )
+            for word in fix_text(text).split()
+        ]
+    )
+
+    # Convert emoji to text
+    text_cleaned = emoji.demojize(text_cleaned)
+
+    # Decode unicode letters
+    text_decoded = " ".join(
+        [
+            "".join(
+                [
+                    (
+                        unidecode(letter)
+                        if (letter not in UNICODE_KEEP_REFERENCE)
+                        else letter
+                    )
+                    for letter in word
+                ]
+            )
+            for word in text_cleaned.split()
+        ]
+    )
+
+    # Convert text to emoji
+    text_decoded = emoji.emojize(text_decoded)
+
+    return text_decoded
+
+
+def synthetic_texts(n_texts: int, unicode_fraction: float, seed: int) -> list[str]:
+    """Tweet-like texts; some have no unicode at all, like most English tweets"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n_texts):
+        pieces = rng.choices(PLAIN_PIECES, k=rng.randint(5, 30))
+        if rng.random() < unicode_fraction:
+            for _ in range(rng.randint(1, 4)):
+                pieces.insert(
+                    rng.randrange(len(pieces) + 1), rng.choice(UNICODE_PIECES)
+                )
+        texts.append(" ".join(pieces))
+    return texts
+
+
+def corpus_texts() -> list[str]:
+    texts = []
+    for filepath in sorted(Path("tests").glob("data_*.txt")):
+        with open(filepath) as fp:
+            lines = fp.read().splitlines()
+        if filepath.name == "data_process.txt":
+            lines = [line.split(",")[0] for line in lines]
+        texts.extend(lines)
+    return texts
+
+
+def time_it(func, texts, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark clean_text.")
+    parser.add_argument(
+        "-n", "--n-texts", type=int, default=20000, help="Number of synthetic texts"
+    )
+    parser.add_argument(
+        "-u",
+        "--unicode-fraction",
+        type=float,
+        default=0.3,
+        help="Fraction of synthetic texts with some unicode",
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=20, help="Corpus repeats")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    corpora = {
+        "test corpora": corpus_texts(),
+        "synthetic": synthetic_texts(args.n_texts, args.unicode_fraction, args.seed),
+    }
+
+    for name, texts in corpora.items():
+        for text in texts:
+            assert clean_text(text).replace("\ufe0f", "") == clean_text_reference(
+                text
+            ).replace("\ufe0f", ""), f"Cleaned text differs for {text!r}"
+        logger.info(f"Cleaned texts match for {len(texts):,} {name} texts")
+
+        repeat = args.repeat if name == "test corpora" else 1
+        reference = time_it(clean_text_reference, texts, repeat)
+        elapsed = time_it(clean_text, texts, repeat)
+        n_texts = len(texts) * repeat
+        logger.info(
+            f"{name}: reference {reference / n_texts * 1e6:.1f} us/text,"
+            f" clean_text {elapsed / n_texts * 1e6:.1f} us/text"
+            f" ({reference / elapsed:.1f}x reference)"
+        )
@@ -0,0 +1,224 @@
+"""
+Compare the throughput of guess_syllables with the character-by-character
+implementation it replaced, after checking that both give the same counts.
+
+Run as a module from the top-level folder like:
+poetry run python -m scripts.benchmark_guess_syllables
+"""
+
+import argparse
+import logging
+import math
+import re
+import time
+
+from nltk.corpus import cmudict
+
+from haikuincidence.utils.haiku_utils import (
+    guess_syllable_range,
+    guess_syllables,
+    guess_syllables_batch,
+)
+
+logging.basicConfig(format="{asctime} : {levelname} : {message}", style="{")
+logger = logging.getLogger("haiku_logger")
+logger.setLevel(logging.INFO)
+
+
+def guess_syllables_reference(
+    word: str, method: str = None, mean_round_dir: str = None
+) -> int:
+    """Guess the number of syllables in a string.
+    Returned value depends on the method used. Mean is usually good enough.
+
+    A diphthong is two vowel sounds in a single syllable (e.g., pie, boy, cow)
+    """
+
+    def avg_syl(minsyl: int, maxsyl: int, mean_round_dir: str):
+        if mean_round_dir == "up":
+            syl = math.ceil((minsyl + maxsyl) / 2)
+        elif mean_round_dir == "down":
+            syl = (minsyl + maxsyl) // 2
+        return syl
+
+    def get_syl_count_str(minsyl: int, maxsyl: int, mean_round_dir: str):
+        return (
+            f"min syl {minsyl},"
+            f" mean syl {avg_syl(minsyl, maxsyl, mean_round_dir)},"
+            f" max syl {maxsyl}"
+        )
+
+    vowels = ["a", "e", "i", "o", "u"]
+
+    method = method or "mean"
+    mean_round_dir = mean_round_dir or "down"
+
+    assert method in ["min", "max", "mean"]
+    if method == "mean":
+        assert mean_round_dir in ["down", "up"]
+
+    logger.debug(f"Guessing syllable count with method: {method}")
+    if method == "mean":
+        logger.debug(f"    Rounding direction: {mean_round_dir}")
+
+    on_vowel = False
+    in_diphthong = False
+    minsyl = 0
+    maxsyl = 0
+    last_char = None
+
+    word = word.lower()
+    for i, c in enumerate(word):
+        is_vowel = c in vowels
+
+        # y is a special case:
+        # serves as a vowel when the previous character was not a vowel,
+        # serves as a consonant when the previous character was a vowel
+        if c == "y":
+            is_vowel = not on_vowel
+
+        if is_vowel:
+            logger.debug(f"vowel: {c}")
+            if not on_vowel:
+                # We weren't on a vowel before.
+                # Seeing a new vowel bumps the syllable count.
+                minsyl += 1
+                maxsyl += 1
+                logger.debug(
+                    "    new syllable:"
+                    f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
+                )
+            elif on_vowel and not in_diphthong and c != last_char:
+                # We were already in a vowel.
+                # Don't increment anything except the max count,
+                # and only do that once per diphthong.
+                in_diphthong = True
+                maxsyl += 1
+                logger.debug(
+                    "    diphthong:"
+                    f" {c}: {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
+                )
+        else:
+            in_diphthong = False
+            if re.findall(r"[\w]", c):
+                logger.debug(f"consonant: {c}")
+            else:
+                logger.debug(f"other: {c}")
+
+        if i + 1 == len(word):
+            break
+
+        on_vowel = is_vowel
+        last_char = c
+
+    # May have counted too many syllables: If word ends in e, or past tense (-ed),
+    # run some checks.
+    if (
+        (len(word) >= 3)
+        and ((word[-1] == "e") or (word[-2:] == "ed"))
+        and (word[-2:] not in ["be", "ie", "ee"])
+        and (word[-3] not in ["d", "t"])
+    ):
+        minsyl -= 1
+        # maxsyl -= 1
+        logger.debug(
+            f"Ends in e or ed (with conditions), removing a syllable for '{word}':"
+            f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
+        )
+
+    if (len(word) >= 3) and (word[-2:] == "le") and (word[-3] not in [*vowels, "l"]):
+        minsyl += 1
+        maxsyl += 1
+        logger.debug(
+            f"Adding back a syllable for '{word}':"
+            f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
+        )
+
+    # Possessive with word ending in certain sounds may not get enough syllables
+    if (len(word) >= 3) and (word[-2:] == "'s") and (word[-3] in ["x"]):
+        minsyl += 1
+        maxsyl += 1
+        logger.debug(
+            f"Possessive: Adding a syllable for '{word}':"
+            f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
+        )
+
+    # check on ending with a consonant followed by y
+    if (len(word) >= 3) and (word[-2] not in vowels) and (word[-1] == "y"):
+        if word[-3] == "e":
+            minsyl -= 1
+            logger.debug(
+                f"Ends with e + consonant + y: Removing a syllable for '{word}':"
+                f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
+            )
+        else:
+            maxsyl += 1
+            logger.debug(
+                f"Ends with consonant + y: Adding a syllable for '{word}':"
+                f" {get_syl_count_str(minsyl, maxsyl, mean_round_dir)}"
+            )
+
+    # other special cases
+    if word.endswith("phobia") or word.endswith("bio"):
+        maxsyl += 1
+
+    # if found no syllables but there's at least one letter,
+    # count as one syllable
+    if re.findall(r"[\w]", word):
+        if not minsyl:
+            minsyl = 1
+        if not maxsyl:
+            maxsyl = 1
+
+    if method == "min":
+        syl = minsyl
+    elif method == "mean":
+        syl = avg_syl(minsyl, maxsyl, mean_round_dir)
+    elif method == "max":
+        syl = maxsyl
+
+    return syl
+
+
+def time_it(func, words, methods) -> float:
+    start = time.perf_counter()
+    for method in methods:
+        func(words, method)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark syllable guessing.")
+    parser.add_argument(
+        "-n", "--n-words", type=int, default=50000, help="Number of words to guess"
+    )
+    args = parser.parse_args()
+
+    words = sorted(cmudict.words())[: args.n_words]
+    methods = ["min", "mean", "max"]
+
+    for word in words:
+        for method in methods:
+            assert guess_syllables(word, method) == guess_syllables_reference(
+                word, method
+            ), f"Guess differs for {word} with method {method}"
+    logger.info(f"Guesses match for {len(words):,} words")
+
+    results = {
+        "reference": time_it(
+            lambda ws, m: [guess_syllables_reference(w, m) for w in ws], words, methods
+        ),
+    }
+    guess_syllable_range.cache_clear()
+    results["guess_syllables"] = time_it(
+        lambda ws, m: [guess_syllables(w, m) for w in ws], words, methods
+    )
+    guess_syllable_range.cache_clear()
+    results["guess_syllables_batch"] = time_it(guess_syllables_batch, words, methods)
+
+    n_guesses = len(words) * len(methods)
+    for name, elapsed in results.items():
+        logger.info(
+            f"{name}: {n_guesses / elapsed:,.0f} words/second"
+            f" ({results['reference'] / elapsed:.1f}x reference)"
+        )
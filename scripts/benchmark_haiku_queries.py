@@ -0,0 +1,170 @@
+"""
+Measure the latency of the haikus table queries before and after the migration that
+adds its indexes, on a table of synthetic haikus (1,000,000 rows by default).
+
+Uses a new SQLite database in a temporary folder, or the database at --database-url,
+e.g., a local Postgres database, which must not have a haikus table yet.
+
+Run as a module from the top-level folder like:
+poetry run python -m scripts.benchmark_haiku_queries
+poetry run python -m scripts.benchmark_haiku_queries -d postgresql://localhost/bench
+"""
+
+import argparse
+import itertools
+import logging
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import create_engine, desc, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from haikuincidence.utils.data_base import Haiku
+from haikuincidence.utils.migration_utils import LATEST_VERSION, migrate
+
+logging.basicConfig(format="{asctime} : {levelname} : {message}", style="{")
+logger = logging.getLogger("haiku_logger")
+logger.setLevel(logging.INFO)
+
+
+def synthetic_rows(n_rows: int, days: float, seed: int):
+    """Haikus spread evenly over the last days; a few were posted or deleted"""
+    rng = random.Random(seed)
+    now = datetime.now(tz=timezone.utc)
+    for i in range(n_rows):
+        created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        draw = rng.random()
+        yield {
+            "status_id_str": str(10**18 + i),
+            "user_screen_name": f"poet{i % 50000}",
+            "user_id_str": str(i % 50000),
+            "user_verified": False,
+            "created_at": created_at,
+            "text_original": "an old silent pond / a frog jumps into the pond",
+            "text_clean": "an old silent pond a frog jumps into the pond",
+            "haiku": "an old silent pond\na frog jumps into the pond\nsplash",
+            "date_posted": created_at if draw < 0.01 else None,
+            "date_deleted": created_at if 0.01 <= draw < 0.02 else None,
+        }
+
+
+def insert_rows(engine, n_rows: int, days: float, seed: int, chunk_size: int = 10000):
+    rows = synthetic_rows(n_rows, days, seed)
+    with engine.begin() as connection:
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            connection.execute(Haiku.__table__.insert(), chunk)
+
+
+def time_queries(db_session, n_rows: int, days: float, repeat: int, seed: int) -> dict:
+    """Milliseconds per call of each hot query. Retention runs about once an hour, so
+    it finds the oldest hour of haikus.
+    """
+    rng = random.Random(seed)
+    rows_to_keep = n_rows - int(n_rows / (days * 24))
+
+    def random_status_id_str():
+        return str(10**18 + rng.randrange(n_rows))
+
+    def newest_rows_cutoff():
+        # The created_at of the oldest row to keep, for retention by row count
+        return (
+            db_session.query(Haiku.created_at)
+            .order_by(desc(Haiku.created_at))
+            .offset(rows_to_keep)
+            .limit(1)
+            .scalar()
+        )
+
+    def older_than_count():
+        # The rows that retention by timestamp deletes, without deleting them
+        ts_end = datetime.now(tz=timezone.utc) - timedelta(days=days, hours=-1)
+        return (
+            db_session.query(Haiku.id)
+            .filter(Haiku.created_at < ts_end)
+            .filter(Haiku.date_posted == None)  # noqa: E711
+            .count()
+        )
+
+    def update_posted():
+        status_id_str = random_status_id_str()
+        Haiku.update_haiku_posted(db_session, status_id_str)
+        Haiku.update_haiku_unposted(db_session, status_id_str)
+
+    queries = {
+        "get_haikus_unposted_timedelta": lambda: (
+            Haiku.get_haikus_unposted_timedelta(db_session, td_seconds=3600)
+        ),
+        "is_haiku_posted": lambda: Haiku.is_haiku_posted(
+            db_session, random_status_id_str()
+        ),
+        "update_haiku_posted + unposted": update_posted,
+        "retention cutoff by row count": newest_rows_cutoff,
+        "retention rows by timestamp": older_than_count,
+    }
+    timings = {}
+    for name, query in queries.items():
+        query()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query()
+        timings[name] = (time.perf_counter() - start) / repeat * 1000
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark haikus table queries.")
+    parser.add_argument(
+        "-d", "--database-url", type=str, default=None, help="Empty database to use"
+    )
+    parser.add_argument(
+        "-n", "--n-rows", type=int, default=1_000_000, help="Number of haikus"
+    )
+    parser.add_argument(
+        "--days", type=float, default=90, help="Days the haikus are spread over"
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=20, help="Query repeats")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_url = args.database_url or f"sqlite:///{Path(tmp_dir) / 'bench.db'}"
+        engine = create_engine(database_url, poolclass=NullPool)
+        if inspect(engine).has_table(Haiku.__tablename__):
+            raise SystemExit(f"Database already has a haikus table: {database_url}")
+
+        # The table as it was before migrations, with only a primary key
+        migrate(engine, target_version=1)
+        start = time.perf_counter()
+        insert_rows(engine, args.n_rows, args.days, args.seed)
+        logger.info(
+            f"Inserted {args.n_rows:,} haikus in {time.perf_counter() - start:.1f} s"
+        )
+
+        with Session(bind=engine) as db_session:
+            before = time_queries(
+                db_session, args.n_rows, args.days, args.repeat, args.seed
+            )
+
+        start = time.perf_counter()
+        migrate(engine)
+        logger.info(
+            f"Migrated to version {LATEST_VERSION} in"
+            f" {time.perf_counter() - start:.1f} s"
+        )
+
+        with Session(bind=engine) as db_session:
+            after = time_queries(
+                db_session, args.n_rows, args.days, args.repeat, args.seed
+            )
+
+        logger.info(f"{engine.dialect.name}, {args.n_rows:,} rows, ms per query:")
+        for name in before:
+            logger.info(
+                f"{name}: {before[name]:.2f} ms without indexes,"
+                f" {after[name]:.2f} ms with indexes"
+                f" ({before[name] / after[name]:.0f}x)"
+            )
@@ -0,0 +1,136 @@
+"""
+Measure how long the app takes to start: the import time of each module
+(python -X importtime), and the wall time to import the app, load everything needed
+to analyze tweets, and analyze the first tweet. Each run is a fresh interpreter.
+
+Run as a module from the top-level folder like:
+poetry run python -m scripts.benchmark_startup
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+logging.basicConfig(format="{asctime} : {levelname} : {message}", style="{")
+logger = logging.getLogger("haiku_logger")
+logger.setLevel(logging.INFO)
+
+app_dir = Path(__file__).resolve().parent.parent / "haikuincidence"
+
+# Third-party packages that are slow to import, and whether importing the app imports
+# them. sqlalchemy (ORM models) and twython (MyStreamer) are needed to define the app's
+# classes; the rest are imported by the processes that analyze tweets, when loading.
+dependencies = [
+    "sqlalchemy",
+    "twython",
+    "emoji",
+    "ftfy",
+    "unidecode",
+    "nltk",
+    "inflect",
+]
+
+# Runs in a fresh interpreter in app_dir, and prints the timings as JSON
+first_tweet_code = """
+import json
+import time
+
+start = time.perf_counter()
+import app
+
+imported = time.perf_counter()
+analyzer = app.load_analyzer(app.Path(DATA_DIR))
+ready = time.perf_counter()
+status = {
+    "id": 1,
+    "id_str": "1",
+    "text": "an old silent pond / a frog jumps into the pond / splash! silence again",
+    "lang": "en",
+    "truncated": False,
+    "entities": {"hashtags": [], "urls": [], "user_mentions": [], "symbols": []},
+    "user": {
+        "screen_name": "basho",
+        "id_str": "1",
+        "friends_count": 100,
+        "followers_count": 1000,
+        "description": "",
+    },
+}
+analyzer.analyze(status)
+done = time.perf_counter()
+print(
+    json.dumps(
+        {
+            "import": imported - start,
+            "ready": ready - start,
+            "first_tweet": done - start,
+        }
+    )
+)
+"""
+
+
+def run_app_python(args: list[str]) -> subprocess.CompletedProcess:
+    env = {**os.environ, "ENVIRONMENT": "production", "DEBUG_MODE": "false"}
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=app_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_times() -> list[tuple[int, str]]:
+    """Cumulative microseconds and (indented) name of each module the app imports"""
+    result = run_app_python(["-X", "importtime", "-c", "import app"])
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times.append((int(cumulative), name.rstrip()))
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark app startup.")
+    parser.add_argument(
+        "-d",
+        "--data-dir",
+        type=Path,
+        default=Path.cwd() / "data",
+        help="Directory containing the data files",
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of runs")
+    parser.add_argument(
+        "-t", "--top", type=int, default=15, help="Number of slowest imports to show"
+    )
+    args = parser.parse_args()
+
+    times = import_times()
+    logger.info("Slowest imports (cumulative):")
+    for cumulative, name in sorted(times, reverse=True)[: args.top]:
+        logger.info(f"{cumulative / 1e6:8.3f} s  {name}")
+
+    logger.info("Dependencies imported with the app (cumulative):")
+    imported = {name.strip(): cumulative for cumulative, name in times}
+    for name in dependencies:
+        if name in imported:
+            logger.info(f"{imported[name] / 1e6:8.3f} s  {name}")
+        else:
+            logger.info(f"{'deferred':>10}  {name}")
+
+    code = first_tweet_code.replace("DATA_DIR", repr(str(args.data_dir.resolve())))
+    for i in range(args.repeat):
+        timings = json.loads(run_app_python(["-c", code]).stdout.splitlines()[-1])
+        logger.info(
+            f"Run {i + 1}: import app {timings['import']:.2f} s,"
+            f" ready {timings['ready']:.2f} s,"
+            f" first tweet {timings['first_tweet']:.2f} s"
+        )
@@ -2,6 +2,9 @@
 Run as a module from the top-level folder like:
 poetry run python -m scripts.check_syllables --text "my text here"
 
+Or check a file with one text per line:
+poetry run python -m scripts.check_syllables --file tests/data_haiku.txt
+
 Some difficult words:
 
 Currently correct:
@@ -27,12 +30,13 @@ import inflect
 from nltk.corpus import cmudict
 
 from haikuincidence.utils.data_utils import (
-    get_emoticons_list,
+    get_emoticon_matcher,
     get_ignore_tweet_list,
     get_syllable_dict,
     get_track_str,
 )
-from haikuincidence.utils.haiku_utils import get_haiku
+from haikuincidence.utils.haiku_utils import get_haiku, get_haikus
+from haikuincidence.utils.lexicon_utils import SyllableLexicon
 from haikuincidence.utils.text_utils import check_text_wrapper, clean_text
 
 logging.basicConfig(format="{asctime} : {levelname} : {message}", style="{")
@@ -44,12 +48,12 @@ data_dir = Path.cwd() / "data"
 track_str = get_track_str(data_dir / "track.txt")
 ignore_tweet_list = get_ignore_tweet_list(data_dir / "ignore_tweet.txt")
 syllable_dict = get_syllable_dict(data_dir / "syllables.json")
-emoticons_list = get_emoticons_list(data_dir / "emoticons.txt")
+emoticons_list = get_emoticon_matcher(data_dir / "emoticons.txt")
 
 # Use inflect to change digits to their English word equivalent
 inflect_p = inflect.engine()
 # Use the CMU dictionary to count syllables
-pronounce_dict = cmudict.dict()
+lexicon = SyllableLexicon.from_dicts(syllable_dict, cmudict.dict())
 
 # guess_syl_method = "min"
 guess_syl_method = "mean"
@@ -61,27 +65,46 @@ if __name__ == "__main__":
     parser.add_argument(
         "-t", "--text", type=str, nargs="?", help="String to process, in quotes"
     )
-    args = parser.parse_args()
-
-    original_text = args.text
-    status = {"text": original_text, "id_str": "0"}
-
-    logger.debug(f"Original text:\n{original_text}")
-
-    cleaned_text = clean_text(original_text)
-    logger.debug(f"Cleaned text:\n{cleaned_text}")
-
-    logger.debug(
-        f"Passes check_text_wrapper: {check_text_wrapper(status, ignore_tweet_list)}"
-    )
-
-    haiku = get_haiku(
-        cleaned_text,
-        inflect_p,
-        pronounce_dict,
-        syllable_dict,
-        emoticons_list,
-        guess_syl_method,
+    parser.add_argument(
+        "-f", "--file", type=Path, nargs="?", help="File with one text per line"
     )
+    args = parser.parse_args()
 
-    logger.debug(f"Resulting haiku:\n{haiku}")
+    if args.file:
+        with open(args.file) as fp:
+            original_texts = fp.read().splitlines()
+
+        haikus = get_haikus(
+            [clean_text(text) for text in original_texts],
+            inflect_p,
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+        )
+
+        for original_text, haiku in zip(original_texts, haikus, strict=True):
+            logger.info(f"{'Haiku' if haiku else 'Not a haiku'}: {original_text}")
+        logger.info(f"Found {sum(1 for haiku in haikus if haiku)} haikus")
+    else:
+        original_text = args.text
+        status = {"text": original_text, "id_str": "0"}
+
+        logger.debug(f"Original text:\n{original_text}")
+
+        cleaned_text = clean_text(original_text)
+        logger.debug(f"Cleaned text:\n{cleaned_text}")
+
+        logger.debug(
+            "Passes check_text_wrapper:"
+            f" {check_text_wrapper(status, ignore_tweet_list)}"
+        )
+
+        haiku = get_haiku(
+            cleaned_text,
+            inflect_p,
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+        )
+
+        logger.debug(f"Resulting haiku:\n{haiku}")
@@ -0,0 +1,73 @@
+"""
+Compile the syllable lexicon into a memory-mappable file, so the app does not need to
+parse the NLTK CMU dictionary and data/syllables.json, or spell out numbers with
+inflect, at startup.
+
+Run as a module from the top-level folder like:
+poetry run python -m scripts.compile_lexicon
+
+Or:
+make compile-lexicon
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+import inflect
+from nltk.corpus import cmudict
+
+from haikuincidence.utils.data_utils import (
+    get_emoticons_list,
+    get_lexicon_source_paths,
+    get_syllable_dict,
+)
+from haikuincidence.utils.haiku_utils import build_number_syllables
+from haikuincidence.utils.lexicon_utils import SyllableLexicon, describe_source_file
+
+logging.basicConfig(format="{asctime} : {levelname} : {message}", style="{")
+logger = logging.getLogger("haiku_logger")
+logger.setLevel(logging.INFO)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the syllable lexicon.")
+    parser.add_argument(
+        "-d",
+        "--data-dir",
+        type=Path,
+        default=Path.cwd() / "data",
+        help="Directory containing syllables.json and emoticons.txt",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=None,
+        help="Where to write the lexicon (default: <data-dir>/lexicon.bin)",
+    )
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    output = args.output or data_dir / "lexicon.bin"
+
+    syllable_filepath = data_dir / "syllables.json"
+    emoticons_filepath = data_dir / "emoticons.txt"
+    # Described before reading, so a file changed meanwhile makes the lexicon stale
+    source_paths = get_lexicon_source_paths(syllable_filepath, emoticons_filepath)
+    source_files = {
+        name: describe_source_file(path) for name, path in source_paths.items()
+    }
+    lexicon = SyllableLexicon.from_dicts(
+        get_syllable_dict(syllable_filepath),
+        cmudict.dict(),
+        get_emoticons_list(emoticons_filepath),
+    )
+    # Syllable counts of numbers and years only depend on the lexicon
+    lexicon.set_numbers(
+        build_number_syllables(inflect.engine(), lexicon, lexicon.emoticons)
+    )
+    lexicon.save(output, source_files=source_files)
+
+    # Make sure the file can be read back
+    SyllableLexicon.load(output, source_paths=source_paths)
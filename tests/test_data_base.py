@@ -0,0 +1,140 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from haikuincidence.utils.data_base import (
+    Base,
+    Haiku,
+    HaikuWriteBuffer,
+    session_factory,
+)
+from haikuincidence.utils.migration_utils import LATEST_VERSION, migrate
+
+from .test_twitter import ranked_status
+
+
+def test_haiku_write_buffer(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'haikus.db'}"
+    db_session = session_factory(database_url)
+    write_buffer = HaikuWriteBuffer(
+        session_factory(database_url), max_rows=100, max_delay_ms=60000, max_pending=10
+    )
+    # the stream waits for room instead of dropping rows
+    for i in range(250):
+        status = ranked_status(str(i))
+        Haiku.add_haiku(
+            db_session, status, status["text"], "a\nhaiku", write_buffer=write_buffer
+        )
+    # closing inserts what is left without waiting for the delay
+    write_buffer.close()
+
+    stats = write_buffer.stats()
+    assert stats["rows"] == 250
+    assert stats["failures"] == 0
+    assert stats["flushes"] < 250
+    assert sorted(int(h.status_id_str) for h in Haiku.get_haikus_all(db_session)) == (
+        list(range(250))
+    )
+
+
+def test_haiku_write_buffer_max_delay(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'haikus.db'}"
+    db_session = session_factory(database_url)
+    write_buffer = HaikuWriteBuffer(
+        session_factory(database_url), max_rows=100, max_delay_ms=10
+    )
+    status = ranked_status("1")
+    Haiku.add_haiku(
+        db_session, status, status["text"], "a\nhaiku", write_buffer=write_buffer
+    )
+
+    # a partial batch is inserted once its first row has waited long enough
+    for _ in range(500):
+        if Haiku.get_haikus_all(db_session):
+            break
+        db_session.rollback()
+        time.sleep(0.01)
+    assert len(Haiku.get_haikus_all(db_session)) == 1
+    write_buffer.close()
+    assert write_buffer.stats()["flushes"] == 1
+
+
+def test_migrations(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'haikus.db'}")
+    # the schema before migrations, with duplicate statuses
+    assert migrate(engine, target_version=1) == 1
+    assert not inspect(engine).get_indexes("haikus")
+    db_session = Session(bind=engine)
+    for status_id_str, posted in [
+        ("1", False),
+        ("1", True),
+        ("2", False),
+        ("2", False),
+    ]:
+        status = ranked_status(status_id_str)
+        haiku = Haiku.add_haiku(db_session, status, status["text"], "a\nhaiku")
+        if posted:
+            haiku.date_posted = haiku.created_at
+            db_session.commit()
+    db_session.close()
+
+    assert migrate(engine) == LATEST_VERSION
+    # migrating again does nothing
+    assert migrate(engine) == LATEST_VERSION
+    assert {index["name"] for index in inspect(engine).get_indexes("haikus")} == {
+        "uq_haikus_status_id_str",
+        "ix_haikus_created_at",
+        "ix_haikus_posted_date_posted",
+        "ix_haikus_unposted_created_at",
+    }
+
+    # of duplicates, the posted one, then the oldest, is kept
+    db_session = Session(bind=engine)
+    haikus = Haiku.get_haikus_all(db_session)
+    assert [(h.id, h.status_id_str, h.date_posted is not None) for h in haikus] == [
+        (2, "1", True),
+        (3, "2", False),
+    ]
+    with pytest.raises(IntegrityError):
+        db_session.execute(Haiku.__table__.insert(), [haikus[1].to_row()])
+
+
+def test_migrations_match_models(tmp_path):
+    # a change to a model needs a migration that makes the same change
+    engine = create_engine(f"sqlite:///{tmp_path / 'haikus.db'}")
+    migrate(engine)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        migrated_columns = {
+            column["name"]: (str(column["type"]), column["nullable"])
+            for column in inspector.get_columns(table.name)
+        }
+        model_columns = {
+            column.name: (
+                str(column.type.compile(dialect=engine.dialect)),
+                column.nullable,
+            )
+            for column in table.columns
+        }
+        assert migrated_columns == model_columns, table.name
+
+
+def test_keep_haikus_n_rows(tmp_path):
+    db_session = session_factory(f"sqlite:///{tmp_path / 'haikus.db'}")
+    for i in range(25):
+        status = ranked_status(str(i))
+        # pairs of haikus created at the same time
+        status["created_at"] = f"Wed Oct 10 20:{i // 2:02d}:00 +0000 2018"
+        Haiku.add_haiku(db_session, status, "", "")
+
+    assert Haiku.keep_haikus_n_rows(db_session, n=None) == 0
+    assert Haiku.keep_haikus_n_rows(db_session, n=30) == 0
+    # deleted in chunks of 4 rows, newest kept, ties broken by id
+    assert Haiku.keep_haikus_n_rows(db_session, n=9, chunk_size=4) == 16
+    assert [h.status_id_str for h in Haiku.get_haikus_all(db_session)] == [
+        str(i) for i in range(16, 25)
+    ]
+    assert Haiku.keep_haikus_n_rows(db_session, n=9, chunk_size=4) == 0
@@ -0,0 +1,137 @@
+from haikuincidence.utils import text_utils
+from haikuincidence.utils.data_utils import get_user_blocklist
+from haikuincidence.utils.filter_utils import FilterPipeline, FilterStage
+from haikuincidence.utils.text_utils import (
+    PreparedTweet,
+    UserBlocklist,
+    check_text_wrapper,
+    check_tweet,
+    get_text_filter,
+    get_tweet_body,
+    get_tweet_filter,
+)
+
+
+def make_status(**kwargs):
+    status = {
+        "id_str": "1",
+        "text": (
+            "an old silent pond / a frog jumps into the pond / splash! silence again"
+        ),
+        "lang": "en",
+        "truncated": False,
+        "entities": {"hashtags": [], "urls": [], "user_mentions": [], "symbols": []},
+        "user": {
+            "screen_name": "basho",
+            "id_str": "1",
+            "friends_count": 100,
+            "followers_count": 1000,
+        },
+    }
+    status.update(kwargs)
+    return status
+
+
+def test_check_tweet():
+    assert check_tweet(make_status())
+    assert not check_tweet(make_status(lang="es"))
+    assert not check_tweet(make_status(retweeted_status={}))
+    assert not check_tweet(make_status(text=""))
+    # deleted tweets have no other fields
+    assert not check_tweet({"delete": {"status": {"id_str": "1"}}})
+    assert not check_tweet(make_status(), ignore_user_screen_names=["BASH"])
+    assert not check_tweet(make_status(), ignore_user_id_str=["1"])
+
+    tweet_filter = get_tweet_filter(ignore_user_screen_names=["spam"])
+    assert check_tweet(make_status(), tweet_filter=tweet_filter)
+    assert not check_tweet(make_status(lang="es"), tweet_filter=tweet_filter)
+    stats = tweet_filter.stats()
+    assert stats["valid_language"]["rejected"] == 1
+    # stopped at the first failure
+    assert stats["valid_screen_name"]["passed"] == 1
+    assert stats["valid_screen_name"]["rejected"] == 0
+
+
+def test_user_blocklist(tmp_path):
+    filepath = tmp_path / "ignore_user.txt"
+    filepath.write_text("id:42\n@Basho\n\nbot\\d+$\n(?i)spam\n")
+    user_blocklist = get_user_blocklist(
+        filepath, id_strs=["7"], screen_name_patterns=["news"]
+    )
+    assert len(user_blocklist) == 6
+    assert user_blocklist.blocks_id_str("42")
+    assert user_blocklist.blocks_id_str("7")
+    assert not user_blocklist.blocks_id_str("1")
+    # exact screen names ignore case, but do not match a longer name
+    assert user_blocklist.blocks_screen_name("BASHO")
+    assert not user_blocklist.blocks_screen_name("basho_fan")
+    # patterns are searched for anywhere in the screen name, ignoring case
+    for screen_name in ["TheNewsDesk", "haiku_BOT99", "SpamSpam"]:
+        assert user_blocklist.blocks_screen_name(screen_name), screen_name
+    assert not user_blocklist.blocks_screen_name("bot99_haiku")
+
+    tweet_filter = get_tweet_filter(user_blocklist=user_blocklist)
+    assert not check_tweet(make_status(), tweet_filter=tweet_filter)
+    assert check_tweet(make_status(), user_blocklist=UserBlocklist())
+    # an invalid pattern is skipped instead of failing every tweet
+    assert not UserBlocklist(screen_name_patterns=["(unclosed"]).blocks_screen_name(
+        "(unclosed"
+    )
+
+
+def test_check_text_wrapper():
+    text_filter = get_text_filter(["frog"])
+    assert not check_text_wrapper(make_status(), text_filter=text_filter)
+    assert not check_text_wrapper(make_status(text="too short"), ["frog"])
+    assert not check_text_wrapper(make_status(text="SHOUTING IS NOT A HAIKU"), [])
+    assert check_text_wrapper(make_status(), [])
+    assert text_filter.stats()["valid_contains_ignore_words"]["rejected"] == 1
+
+
+def test_prepared_tweet(monkeypatch):
+    cleaned = []
+    clean_text = text_utils.clean_text
+    monkeypatch.setattr(
+        text_utils, "clean_text", lambda text: cleaned.append(text) or clean_text(text)
+    )
+
+    status = make_status(text="An old silent pond…  a frog jumps into the pond")
+    tweet = PreparedTweet(status)
+    assert check_tweet(tweet)
+    assert check_text_wrapper(tweet, [])
+    assert get_tweet_body(tweet) == status["text"]
+    assert tweet.tokens == tweet.text.split()
+    assert tweet.text == clean_text(status["text"])
+    # the text was cleaned once
+    assert cleaned == [status["text"]]
+
+
+def test_filter_pipeline_reorder():
+    calls = []
+
+    def stage(name, passes):
+        def check(item):
+            calls.append(name)
+            return passes(item)
+
+        return FilterStage(name, check)
+
+    pipeline = FilterPipeline(
+        [
+            FilterStage("fixed", lambda item: True, reorderable=False),
+            stage("rarely_rejects", lambda item: item % 10 != 0),
+            stage("often_rejects", lambda item: item % 2 == 0),
+        ],
+        reorder_every=20,
+    )
+    for item in range(20):
+        pipeline.first_failure(item)
+    assert [stage.name for stage in pipeline.stages] == [
+        "fixed",
+        "often_rejects",
+        "rarely_rejects",
+    ]
+
+    calls.clear()
+    assert pipeline.first_failure(21) == "often_rejects"
+    assert calls == ["often_rejects"]
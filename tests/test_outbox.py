@@ -0,0 +1,150 @@
+import importlib
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+from haikuincidence.utils.data_base import OutboxAction, session_factory
+from haikuincidence.utils.outbox_utils import OutboxWorker
+
+from .test_twitter import ranked_status
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """The app module, imported the way it runs: from its own folder"""
+    monkeypatch.setenv("ENVIRONMENT", "production")
+    monkeypatch.syspath_prepend(
+        str(Path(__file__).resolve().parent.parent / "haikuincidence")
+    )
+    return importlib.import_module("app")
+
+
+class FakeTwitter:
+    """Refuses to post the first few times, like MyTwitterClient within its post
+    limit, and answers status lookups from statuses it was given
+    """
+
+    def __init__(self, refusals: int = 0, statuses: list[dict] = None):
+        self.refusals = refusals
+        self.statuses = {status["id_str"]: status for status in statuses or []}
+        self.posts = []
+
+    def _update_status(self, **kwargs):
+        if self.refusals > 0:
+            self.refusals -= 1
+            return False
+        self.posts.append(kwargs["status"])
+        return True
+
+    def seconds_until_can_post(self, current_time) -> float:
+        return 0
+
+    def lookup_status(self, id: str, **kwargs):
+        return [self.statuses[x] for x in id.split(",") if x in self.statuses]
+
+
+def test_outbox_worker(tmp_path):
+    db_session = session_factory(f"sqlite:///{tmp_path / 'outbox.db'}")
+    done = []
+    failures = {"flaky": 1, "broken": 5}
+
+    def handler(db_session, payload):
+        name = payload["name"]
+        if failures.get(name, 0) > 0:
+            failures[name] -= 1
+            raise RuntimeError(f"{name} failed")
+        done.append(name)
+
+    for name in ["ok", "flaky", "broken"]:
+        assert OutboxAction.add_action(
+            db_session, "post", f"post:{name}", {"name": name}
+        )
+    # adding the same action again is a no-op
+    assert not OutboxAction.add_action(db_session, "post", "post:ok", {"name": "ok"})
+    assert OutboxAction.add_action(db_session, "unknown", "unknown:1", {})
+    assert OutboxAction.count_actions_pending(db_session, action="post") == 3
+
+    worker = OutboxWorker(
+        db_session, handlers={"post": handler}, max_attempts=3, retry_wait_seconds=0
+    )
+    while worker.run_once():
+        pass
+
+    assert done == ["ok", "flaky"]
+    assert worker.stats() == {"done": 2, "retried": 3, "failed": 2}
+    assert OutboxAction.count_actions_pending(db_session) == 0
+    broken = (
+        db_session.query(OutboxAction)
+        .filter(OutboxAction.action_key == "post:broken")
+        .one()
+    )
+    assert broken.attempts == 3
+    assert broken.date_failed is not None
+    assert broken.last_error == "broken failed"
+
+
+def test_post_haiku_action_retries_refused_post(tmp_path, app):
+    db_session = app.session_factory(f"sqlite:///{tmp_path / 'outbox.db'}")
+    status = ranked_status("1")
+    app.Haiku.add_haiku(db_session, status, status["text"], "a\nhaiku")
+    app.OutboxAction.add_action(
+        db_session,
+        "post",
+        "post:1",
+        {
+            "status_id_str": "1",
+            "user_screen_name": "basho",
+            "status": "a\nhaiku\n\nA haiku by @basho",
+            "attachment_url": "https://twitter.com/basho/status/1",
+        },
+    )
+
+    # the first attempt is refused, so the haiku is not marked posted until the next
+    twitter = FakeTwitter(refusals=1)
+    worker = app.OutboxWorker(
+        db_session,
+        handlers={"post": partial(app.post_haiku_action, twitter)},
+        retry_wait_seconds=0,
+    )
+    assert worker.run_once() == 1
+    assert not app.Haiku.is_haiku_posted(db_session, "1")
+    while worker.run_once():
+        pass
+
+    assert twitter.posts == ["a\nhaiku\n\nA haiku by @basho"]
+    assert worker.stats() == {"done": 1, "retried": 1, "failed": 0}
+    assert app.Haiku.is_haiku_posted(db_session, "1")
+
+
+def test_scheduler_skips_haiku_whose_post_failed(tmp_path, app, monkeypatch):
+    monkeypatch.setattr(app, "LOG_HAIKU", True)
+    monkeypatch.setattr(app, "POST_HAIKU", True)
+    monkeypatch.setattr(app, "EVERY_N_SECONDS", 3600)
+    db_session = app.session_factory(f"sqlite:///{tmp_path / 'outbox.db'}")
+    statuses = [ranked_status("1", favorite_count=5), ranked_status("2")]
+    for status in statuses:
+        status["created_at"] = datetime.now(tz=timezone.utc).strftime(
+            "%a %b %d %H:%M:%S +0000 %Y"
+        )
+        app.Haiku.add_haiku(db_session, status, status["text"], "a\nhaiku")
+
+    # the best haiku's post fails for good
+    twitter = FakeTwitter(refusals=1, statuses=statuses)
+    worker = app.OutboxWorker(
+        db_session,
+        handlers={"post": partial(app.post_haiku_action, twitter)},
+        max_attempts=1,
+    )
+    scheduler = app.HaikuScheduler(twitter, db_session, outbox_worker=worker)
+    scheduler.run_once()
+    assert worker.run_once() == 1
+    assert worker.stats()["failed"] == 1
+
+    # so the next best one is queued and posted instead
+    scheduler.run_once()
+    assert app.OutboxAction.count_actions_pending(db_session, action="post") == 1
+    assert worker.run_once() == 1
+    assert app.Haiku.is_haiku_posted(db_session, "2")
+    assert not app.Haiku.is_haiku_posted(db_session, "1")
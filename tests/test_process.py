@@ -1,4 +1,37 @@
-from haikuincidence.utils.text_utils import clean_text
+import re
+import unicodedata
+from pathlib import Path
+
+from haikuincidence.utils.text_utils import clean_text, clean_token
+
+
+def clean_token_reference(token: str, unicode_normalize_form: str = "NFKC") -> str:
+    """clean_token as a sequence of passes, one per rule"""
+    if token is None:
+        return token
+
+    token = unicodedata.normalize(unicode_normalize_form, token)
+    token = re.sub(r"(?<=[;!?])(?=[\w])", r" ", token)
+    token = re.sub(r"(?<=[.,])(?=[A-Za-z])", r" ", token)
+    token = re.sub(r"(\w)\s(['])[?=\s\w]", r"\1\2", token)
+    token = re.sub(r"([\w])([#@&%=+/×\-](?=[\w]))", r"\1 \2 ", token)  # noqa: RUF001
+    token = re.sub(r"([\w])[\*]((?=[\w]))", r"\1u\2", token)
+    token = re.sub(r"([#@&=+/×])((?=[\w]))", r"\1 \2", token)  # noqa: RUF001
+    token = re.sub(r"([\w])([#@&%=+/×])", r"\1 \2", token)  # noqa: RUF001
+    token = re.sub(r"\bb / c\b", "because", token, flags=re.IGNORECASE)
+    token = re.sub(r"\bb / t\b", "between", token, flags=re.IGNORECASE)
+    token = re.sub(r"\bw / o\b", "without", token, flags=re.IGNORECASE)
+    token = re.sub(r"\bw /\s\b", "with ", token, flags=re.IGNORECASE)
+    token = re.sub(r"\bw /\b", "with", token, flags=re.IGNORECASE)
+    token = re.sub(r"\ba\b\*", "a star", token, flags=re.IGNORECASE)
+    token = token.replace("@", "at")
+    token = token.replace("#", "number")
+    token = token.replace("&", "and")
+    token = token.replace("%", "percent")
+    token = token.replace("=", "equals")
+    token = token.replace("×", "times")  # noqa: RUF001
+    token = token.replace("+", "plus")
+    return re.sub(r"[^\w',\.]", " ", token).strip()
 
 
 def test_text_process():
@@ -9,3 +42,19 @@ def test_text_process():
         original, expected = text.split(",")
         text_cleaned = clean_text(original)
         assert text_cleaned == expected, f"{original} did not turn into {expected}"
+
+
+def test_clean_token_matches_reference():
+    texts = [
+        "b/c w/o w/ w/the B/T a* f*ck s**t x\u00d7y 2+2=4 100% @poet #1 &amp; cat,dog",
+        "good.What hello ,how are you ? doing don 't it' s e-mail ﬁne ½ ①",
+        "",
+    ]
+    for filepath in sorted(Path("tests").glob("data_*.txt")):
+        with open(filepath) as fp:
+            texts.extend(fp.read().splitlines())
+
+    for text in texts:
+        # whole texts, as in check_profile, and tokens, as in count_syllables
+        for token in [text, clean_text(text), *text.split(), *clean_text(text).split()]:
+            assert clean_token(token) == clean_token_reference(token), repr(token)
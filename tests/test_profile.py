@@ -1,7 +1,16 @@
+import os
+import subprocess
+import sys
 from pathlib import Path
 
+from haikuincidence.utils.cache_utils import ProfileVerdictCache
 from haikuincidence.utils.data_utils import get_ignore_profile_list
-from haikuincidence.utils.text_utils import check_profile
+from haikuincidence.utils.text_utils import (
+    IgnoreListMatcher,
+    check_profile,
+    text_contains_ignore_list,
+    text_contains_ignore_list_plural,
+)
 
 data_dir = Path.cwd() / "data"
 
@@ -40,3 +49,74 @@ def test_profile_fail():
         assert (
             not profile_passes
         ), f"Should have failed: {status['user']['description']}"
+
+
+def test_ignore_list_matcher():
+    ignore_list = IgnoreListMatcher(["god dog", "cat"])
+
+    # all tokens of a line, with plural forms and repeated last letters
+    assert text_contains_ignore_list_plural("dogs are gods", ignore_list)
+    assert text_contains_ignore_list_plural("GOD loves a doggg", ignore_list)
+    assert text_contains_ignore_list_plural("the catz", ignore_list)
+    assert not text_contains_ignore_list_plural("doggies are godly", ignore_list)
+    assert not text_contains_ignore_list_plural("a dog", ignore_list)
+    assert not text_contains_ignore_list("dogs are gods", ignore_list)
+
+    # substring mode
+    assert text_contains_ignore_list_plural("doggies are godly", ignore_list, True)
+    assert text_contains_ignore_list("concatenate", ignore_list, True)
+    assert not text_contains_ignore_list("a dog", ignore_list, True)
+
+    # plain lists still work
+    assert text_contains_ignore_list_plural("dogs are gods", ["god dog"])
+
+
+def test_profile_verdict_cache(tmp_path):
+    filepath = tmp_path / "profile_cache.json"
+    profile_cache = ProfileVerdictCache(filepath=filepath, fingerprint="a")
+    status = {"user": {"id_str": "1", "description": "poet"}}
+
+    assert profile_cache.get_verdict(status) is None
+    profile_cache.put_verdict(status, True)
+    assert profile_cache.get_verdict(status) is True
+    # a changed description is checked again
+    changed = {"user": {"id_str": "1", "description": "bot"}}
+    assert profile_cache.get_verdict(changed) is None
+    profile_cache.put_verdict(changed, False)
+    assert profile_cache.get_verdict(changed) is False
+    assert profile_cache.stats()["hits"] == 2
+    assert profile_cache.stats()["misses"] == 2
+
+    # verdicts survive a restart, unless the settings changed
+    profile_cache.save()
+    assert ProfileVerdictCache(filepath=filepath, fingerprint="a").get_verdict(status)
+    assert len(ProfileVerdictCache(filepath=filepath, fingerprint="b")) == 0
+
+    # expired verdicts are checked again
+    expired_cache = ProfileVerdictCache(ttl=0)
+    expired_cache.put_verdict(status, True)
+    assert expired_cache.get_verdict(status) is None
+    assert expired_cache.stats()["expirations"] == 1
+
+
+def test_profile_check_fingerprint():
+    # the same settings give the same fingerprint in a new process, so saved verdicts
+    # are loaded after a restart
+    code = (
+        "import sys; sys.path.insert(0, 'haikuincidence'); import app;"
+        " print(app.profile_check_fingerprint("
+        "app.get_ignore_profile_list(app.Path('data/ignore_profile.txt'))))"
+    )
+    fingerprints = {
+        subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).resolve().parent.parent,
+            env={**os.environ, "ENVIRONMENT": "production", "PYTHONHASHSEED": seed},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for seed in ["1", "2", "3"]
+    }
+    assert len(fingerprints) == 1
+    assert len(fingerprints.pop().strip()) == 64
@@ -0,0 +1,135 @@
+import contextlib
+import json
+import os
+import signal
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from haikuincidence.utils.data_base import Haiku, session_factory
+
+root_dir = Path(__file__).resolve().parent.parent
+
+# Runs the app in a fresh interpreter, streaming the haikus in data_haiku.txt, then
+# waiting for more tweets like a quiet stream, until it is signaled. Every other tweet
+# is truncated, and analysis workers are slow, so tweets are still being handled.
+stream_app_code = """
+import sys
+import time
+
+sys.path.insert(0, "haikuincidence")
+import app
+
+texts = open("tests/data_haiku.txt").read().splitlines()
+
+
+def make_status(i, text):
+    return {
+        "id": i,
+        "id_str": str(i),
+        "text": text,
+        "lang": "en",
+        "truncated": False,
+        "created_at": "Wed Oct 10 20:19:24 +0000 2018",
+        "entities": {"hashtags": [], "urls": [], "user_mentions": [], "symbols": []},
+        "user": {
+            "screen_name": f"poet{i}",
+            "id_str": str(i),
+            "friends_count": 100,
+            "followers_count": 1000,
+            "description": "",
+            "verified": False,
+        },
+    }
+
+
+def lookup_statuses(twitter, id_strs):
+    return [dict(make_status(int(x), ""), full_text=texts[int(x)]) for x in id_strs]
+
+
+def analyze_in_worker(status):
+    time.sleep(0.2)
+    return app._worker_analyzer.analyze(status)
+
+
+def stream(self, url, method="GET", params=None):
+    self.connected = True
+    for i, text in enumerate(texts):
+        if i % 2:
+            self.on_success(dict(make_status(i, "..."), truncated=True))
+        else:
+            self.on_success(make_status(i, text))
+    print("streamed", flush=True)
+    while self.connected:
+        time.sleep(0.1)
+
+
+app.lookup_statuses = lookup_statuses
+app.analyze_in_worker = analyze_in_worker
+app.MyStreamer._request = stream
+app.main()
+"""
+
+
+def run_app_until_signaled(tmp_path, signum: int, **env) -> tuple[int, str]:
+    """Run the app until it has streamed the haikus, signal it, and return its exit
+    code and log
+    """
+    log_path = tmp_path / "app.log"
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-c", stream_app_code],
+            cwd=root_dir,
+            env={
+                **os.environ,
+                "ENVIRONMENT": "production",
+                "DEBUG_MODE": "false",
+                "DATABASE_URL": f"sqlite:///{tmp_path / 'haikus.db'}",
+                "EVERY_N_SECONDS": "3600",
+                **env,
+            },
+            stdout=subprocess.PIPE,
+            stderr=log,
+            text=True,
+            # Its own process group, signaled as a whole like Ctrl-C or a dyno restart
+            start_new_session=True,
+        )
+        try:
+            assert process.stdout.readline() == "streamed\n", log_path.read_text()
+            os.killpg(process.pid, signum)
+            process.wait(timeout=60)
+        finally:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(process.pid, signal.SIGKILL)
+            process.stdout.close()
+    return process.returncode, log_path.read_text()
+
+
+@pytest.mark.parametrize("signum", [signal.SIGTERM, signal.SIGINT])
+@pytest.mark.parametrize("analysis_workers", [0, 2])
+def test_shutdown_finishes_accepted_tweets(tmp_path, signum, analysis_workers):
+    # full texts, and rows to insert, would wait for a minute
+    returncode, log = run_app_until_signaled(
+        tmp_path,
+        signum,
+        ANALYSIS_WORKERS=str(analysis_workers),
+        HYDRATE_MAX_DELAY_SECONDS="60",
+        HAIKU_WRITE_MAX_DELAY_MS="60000",
+        PROFILE_CACHE_PATH=str(tmp_path / "profile_cache.json"),
+    )
+    assert returncode == 0, log
+    assert "Stopped streaming" in log
+    if analysis_workers:
+        assert f"Analysis workers ready: {analysis_workers}" in log
+
+    # every haiku was analyzed and committed, including the truncated ones
+    n_haikus = len((root_dir / "tests" / "data_haiku.txt").read_text().splitlines())
+    db_session = session_factory(f"sqlite:///{tmp_path / 'haikus.db'}")
+    assert len(Haiku.get_haikus_all(db_session)) == n_haikus
+
+    # profile verdicts are saved by the analyzer, when there are no workers
+    if analysis_workers == 0:
+        profile_cache = json.loads((tmp_path / "profile_cache.json").read_text())
+        assert len(profile_cache["verdicts"]) == n_haikus
@@ -1,29 +1,51 @@
+import os
 from pathlib import Path
 
 import inflect
+import pytest
 from nltk.corpus import cmudict
 
+from haikuincidence.utils.cache_utils import SyllableCache
 from haikuincidence.utils.data_utils import (
-    get_emoticons_list,
+    get_emoticon_matcher,
     get_ignore_tweet_list,
+    get_lexicon_source_paths,
     get_syllable_dict,
+    get_syllable_lexicon,
     get_track_str,
 )
-from haikuincidence.utils.haiku_utils import count_syllables, get_haiku
-from haikuincidence.utils.text_utils import clean_text
+from haikuincidence.utils.haiku_utils import (
+    arrange_haiku,
+    build_number_syllables,
+    count_syllables,
+    get_haiku,
+    get_haikus,
+    get_lexicon_version,
+    guess_syllables,
+    guess_syllables_batch,
+    might_be_haiku,
+    syllable_bounds,
+)
+from haikuincidence.utils.lexicon_utils import (
+    LexiconFileError,
+    StaleLexiconError,
+    SyllableLexicon,
+    describe_source_file,
+)
+from haikuincidence.utils.text_utils import clean_text, get_emoji_index
 
 # get data to use for dealing with tweets
 data_dir = Path.cwd() / "data"
 track_str = get_track_str(data_dir / "track.txt")
 ignore_tweet_list = get_ignore_tweet_list(data_dir / "ignore_tweet.txt")
 syllable_dict = get_syllable_dict(data_dir / "syllables.json")
-emoticons_list = get_emoticons_list(data_dir / "emoticons.txt")
+emoticons_list = get_emoticon_matcher(data_dir / "emoticons.txt")
 
 
 # Use inflect to change digits to their English word equivalent
 inflect_p = inflect.engine()
 # Use the CMU dictionary to count syllables
-pronounce_dict = cmudict.dict()
+lexicon = SyllableLexicon.from_dicts(syllable_dict, cmudict.dict())
 
 # guess_syl_method = "min"
 guess_syl_method = "mean"
@@ -34,15 +56,12 @@ def get_syllable_count_and_haiku(text):
     count = count_syllables(
         text,
         inflect_p,
-        pronounce_dict,
-        syllable_dict,
+        lexicon,
         emoticons_list,
         guess_syl_method,
     )
 
-    haiku = get_haiku(
-        text, inflect_p, pronounce_dict, syllable_dict, emoticons_list, guess_syl_method
-    )
+    haiku = get_haiku(text, inflect_p, lexicon, emoticons_list, guess_syl_method)
 
     return count, haiku
 
@@ -59,6 +78,20 @@ def test_haikus():
         assert haiku != "", f"Not a haiku: {text_cleaned}"
 
 
+def test_get_haikus():
+    texts = []
+    for filename in ["tests/data_haiku.txt", "tests/data_not_haiku.txt"]:
+        with open(filename) as fp:
+            texts.extend(clean_text(text) for text in fp.read().splitlines())
+
+    haikus = get_haikus(texts, inflect_p, lexicon, emoticons_list, guess_syl_method)
+    assert haikus == [
+        get_haiku(text, inflect_p, lexicon, emoticons_list, guess_syl_method)
+        for text in texts
+    ]
+    assert get_haikus([], inflect_p, lexicon, emoticons_list, guess_syl_method) == []
+
+
 def test_not_haikus():
     with open("tests/data_not_haiku.txt") as fp:
         inputs = fp.read().splitlines()
@@ -71,3 +104,303 @@ def test_not_haikus():
         assert (
             haiku == ""
         ), f"Syllable count: {count}, not supposed to be a haiku: {text_cleaned}"
+
+
+def test_syllable_cache():
+    syllable_cache = SyllableCache(maxsize=2)
+    tokens = ["haiku", "coincidence", "haiku", "poet"]
+
+    for token in tokens:
+        count = count_syllables(
+            token,
+            inflect_p,
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+            syllable_cache,
+        )
+        expected = count_syllables(
+            token,
+            inflect_p,
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+        )
+        assert count == expected, f"Cached count differs for {token}"
+
+    stats = syllable_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["evictions"] == 1
+    assert len(syllable_cache) == 2
+
+    # a different lexicon clears the cache
+    count_syllables(
+        "haiku",
+        inflect_p,
+        SyllableLexicon(),
+        emoticons_list,
+        guess_syl_method,
+        syllable_cache,
+    )
+    assert len(syllable_cache) == 1
+
+
+def test_syllable_cache_bounds():
+    syllable_cache = SyllableCache()
+    lexicon_version = get_lexicon_version(lexicon, emoticons_list)
+    syllable_cache.put_syllable_bounds(
+        "haiku", guess_syl_method, lexicon_version, (2, 3)
+    )
+
+    # only bounds is a miss when looking for a count
+    assert (
+        syllable_cache.get_syllables("haiku", guess_syl_method, lexicon_version) is None
+    )
+    assert syllable_cache.stats()["hits"] == 0
+    assert syllable_cache.stats()["misses"] == 1
+
+    assert syllable_cache.get_syllables_or_bounds(
+        "haiku", guess_syl_method, lexicon_version
+    ) == (2, 3)
+    syllable_cache.put_syllables("haiku", guess_syl_method, lexicon_version, 2)
+    assert syllable_cache.get_syllables("haiku", guess_syl_method, lexicon_version) == 2
+    assert syllable_cache.stats()["hits"] == 2
+    assert syllable_cache.stats()["misses"] == 1
+
+
+def test_lexicon():
+    # exact, repeated last letter, and singular lookups
+    assert lexicon.lookup("haiku") == (2, "CMU dictionary")
+    assert lexicon.lookup("haikuuuu")[0] == 2
+    assert lexicon.lookup("haikuz", "haikuz")[0] == 2
+    assert lexicon.lookup("haikuz", "HAIKUZ") is None
+    assert lexicon.lookup("notawordatall") is None
+
+    # custom counts take precedence, and updating bumps the version
+    custom_lexicon = SyllableLexicon.from_dicts(
+        {}, {"haiku": [["HH", "AY1", "K", "UW0"]]}
+    )
+    version = custom_lexicon.version
+    custom_lexicon.update({"haiku": {"syllables": 3}})
+    assert custom_lexicon.lookup("haiku") == (3, "Syllable dictionary")
+    assert custom_lexicon.syllable_range("haiku") == (3, 3)
+    assert custom_lexicon.version != version
+
+
+def test_compiled_lexicon(tmp_path):
+    filepath = tmp_path / "lexicon.bin"
+    lexicon.save(filepath)
+    mapped_lexicon = SyllableLexicon.load(filepath)
+
+    assert len(mapped_lexicon) == len(lexicon)
+    assert mapped_lexicon.version != lexicon.version
+    for word in ["haiku", "haikuuuu", "lol", "f@ck", "w/e", "notawordatall"]:
+        assert mapped_lexicon.lookup(word) == lexicon.lookup(word), word
+        assert mapped_lexicon.syllable_range(word) == lexicon.syllable_range(word)
+
+    # a corrupted file is rejected
+    data = bytearray(filepath.read_bytes())
+    data[-1] ^= 0xFF
+    filepath.write_bytes(bytes(data))
+    with pytest.raises(LexiconFileError):
+        SyllableLexicon.load(filepath)
+
+
+def test_stale_compiled_lexicon(tmp_path):
+    syllable_filepath = tmp_path / "syllables.json"
+    syllable_filepath.write_text('{"haiku": {"syllables": 2}}')
+    emoticons_filepath = tmp_path / "emoticons.txt"
+    emoticons_filepath.write_text(":)")
+    filepath = tmp_path / "lexicon.bin"
+    source_paths = get_lexicon_source_paths(syllable_filepath, emoticons_filepath)
+    SyllableLexicon.from_dicts({"haiku": {"syllables": 2}}).save(
+        filepath,
+        source_files={
+            name: describe_source_file(path) for name, path in source_paths.items()
+        },
+    )
+    assert SyllableLexicon.load(filepath, source_paths=source_paths)
+
+    # a source file that was only touched still has the same contents
+    os.utime(syllable_filepath, ns=(0, 10**18))
+    assert SyllableLexicon.load(filepath, source_paths=source_paths)
+
+    # an edit to a source file after compiling is not hidden by the compiled lexicon,
+    # even one that keeps its size
+    syllable_filepath.write_text('{"haiku": {"syllables": 3}}')
+    with pytest.raises(StaleLexiconError, match="syllables source"):
+        SyllableLexicon.load(filepath, source_paths=source_paths)
+    stale_lexicon = get_syllable_lexicon(
+        filepath,
+        syllable_filepath=syllable_filepath,
+        emoticons_filepath=emoticons_filepath,
+    )
+    assert stale_lexicon.get_custom("haiku") == 3
+
+
+def test_guess_syllables():
+    # word: (min, mean, max)
+    expected = {
+        "haiku": (2, 2, 3),
+        "queue": (1, 1, 2),
+        "ayyyy": (3, 3, 4),
+        "bible": (2, 2, 3),
+        "decided": (3, 3, 3),
+        "phobia": (2, 3, 4),
+        "axe's": (2, 2, 2),
+        "journey": (2, 2, 3),
+        "hmmm": (1, 1, 1),
+        "''": (0, 0, 0),
+    }
+    for i, method in enumerate(["min", "mean", "max"]):
+        for word, syllables in expected.items():
+            assert guess_syllables(word, method) == syllables[i], f"{word} {method}"
+        assert guess_syllables_batch(list(expected), method) == [
+            syllables[i] for syllables in expected.values()
+        ]
+
+
+def test_number_syllables():
+    numbers = build_number_syllables(
+        inflect_p, lexicon, emoticons_list, guess_syl_method, max_digits=2
+    )
+    assert len(numbers) == 110
+    assert numbers["7"] == 2
+    assert numbers["07"] == 3
+
+    number_lexicon = SyllableLexicon.from_dicts(syllable_dict, cmudict.dict())
+    number_lexicon.set_numbers(numbers)
+    for token in ["7", "07", "77", "3.5", "1,000", "2023"]:
+        assert count_syllables(
+            token, inflect_p, number_lexicon, emoticons_list, guess_syl_method
+        ) == count_syllables(
+            token, inflect_p, lexicon, emoticons_list, guess_syl_method
+        ), token
+
+
+def test_arrange_haiku():
+    tokens = ["a", "b", "!", "c", "d", "...", "e"]
+    # punctuation with no syllables stays at the end of the previous line,
+    # other tokens with no syllables start the next line
+    assert arrange_haiku(tokens, [5, 0, 0, 7, 5, 0, 0]) == "a\nb ! c\nd ... e"
+    assert arrange_haiku(tokens, [4, 1, 0, 7, 5, 0, 0]) == "a b !\nc\nd ... e"
+    # syllables after the last line, or an overshoot, is not a haiku
+    assert arrange_haiku(tokens, [5, 0, 0, 7, 5, 0, 1]) == ""
+    assert arrange_haiku(tokens, [6, 0, 0, 6, 5, 0, 0]) == ""
+
+    # no syllables are needed past an overshoot
+    def syllables():
+        yield 6
+        raise AssertionError("counted past an overshoot")
+
+    assert arrange_haiku(tokens, syllables()) == ""
+
+
+def test_syllable_bounds():
+    tokens = ["haiku", "Haikus!", "don't", "xD", "NASA", "flurbo", "b/c", "==", "42"]
+    for token in tokens:
+        min_syl, max_syl = syllable_bounds(token, lexicon, emoticons_list)
+        for method in ["min", "mean", "max"]:
+            count = count_syllables(token, inflect_p, lexicon, emoticons_list, method)
+            assert min_syl <= count <= max_syl, f"{token} {method}"
+
+    with open("tests/data_haiku.txt") as fp:
+        haikus = fp.read().splitlines()
+    with open("tests/data_not_haiku.txt") as fp:
+        not_haikus = fp.read().splitlines()
+    for text in haikus:
+        assert might_be_haiku(clean_text(text), lexicon, emoticons_list), text
+
+    syllable_cache = SyllableCache()
+    rejected = [
+        text
+        for text in not_haikus
+        if not might_be_haiku(
+            clean_text(text),
+            lexicon,
+            emoticons_list,
+            guess_syl_method,
+            syllable_cache,
+        )
+    ]
+    assert rejected
+    # counts seeded into the cache match the real counts
+    for text in not_haikus:
+        for token in clean_text(text).split():
+            count = syllable_cache.get_syllables(
+                token, guess_syl_method, get_lexicon_version(lexicon, emoticons_list)
+            )
+            assert count is None or count == count_syllables(
+                token, inflect_p, lexicon, emoticons_list, guess_syl_method
+            ), token
+
+
+def test_get_haiku_prefilter():
+    with open("tests/data_haiku.txt") as fp:
+        texts = fp.read().splitlines()
+    with open("tests/data_not_haiku.txt") as fp:
+        texts += fp.read().splitlines()
+    texts = [clean_text(text) for text in texts]
+    expected = [
+        get_haiku(text, inflect_p, lexicon, emoticons_list, guess_syl_method)
+        for text in texts
+    ]
+
+    syllable_cache = SyllableCache()
+    for _ in range(2):
+        lookups = syllable_cache.hits + syllable_cache.misses
+        haikus = [
+            get_haiku(
+                text,
+                inflect_p,
+                lexicon,
+                emoticons_list,
+                guess_syl_method,
+                syllable_cache,
+                prefilter=True,
+            )
+            for text in texts
+        ]
+        assert haikus == expected
+    # once warm, the prefilter's counts are reused: one lookup per token at most
+    n_tokens = sum(len(text.split()) for text in texts)
+    assert syllable_cache.hits + syllable_cache.misses - lookups <= n_tokens
+
+
+def test_emoticon_matcher():
+    assert ":D" in emoticons_list
+    assert "great" not in emoticons_list
+    assert emoticons_list.covers("<3<3<3")
+    assert emoticons_list.covers(":D:-P")
+    assert not emoticons_list.covers("xDNA")
+    assert not emoticons_list.covers("")
+    assert [emoticon for _, _, emoticon in emoticons_list.find_all("great<3")] == ["<3"]
+
+    for token in [":D", "<3<3<3", "xDxD"]:
+        assert (
+            count_syllables(token, inflect_p, lexicon, emoticons_list, guess_syl_method)
+            == 0
+        ), token
+
+
+def test_emoji_index():
+    emoji_index = get_emoji_index()
+    text = "a 👍🏽 frog💇🏽‍♀️ 1️⃣ pond"
+    assert [text[start:end] for start, end in emoji_index.spans(text)] == [
+        "👍🏽",
+        "💇🏽‍♀️",
+        "1️⃣",
+    ]
+    assert "😂" in emoji_index
+    assert "😂!" not in emoji_index
+
+    # emoji are silent, except ones read as letters or digits
+    for token in ["😂", "👍🏽👍🏽", "👞", "🇨🇼", "🇧🇱"]:
+        assert emoji_index.is_silent(token), token
+        assert (
+            count_syllables(token, inflect_p, lexicon, emoticons_list, guess_syl_method)
+            == 0
+        ), token
+    for token in ["1️⃣", "™", "😂lol", "lol"]:
+        assert not emoji_index.is_silent(token), token
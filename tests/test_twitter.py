@@ -0,0 +1,133 @@
+import threading
+
+from haikuincidence.utils.cache_utils import StatusCache
+from haikuincidence.utils.data_base import Haiku, session_factory
+from haikuincidence.utils.haiku_utils import get_best_haiku
+from haikuincidence.utils.twitter_utils import (
+    StatusHydrator,
+    StatusLookup,
+    lookup_statuses,
+)
+
+from .test_filter import make_status
+
+
+class FakeTwitter:
+    """Answers status lookups like the Twitter API, from statuses it was given"""
+
+    def __init__(self, statuses: list[dict] = None):
+        self.statuses = {status["id_str"]: status for status in statuses or []}
+        self.lookups = []
+
+    def lookup_status(self, id: str, **kwargs):
+        id_strs = id.split(",")
+        assert len(id_strs) <= 100, "Too many ids for one request"
+        self.lookups.append(id_strs)
+        return [self.statuses[x] for x in id_strs if x in self.statuses]
+
+
+def truncated_status(id_str: str) -> dict:
+    return make_status(id=int(id_str), id_str=id_str, truncated=True)
+
+
+def test_status_hydrator():
+    # the full text of every third status is missing, e.g., it was deleted
+    twitter = FakeTwitter(
+        [make_status(id_str=str(i), full_text=f"full {i}") for i in range(250) if i % 3]
+    )
+    handled = []
+    hydrator = StatusHydrator(
+        lookup=lambda id_strs: lookup_statuses(twitter, id_strs),
+        on_hydrated=handled.append,
+        max_delay_seconds=60,
+    )
+    for i in range(250):
+        hydrator.submit(truncated_status(str(i)))
+    # closing looks up what is left without waiting for the delay
+    hydrator.close()
+
+    assert [len(id_strs) for id_strs in twitter.lookups] == [100, 100, 50]
+    assert [status["id_str"] for status in handled] == [str(i) for i in range(250)]
+    for i, status in enumerate(handled):
+        if i % 3:
+            assert status["full_text"] == f"full {i}"
+        else:
+            assert status["truncated"]
+    assert hydrator.stats() == {"batches": 3, "hydrated": 166, "missing": 84}
+
+
+def test_status_hydrator_max_delay():
+    twitter = FakeTwitter([make_status(id_str="1", full_text="full")])
+    handled = threading.Event()
+    hydrator = StatusHydrator(
+        lookup=lambda id_strs: lookup_statuses(twitter, id_strs),
+        on_hydrated=lambda status: handled.set(),
+        max_delay_seconds=0.01,
+    )
+    hydrator.submit(truncated_status("1"))
+    # a partial batch is looked up once its first status has waited long enough
+    assert handled.wait(timeout=5)
+    assert twitter.lookups == [["1"]]
+    hydrator.close()
+
+    # a failed lookup hands over the statuses as they were
+    def fail(id_strs):
+        raise RuntimeError("Service unavailable")
+
+    handled = []
+    hydrator = StatusHydrator(lookup=fail, on_hydrated=handled.append)
+    hydrator.submit(truncated_status("2"))
+    hydrator.close()
+    assert [status["truncated"] for status in handled] == [True]
+
+
+def ranked_status(id_str: str, favorite_count: int = 0) -> dict:
+    status = make_status(
+        id_str=id_str,
+        created_at="Wed Oct 10 20:19:24 +0000 2018",
+        favorite_count=favorite_count,
+        retweet_count=0,
+    )
+    status["user"] = dict(status["user"], verified=False)
+    return status
+
+
+def test_status_lookup():
+    twitter = FakeTwitter([ranked_status(str(i)) for i in range(250) if i % 3])
+    status_lookup = StatusLookup(twitter, StatusCache(ttl=60))
+    id_strs = [str(i) for i in range(250)]
+
+    statuses, missing = status_lookup.lookup(id_strs + id_strs[:10])
+    assert [len(batch) for batch in twitter.lookups] == [100, 100, 50]
+    assert missing == {str(i) for i in range(250) if not i % 3}
+    assert set(statuses) == set(id_strs) - missing
+
+    # found statuses are cached, missing ones are looked up again
+    statuses, missing = status_lookup.lookup(id_strs[:10])
+    assert twitter.lookups[-1] == ["0", "3", "6", "9"]
+    assert len(statuses) == 6
+    assert status_lookup.get_status("1") is statuses["1"]
+    assert status_lookup.requests == 4
+
+
+def test_get_best_haiku(tmp_path):
+    db_session = session_factory(f"sqlite:///{tmp_path / 'haikus.db'}")
+    statuses = [ranked_status(str(i), favorite_count=i) for i in range(1, 6)]
+    haikus = [
+        Haiku.add_haiku(db_session, status, status["text"], "a\nhaiku\nhere")
+        for status in statuses
+    ]
+    # the most favorited tweet was deleted
+    twitter = FakeTwitter(statuses[:-1])
+    status_lookup = StatusLookup(twitter, StatusCache())
+
+    haiku_to_post = get_best_haiku(haikus, twitter, db_session, status_lookup)
+    assert haiku_to_post["status_id_str"] == "4"
+    assert twitter.lookups == [["1", "2", "3", "4", "5"]]
+    deleted = [
+        h.status_id_str for h in Haiku.get_haikus_all(db_session) if h.date_deleted
+    ]
+    assert deleted == ["5"]
+    # posting it reuses the status from ranking
+    assert status_lookup.get_status("4")["favorite_count"] == 4
+    assert len(twitter.lookups) == 1